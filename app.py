@@ -1,18 +1,27 @@
+import time
+_inicio_imports = time.perf_counter()
+
 import streamlit as st
-import pypdf
-import io
 
 # Importa as funções dos módulos de lógica
+# (pypdf, SDKs de LLM e backends vetoriais são importados só quando usados)
 from config_loader import carregar_config
 from llm_handler import gerar_resposta_com_llm
-from rag_processor import dividir_texto_em_chunks, buscar_contexto_relevante
-from vector_store_factory import get_vector_store
+from rag_processor import dividir_texto_em_chunks, buscar_contexto_relevante, extrair_texto_pdf
 import chat_manager
 import secrets_manager
 import profile_manager
 import prompt_manager
-from metadata_extractor import extrair_metadados_pdf, filtrar_artigos_por_autor
-from researcher_profile import gerar_perfil_pesquisador
+import resource_registry
+import embedding_engine
+import ingestion_queue
+import ingestion_worker
+import query_batcher
+import tracing
+import usage_ledger
+import workspace_manager
+
+resource_registry.registar_etapa("imports da app", time.perf_counter() - _inicio_imports)
 
 
 # --- LAYOUT E CONFIGURAÇÃO INICIAL ---
@@ -78,6 +87,7 @@ default_states = {
     'max_output_tokens': llm_config['max_output_tokens'],
     'vector_store': None, 
     'vector_store_choice': list(vector_stores_config.keys())[0],
+    'workspace': workspace_manager.workspace_padrao(),
     'messages': [], 
     'current_chat': "Nova Conversa", 
     'editing_message_index': None,
@@ -92,10 +102,27 @@ for key, value in default_states.items():
     if key not in st.session_state:
         st.session_state[key] = value
 
-if st.session_state.vector_store is None:
-    with st.spinner(f"A carregar {st.session_state.vector_store_choice}..."):
-        config_vs_atual = vector_stores_config[st.session_state.vector_store_choice]
-        st.session_state.vector_store = get_vector_store(config_vs_atual)
+# Vector store do workspace ativo: os índices abertos ficam numa cache LRU
+# partilhada pelas sessões, por isso trocar de workspace é imediato se recente
+chave_store = (st.session_state.vector_store_choice, st.session_state.workspace)
+if chave_store not in workspace_manager.stores_em_cache():
+    with st.spinner(f"A carregar {chave_store[0]} (workspace {chave_store[1]})..."):
+        _inicio_vs = time.perf_counter()
+        workspace_manager.obter_store(*chave_store)
+        resource_registry.registar_etapa(f"vector store {chave_store[0]}",
+                                         time.perf_counter() - _inicio_vs)
+st.session_state.vector_store = workspace_manager.obter_store(*chave_store)
+
+def sincronizar_documentos_workspace():
+    """Documentos disponíveis para o chat = os indexados no workspace e vector store ativos."""
+    documentos = workspace_manager.listar_documentos(*reversed(chave_store))
+    st.session_state.nomes_ficheiros = list(documentos)
+    st.session_state.lista_metadados_completos = [d['metadados'] for d in documentos.values() if d.get('metadados')]
+    if documentos:
+        st.session_state.documentos_processados = True
+
+if 'nomes_ficheiros' not in st.session_state:
+    sincronizar_documentos_workspace()
 
 # --- FUNÇÕES DE LÓGICA DO CHAT ---
 def handle_response_generation(prompt):
@@ -105,38 +132,50 @@ def handle_response_generation(prompt):
     provedor = st.session_state.provedor_selecionado
     api_key = st.session_state.api_keys.get(provedor)
 
-    if not api_key:
+    if not api_key and providers_config[provedor].get('requer_chave', True):
         st.error(f"Por favor, insira uma chave de API válida para {provedor} na barra lateral.")
         st.session_state.messages.pop()
         return
 
-    with st.chat_message("assistant"):
-        placeholder = st.empty()
-        with st.spinner("pensando..."):
-            resposta = gerar_resposta_com_llm(
-                provider_name=provedor, 
-                api_key=api_key, 
-                model_config=providers_config[provedor],
-                contexto=buscar_contexto_relevante(
-                    st.session_state.vector_store, 
-                    prompt, 
+    # Um trace por resposta: decomposição por etapa no Modo Debug
+    with tracing.span("chat.resposta", provedor=provedor) as raiz:
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            with st.spinner("pensando..."):
+                contexto = buscar_contexto_relevante(
+                    st.session_state.vector_store,
+                    prompt,
                     st.session_state.get('nomes_ficheiros', [])
-                ),
-                pergunta=prompt, 
-                historico_chat=st.session_state.messages[:-1],
-                nomes_ficheiros=st.session_state.get('nomes_ficheiros', []),
-                config_geracao={
-                    "temperature": st.session_state.temperature, 
-                    "top_p": st.session_state.top_p, 
-                    "top_k": st.session_state.top_k, 
-                    "max_output_tokens": st.session_state.max_output_tokens
-                },
-                metadados=st.session_state.get("lista_metadados"),
-                system_prompt=st.session_state.system_prompt_customizado,
-                persona_prompt=prompt_manager.carregar_personas()[next(i for i, p in enumerate(prompt_manager.carregar_personas()) if p['nome'] == st.session_state.persona_selecionada)]['prompt']
-            )
-            placeholder.markdown(resposta)
-            st.session_state.messages.append({"role": "assistant", "content": resposta})
+                )
+                trechos = gerar_resposta_com_llm(
+                    provider_name=provedor, 
+                    api_key=api_key, 
+                    model_config=providers_config[provedor],
+                    contexto=contexto,
+                    pergunta=prompt, 
+                    historico_chat=st.session_state.messages[:-1],
+                    nomes_ficheiros=st.session_state.get('nomes_ficheiros', []),
+                    config_geracao={
+                        "temperature": st.session_state.temperature, 
+                        "top_p": st.session_state.top_p, 
+                        "top_k": st.session_state.top_k, 
+                        "max_output_tokens": st.session_state.max_output_tokens
+                    },
+                    metadados=st.session_state.get("lista_metadados"),
+                    system_prompt=st.session_state.system_prompt_customizado,
+                    persona_prompt=next(p['prompt'] for p in prompt_manager.carregar_personas()
+                                        if p['nome'] == st.session_state.persona_selecionada),
+                    stream=True
+                )
+            # A resposta aparece à medida que o provedor a gera
+            resposta = placeholder.write_stream(trechos)
+            mensagem = {"role": "assistant", "content": resposta, "provedor": provedor}
+            if raiz.trace_id:
+                mensagem["trace_id"] = raiz.trace_id
+            if trechos.resultado is not None:
+                mensagem["uso"] = usage_ledger.registo_uso(trechos.resultado, provedor, providers_config[provedor])
+                st.session_state.setdefault('uso_sessao', []).append(mensagem["uso"])
+            st.session_state.messages.append(mensagem)
 
             # SALVAMENTO AUTOMÁTICO
             if st.session_state.current_chat == "Nova Conversa":
@@ -170,6 +209,12 @@ with chat_container:
         with st.chat_message(msg["role"]):
             # Conteúdo da mensagem
             st.markdown(msg["content"])
+
+            if st.session_state.get('debug_mode') and msg.get("trace_id"):
+                decomposicao = tracing.decomposicao(msg["trace_id"])
+                if decomposicao:
+                    with st.expander("⏱️ Tempo por etapa", expanded=False):
+                        st.code(decomposicao, language=None)
             
             # Controles inline (aparecem no hover devido ao CSS)
             cols = st.columns([1, 1, 1, 10])
@@ -209,6 +254,14 @@ if prompt := st.chat_input("Faça uma pergunta...", key="main_chat_input"):
 # --- BARRA LATERAL ---
 with st.sidebar:
     st.header("Gerenciar Conversa")
+
+    # Tokens e custo reportados pelos provedores (preços em llm_providers.<x>.precos)
+    uso_chat = usage_ledger.totalizar_mensagens(st.session_state.messages)
+    uso_sessao = usage_ledger.totalizar(st.session_state.get('uso_sessao', []))
+    if uso_sessao["chamadas"] or uso_chat["chamadas"]:
+        st.caption(f"💰 Conversa: {uso_chat['tokens_entrada']:,} ent. ({uso_chat['tokens_cache']:,} cache) · "
+                   f"{uso_chat['tokens_saida']:,} saída · ${uso_chat['custo_usd']:.4f}  \n"
+                   f"Sessão: {uso_sessao['chamadas']} respostas · ${uso_sessao['custo_usd']:.4f}")
     
     if st.button("➕ Nova Conversa", use_container_width=True):
         st.session_state.messages = []
@@ -219,11 +272,33 @@ with st.sidebar:
             del st.session_state['nomes_ficheiros']
         st.rerun()
     
-    chats_salvos = ["Nova Conversa"] + chat_manager.listar_chats_salvos()
-    try: 
-        current_chat_index = chats_salvos.index(st.session_state.current_chat)
-    except ValueError: 
-        current_chat_index = 0
+    # Catálogo de conversas: busca por texto completo e paginação
+    busca_chats = st.text_input("🔎 Buscar conversas:", placeholder="Palavras-chave do nome ou das mensagens",
+                                key="busca_chats")
+    CHATS_POR_PAGINA = 20
+    _, total_chats = chat_manager.pesquisar_chats(busca_chats, limite=0)
+    num_paginas = max(1, -(-total_chats // CHATS_POR_PAGINA))
+    pagina_chats = 1
+    if st.session_state.get('pagina_chats', 1) > num_paginas:
+        st.session_state.pagina_chats = 1
+    if num_paginas > 1:
+        pagina_chats = st.number_input(f"Página (de {num_paginas}):", min_value=1, max_value=num_paginas,
+                                       value=1, step=1, key="pagina_chats")
+    pagina_resultados, _ = chat_manager.pesquisar_chats(
+        busca_chats, limite=CHATS_POR_PAGINA, offset=(pagina_chats - 1) * CHATS_POR_PAGINA
+    )
+    info_chats = {c['nome']: c for c in pagina_resultados}
+
+    chats_salvos = ["Nova Conversa"] + list(info_chats)
+    if st.session_state.current_chat not in chats_salvos:
+        chats_salvos.insert(1, st.session_state.current_chat)
+    current_chat_index = chats_salvos.index(st.session_state.current_chat)
+
+    def formatar_chat(nome):
+        info = info_chats.get(nome)
+        if not info:
+            return nome
+        return f"{nome} · {info['num_mensagens']} msgs"
     
     def on_chat_change():
         selected = st.session_state.select_chat_widget
@@ -237,7 +312,12 @@ with st.sidebar:
         st.session_state.current_chat = selected
     
     st.selectbox("Carregar Conversa:", chats_salvos, index=current_chat_index, 
-                key='select_chat_widget', on_change=on_chat_change)
+                key='select_chat_widget', on_change=on_chat_change, format_func=formatar_chat)
+    if busca_chats:
+        st.caption(f"{total_chats} conversa(s) encontrada(s)")
+        for info in pagina_resultados:
+            if info.get('trecho'):
+                st.caption(f"**{info['nome']}**: {info['trecho']}")
     
     default_save_name = st.session_state.current_chat if st.session_state.current_chat != "Nova Conversa" else ""
     nome_chat_para_renomear = st.text_input("Renomear conversa:", value=default_save_name)
@@ -264,20 +344,62 @@ with st.sidebar:
         st.subheader("Base de Conhecimento")
         
         def on_vector_store_change():
-            if 'vector_store' in st.session_state: 
-                del st.session_state['vector_store']
+            for chave in ('vector_store', 'nomes_ficheiros', 'documentos_processados', 'lista_metadados'):
+                if chave in st.session_state:
+                    del st.session_state[chave]
+
+        # Workspace: cada projeto tem os seus índices, documentos e quotas
+        workspaces = workspace_manager.listar_workspaces()
+        if st.session_state.get('workspace_pendente') in workspaces:
+            st.session_state.workspace = st.session_state.pop('workspace_pendente')
+        if st.session_state.workspace not in workspaces:
+            st.session_state.workspace = workspaces[0]
+        st.selectbox("Workspace:", workspaces, key='workspace', on_change=on_vector_store_change)
+        col_ws, col_criar = st.columns([3, 1])
+        with col_ws:
+            novo_workspace = st.text_input("Novo workspace:", placeholder="ex.: projeto-ids",
+                                           label_visibility="collapsed", key="novo_workspace")
+        with col_criar:
+            if st.button("➕", key="criar_workspace", help="Criar workspace"):
+                if workspace_manager.criar_workspace(novo_workspace):
+                    on_vector_store_change()
+                    st.session_state.workspace_pendente = novo_workspace
+                    st.rerun()
+                else:
+                    st.error("Nome inválido ou já existente (use letras, números, '.', '_' ou '-').")
+        manifesto_ws = workspace_manager.carregar_manifesto(st.session_state.workspace)
+        st.caption(f"{len(manifesto_ws['documentos'])} documento(s) · {manifesto_ws['num_chunks']} chunks")
         
         st.selectbox("Vector Store:", list(vector_stores_config.keys()), 
                     key='vector_store_choice', on_change=on_vector_store_change)
         
         arquivos_pdf = st.file_uploader("Carregar PDFs", type="pdf", accept_multiple_files=True)
         
+        # O Chroma embutido só pode estar aberto neste processo: sem servidor, processa na página
+        ingestao_segundo_plano = (config.get('ingestao', {}).get('segundo_plano', False)
+                                  and workspace_manager.partilhavel_entre_processos(st.session_state.vector_store_choice))
+
         if st.button("Processar Documentos", key="processar_docs"):
-            if arquivos_pdf:
+            cabe, erro_quota = workspace_manager.verificar_quota(
+                st.session_state.workspace, novos_documentos=len(arquivos_pdf or [])
+            )
+            if arquivos_pdf and not cabe:
+                st.error(erro_quota)
+            elif arquivos_pdf and ingestao_segundo_plano:
+                # Job na fila do worker: sobrevive a recargas da página e retoma após falhas
+                st.session_state.job_ingestao = ingestion_queue.enfileirar_job(
+                    st.session_state.vector_store_choice,
+                    [(f.name, f.getvalue()) for f in arquivos_pdf],
+                    workspace=st.session_state.workspace
+                )
+                ingestion_worker.iniciar_worker_em_segundo_plano()
+                st.toast(f"{len(arquivos_pdf)} documento(s) enviados para processamento.", icon="📥")
+            elif arquivos_pdf:
+                from metadata_extractor import extrair_metadados_pdf
                 with st.spinner("A processar..."):
-                    nomes_ficheiros = [f.name for f in arquivos_pdf]
                     lista_chunks, lista_metadados = [], []
                     lista_metadados_completos = []  # ← NOVO
+                    documentos_manifesto = []
 
                     for arquivo in arquivos_pdf:
                         # ← NOVO: Extrair metadados
@@ -289,12 +411,7 @@ with st.sidebar:
                         lista_metadados_completos.append(metadata_completo)
 
                         # Processar texto (código original adaptado)
-                        texto = "".join(
-                            p.extract_text() or ""
-                            for p in pypdf.PdfReader(
-                                io.BytesIO(pdf_bytes)
-                            ).pages
-                        )
+                        texto = extrair_texto_pdf(pdf_bytes)
                         
                         chunks, metadados = dividir_texto_em_chunks(
                             texto, arquivo.name,
@@ -302,33 +419,89 @@ with st.sidebar:
                         )
                         lista_chunks.extend(chunks)
                         lista_metadados.extend(metadados)
+                        documentos_manifesto.append((arquivo.name, len(chunks), metadata_completo))
 
-                    if lista_chunks:
-                        st.session_state.vector_store.adicionar(
-                            lista_chunks, lista_metadados
+                    cabe, erro_quota = workspace_manager.verificar_quota(
+                        st.session_state.workspace, len(arquivos_pdf), len(lista_chunks)
+                    )
+                    if cabe:
+                        if lista_chunks:
+                            st.session_state.vector_store.adicionar(
+                                lista_chunks, lista_metadados
+                            )
+                            st.session_state.lista_metadados = lista_metadados
+                        workspace_manager.registar_documentos(
+                            st.session_state.workspace, st.session_state.vector_store_choice,
+                            documentos_manifesto
+                        )
+                        sincronizar_documentos_workspace()
+
+                if cabe:
+                    st.success("Documentos processados!")
+                else:
+                    st.error(erro_quota)
+
+        # Remoção de documentos (artigos retratados, uploads errados) sem reindexar
+        if st.session_state.get('nomes_ficheiros'):
+            with st.expander("🗑️ Remover documentos", expanded=False):
+                doc_remover = st.selectbox("Documento:", st.session_state.nomes_ficheiros, key="doc_remover")
+                col_rem, col_comp = st.columns(2)
+                with col_rem:
+                    if st.button("Remover", key="remover_doc", use_container_width=True):
+                        removidos = st.session_state.vector_store.remover({"fonte": doc_remover})
+                        workspace_manager.remover_documento(
+                            st.session_state.workspace, st.session_state.vector_store_choice, doc_remover
                         )
-                        st.session_state.lista_metadados = lista_metadados
-                        st.session_state.lista_metadados_completos = lista_metadados_completos  
-
-                    st.session_state.nomes_ficheiros = nomes_ficheiros
-                    st.session_state.documentos_processados = True
-                    st.session_state.lista_metadados_completos = lista_metadados_completos  
-
-
-                st.success("Documentos processados!")
-
-                # ← NOVO: Mostrar metadados extraídos
-                if 'lista_metadados_completos' in st.session_state and st.session_state.lista_metadados_completos:
-                    with st.expander("📄 Metadados Extraídos", expanded=False):
-                        for meta in st.session_state.lista_metadados_completos:
-                            st.write(f"**{meta['titulo'][:80]}...**")
-                            autores_str = ', '.join(meta['autores'][:3])
-                            if len(meta['autores']) > 3:
-                                autores_str += f" (e mais {len(meta['autores']) - 3})"
-                            st.write(f"- Autores: {autores_str}")
-                            if meta['ano']:
-                                st.write(f"- Ano: {meta['ano']}")
-                            st.write("---")
+                        sincronizar_documentos_workspace()
+                        st.toast(f"{removidos} chunk(s) de '{doc_remover}' removidos.", icon="🗑️")
+                        st.rerun()
+                with col_comp:
+                    if st.button("Compactar índice", key="compactar_indice", use_container_width=True):
+                        with st.spinner("A compactar..."):
+                            eliminados = st.session_state.vector_store.compactar()
+                        st.toast(f"Compactação concluída ({eliminados} chunk(s) eliminados).", icon="🧹")
+
+        # Progresso do job em segundo plano: os documentos já indexados
+        # ficam disponíveis para o chat enquanto o resto é processado
+        if st.session_state.get('job_ingestao'):
+            progresso = ingestion_queue.obter_progresso(st.session_state.job_ingestao)
+            if progresso is None:
+                del st.session_state['job_ingestao']
+            else:
+                # O worker regista cada documento concluído no manifesto do workspace
+                if progresso['workspace'] == st.session_state.workspace:
+                    sincronizar_documentos_workspace()
+
+                terminados = progresso['concluidos'] + progresso['falhas']
+                st.progress(terminados / max(1, progresso['total']),
+                            text=f"Indexados {progresso['concluidos']} de {progresso['total']} documento(s)")
+                if progresso['falhas']:
+                    with st.expander(f"⚠️ {progresso['falhas']} documento(s) com erro"):
+                        for d in progresso['documentos']:
+                            if d['status'] == 'falhou':
+                                st.write(f"- {d['nome']}: {d['erro']}")
+                if progresso['status'] == 'falhou':
+                    st.error(f"O processamento falhou: {progresso['erro']}")
+                elif progresso['status'] == 'concluido':
+                    st.success("Documentos processados!")
+                else:
+                    # Garante um worker vivo (ex.: após um crash ou reinício da máquina)
+                    ingestion_worker.iniciar_worker_em_segundo_plano()
+                    if st.button("🔄 Atualizar progresso", key="atualizar_ingestao"):
+                        st.rerun()
+
+        # ← NOVO: Mostrar metadados extraídos
+        if st.session_state.get('lista_metadados_completos'):
+            with st.expander("📄 Metadados Extraídos", expanded=False):
+                for meta in st.session_state.lista_metadados_completos:
+                    st.write(f"**{meta['titulo'][:80]}...**")
+                    autores_str = ', '.join(meta['autores'][:3])
+                    if len(meta['autores']) > 3:
+                        autores_str += f" (e mais {len(meta['autores']) - 3})"
+                    st.write(f"- Autores: {autores_str}")
+                    if meta['ano']:
+                        st.write(f"- Ano: {meta['ano']}")
+                    st.write("---")
         
         st.divider()
         st.subheader("Configuração do LLM")
@@ -344,16 +517,41 @@ with st.sidebar:
                 secrets_manager.save_api_key(provedor_selecionado, key)
                 st.toast(f"✅ Chave API para {provedor_selecionado} salva!", icon="🔑")
 
-        api_key_input = st.text_input(
-            f"Chave API para {provedor_selecionado}", 
-            value=st.session_state.api_keys.get(provedor_selecionado, ''), 
-            type="password", 
-            key=f"api_key_input_{provedor_selecionado}",
-            on_change=on_api_key_change
-        )
+        if config_provedor_atual.get('requer_chave', True):
+            api_key_input = st.text_input(
+                f"Chave API para {provedor_selecionado}", 
+                value=st.session_state.api_keys.get(provedor_selecionado, ''), 
+                type="password", 
+                key=f"api_key_input_{provedor_selecionado}",
+                on_change=on_api_key_change
+            )
         
         st.session_state.debug_mode = st.checkbox("🐛 Modo Debug", 
                                                  value=st.session_state.get('debug_mode', False))
+        
+        if st.session_state.debug_mode:
+            with st.expander("⏱️ Tempo de arranque", expanded=False):
+                relatorio = resource_registry.relatorio_inicializacao()
+                st.write(f"**Imports:** {relatorio['total_imports_s']:.2f}s · "
+                         f"**Modelos:** {relatorio['total_modelos_s']:.2f}s")
+                for secao in ("etapas", "imports", "modelos"):
+                    for nome, segundos in sorted(relatorio[secao].items(), key=lambda x: -x[1]):
+                        st.caption(f"{secao}: `{nome}` — {segundos:.2f}s")
+                if hasattr(st.session_state.vector_store, 'estatisticas'):
+                    est = st.session_state.vector_store.estatisticas()
+                    st.caption(f"índice: {est['num_vetores']} vetores ({est['quantizacao']}), "
+                               f"{est['bytes_por_vetor']} B/vetor, {est['memoria_indice_mb']:.1f} MB em memória")
+                for nome, m in embedding_engine.metricas_motores().items():
+                    st.caption(f"embedding: `{nome}` — {m['chunks']} chunks, "
+                               f"{m['chunks_por_s']:.1f} chunks/s (última chamada: {m['ultimo_chunks_por_s']:.1f})")
+                agrupamento = query_batcher.metricas_agrupadores()
+                if agrupamento:
+                    st.caption(f"consultas: {agrupamento['consultas']} em {agrupamento['lotes']} lotes "
+                               f"(médio {agrupamento['lote_medio']:.1f}, máx. {agrupamento['lote_max']}), "
+                               f"espera média {agrupamento['espera_media_ms']:.1f} ms · p95 {agrupamento['espera_p95_ms']:.1f} ms")
+                for nome, etapa in tracing.resumo().items():
+                    st.caption(f"span: `{nome}` — {etapa['contagem']}× · média {etapa['media_ms']:.1f} ms"
+                               + (f" · {etapa['erros']} erros" if etapa['erros'] else ""))
     
         # ========== SISTEMA DE PROMPTS E PERSONAS ==========
     with st.expander("🎭 Prompts e Personas", expanded=False):
@@ -613,14 +811,48 @@ with st.sidebar:
                 key="search_perfis"
             )
             
+            # Filtros por tag e ano (índice do catálogo, sem abrir os perfis)
+            col_tag, col_ano = st.columns(2)
+            with col_tag:
+                tags_disponiveis = [tag for tag, _ in profile_manager.listar_tags()]
+                tag_filtro = st.selectbox("🏷️ Tag:", options=[""] + tags_disponiveis, key="filtro_tag_perfis")
+            with col_ano:
+                anos_disponiveis = sorted({ano for p in perfis_disponiveis for ano in p['anos']}, reverse=True)
+                ano_filtro = st.selectbox("📅 Ano:", options=[None] + anos_disponiveis, key="filtro_ano_perfis",
+                                          format_func=lambda a: "" if a is None else str(a))
+            
+            busca_semantica = st.checkbox("🧠 Busca semântica", key="busca_semantica_perfis",
+                                          help="Ordena os perfis por similaridade de significado com a busca")
+            
             # Filtrar perfis
-            perfis_filtrados = profile_manager.buscar_perfis(query, perfis_disponiveis)
+            perfis_filtrados = profile_manager.filtrar_perfis(perfis_disponiveis, tag=tag_filtro, ano=ano_filtro)
+            if busca_semantica and query:
+                try:
+                    import profile_search
+                    # Todos os perfis, ordenados: o contador e a paginação contam-nos a todos
+                    perfis_filtrados = profile_search.buscar_semantico(query, perfis_filtrados, top_k=None)
+                except Exception as e:
+                    st.warning(f"⚠️ Busca semântica indisponível ({e}); usando busca por texto.")
+                    perfis_filtrados = profile_manager.buscar_perfis(query, perfis_filtrados)
+            else:
+                perfis_filtrados = profile_manager.buscar_perfis(query, perfis_filtrados)
             
             # Contador
             st.write(f"**{len(perfis_filtrados)}** perfis encontrados")
             
+            # Paginação
+            PERFIS_POR_PAGINA = 10
+            num_paginas_perfis = max(1, -(-len(perfis_filtrados) // PERFIS_POR_PAGINA))
+            if st.session_state.get('pagina_perfis', 1) > num_paginas_perfis:
+                st.session_state.pagina_perfis = 1
+            pagina_perfis = 1
+            if num_paginas_perfis > 1:
+                pagina_perfis = st.number_input(f"Página (de {num_paginas_perfis}):", min_value=1,
+                                                max_value=num_paginas_perfis, value=1, step=1,
+                                                key="pagina_perfis")
+            
             # Exibir perfis em cards
-            for perfil in perfis_filtrados:
+            for perfil in profile_manager.paginar_perfis(perfis_filtrados, pagina_perfis, PERFIS_POR_PAGINA):
                 with st.container():
                     # Header do card
                     col1, col2, col3 = st.columns([3, 1, 1])
@@ -643,7 +875,10 @@ with st.sidebar:
                     with col_a:
                         st.caption(f"📅 {perfil['data'][:10]}")
                     with col_b:
-                        st.caption(f"📄 {perfil['num_artigos']} artigos")
+                        legenda = f"📄 {perfil['num_artigos']} artigos"
+                        if 'score' in perfil:
+                            legenda += f" · 🎯 {perfil['score']:.2f}"
+                        st.caption(legenda)
                     
                     # Tags (mostra até 5 tags principais)
                     if perfil['tags']:
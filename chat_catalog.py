@@ -0,0 +1,187 @@
+# chat_catalog.py
+"""
+Catálogo local (SQLite + FTS5) das conversas salvas.
+Guarda nome, datas, nº de mensagens, provedores usados e o texto das
+mensagens, para que a barra lateral possa paginar e pesquisar conversas
+sem abrir os ficheiros de chat.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+CATALOGO_PATH = os.path.join("chats", "catalogo.db")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    nome TEXT PRIMARY KEY,
+    criado_em TEXT,
+    atualizado_em TEXT,
+    num_mensagens INTEGER DEFAULT 0,
+    provedores TEXT DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_chats_atualizado ON chats(atualizado_em);
+
+CREATE TABLE IF NOT EXISTS mensagens (
+    rowid INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL,
+    msg_id INTEGER NOT NULL,
+    role TEXT,
+    conteudo TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mensagens_chat ON mensagens(nome, msg_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS mensagens_fts USING fts5(
+    conteudo, content='mensagens', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS mensagens_ai AFTER INSERT ON mensagens BEGIN
+    INSERT INTO mensagens_fts(rowid, conteudo) VALUES (new.rowid, new.conteudo);
+END;
+CREATE TRIGGER IF NOT EXISTS mensagens_ad AFTER DELETE ON mensagens BEGIN
+    INSERT INTO mensagens_fts(mensagens_fts, rowid, conteudo) VALUES ('delete', old.rowid, old.conteudo);
+END;
+"""
+
+_local = threading.local()
+
+
+def _conexao() -> sqlite3.Connection:
+    """Uma conexão por thread (os reruns do Streamlit correm em threads distintas)."""
+    con = getattr(_local, "con", None)
+    if con is None or getattr(_local, "path", None) != CATALOGO_PATH:
+        os.makedirs(os.path.dirname(CATALOGO_PATH) or ".", exist_ok=True)
+        con = sqlite3.connect(CATALOGO_PATH, timeout=10)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.executescript(_ESQUEMA)
+        _local.con, _local.path = con, CATALOGO_PATH
+    return con
+
+
+def registar_alteracoes(nome: str, meta: Dict, registos: List[Dict]):
+    """
+    Aplica ao catálogo os registos anexados ao log de uma conversa
+    (mesmos registos add/edit/del do chat_manager) e atualiza o cabeçalho.
+    """
+    con = _conexao()
+    provedores = set()
+    with con:
+        for r in registos:
+            op, msg_id = r["op"], r["id"]
+            if op in ("edit", "del"):
+                con.execute("DELETE FROM mensagens WHERE nome = ? AND msg_id = ?", (nome, msg_id))
+            if op in ("add", "edit"):
+                msg = r["msg"]
+                con.execute(
+                    "INSERT INTO mensagens(nome, msg_id, role, conteudo) VALUES (?, ?, ?, ?)",
+                    (nome, msg_id, msg.get("role"), msg.get("content", "")),
+                )
+                if msg.get("provedor"):
+                    provedores.add(msg["provedor"])
+
+        linha = con.execute("SELECT provedores FROM chats WHERE nome = ?", (nome,)).fetchone()
+        if linha and linha["provedores"]:
+            provedores.update(linha["provedores"].split(","))
+
+        con.execute(
+            """INSERT INTO chats(nome, criado_em, atualizado_em, num_mensagens, provedores)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(nome) DO UPDATE SET
+                   atualizado_em = excluded.atualizado_em,
+                   num_mensagens = excluded.num_mensagens,
+                   provedores = excluded.provedores""",
+            (nome, meta.get("criado_em"), meta.get("atualizado_em"),
+             meta.get("num_mensagens", 0), ",".join(sorted(provedores))),
+        )
+
+
+def indexar_chat(nome: str, meta: Dict, ids: List[int], mensagens: List[Dict]):
+    """(Re)indexa uma conversa inteira, substituindo o que houver no catálogo."""
+    remover_chat(nome)
+    registos = [{"op": "add", "id": i, "msg": m} for i, m in zip(ids, mensagens)]
+    registar_alteracoes(nome, meta, registos)
+
+
+def remover_chat(nome: str):
+    """Remove a conversa e as suas mensagens do catálogo."""
+    con = _conexao()
+    with con:
+        con.execute("DELETE FROM mensagens WHERE nome = ?", (nome,))
+        con.execute("DELETE FROM chats WHERE nome = ?", (nome,))
+
+
+def nomes_catalogados() -> List[str]:
+    return [r["nome"] for r in _conexao().execute("SELECT nome FROM chats")]
+
+
+def _consulta_fts(busca: str) -> str:
+    """Converte palavras-chave livres numa consulta FTS5 segura (AND de prefixos)."""
+    termos = re.findall(r"\w+", busca, re.UNICODE)
+    return " ".join(f'"{t}"*' for t in termos)
+
+
+def pesquisar(busca: Optional[str] = None, limite: int = 20,
+              offset: int = 0) -> Tuple[List[Dict], int]:
+    """
+    Lista conversas do catálogo, das mais recentes para as mais antigas.
+
+    Args:
+        busca: Palavras-chave procuradas no nome e no texto das mensagens
+        limite: Tamanho da página
+        offset: Deslocamento da página
+
+    Returns:
+        (lista de conversas, total de conversas que satisfazem a busca)
+    """
+    con = _conexao()
+    colunas = "c.nome, c.criado_em, c.atualizado_em, c.num_mensagens, c.provedores"
+    consulta = _consulta_fts(busca) if busca else ""
+
+    if not consulta:
+        total = con.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+        linhas = con.execute(
+            f"SELECT {colunas}, '' AS trecho FROM chats c "
+            "ORDER BY c.atualizado_em DESC, c.nome DESC LIMIT ? OFFSET ?",
+            (limite, offset),
+        ).fetchall()
+        return [dict(l) for l in linhas], total
+
+    # Conversas cujo texto satisfaz a busca (melhor trecho por conversa)
+    # unidas às conversas cujo nome contém o texto procurado.
+    sql_resultados = f"""
+        WITH linhas AS MATERIALIZED (
+            SELECT m.nome AS nome, mensagens_fts.rank AS rank,
+                   snippet(mensagens_fts, 0, '**', '**', '…', 12) AS trecho
+            FROM mensagens_fts JOIN mensagens m ON m.rowid = mensagens_fts.rowid
+            WHERE mensagens_fts MATCH ?
+        ),
+        hits AS (
+            SELECT nome, rank, trecho FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY nome ORDER BY rank) AS n FROM linhas
+            ) WHERE n = 1
+        ),
+        por_nome AS (
+            SELECT nome, -1e9 AS rank, '' AS trecho FROM chats WHERE nome LIKE ? ESCAPE '\\'
+        ),
+        todos AS (
+            SELECT nome, MIN(rank) AS rank, MAX(trecho) AS trecho
+            FROM (SELECT * FROM hits UNION ALL SELECT * FROM por_nome)
+            GROUP BY nome
+        )
+        SELECT {colunas}, t.trecho AS trecho, t.rank AS rank
+        FROM todos t JOIN chats c ON c.nome = t.nome
+    """
+    # % e _ do texto procurado são literais, não curingas do LIKE
+    literal = busca.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    params = (consulta, f"%{literal}%")
+    total = con.execute(f"SELECT COUNT(*) FROM ({sql_resultados})", params).fetchone()[0]
+    linhas = con.execute(
+        sql_resultados + " ORDER BY rank, c.atualizado_em DESC LIMIT ? OFFSET ?",
+        params + (limite, offset),
+    ).fetchall()
+    return [{k: l[k] for k in l.keys() if k != "rank"} for l in linhas], total
@@ -2,81 +2,375 @@
 
 import os
 import json
+import copy
+import sqlite3
+import threading
 import streamlit as st
 from datetime import datetime
 
+import chat_catalog
+import tracing
+import usage_ledger
+
 # Define o diretório onde os chats serão guardados
 CHAT_HISTORY_DIR = "chats"
 
+# Cada conversa é um log JSON Lines (<nome>.jsonl) com um registo por operação:
+#   {"op": "add",  "id": 3, "msg": {...}}   -> nova mensagem no fim
+#   {"op": "edit", "id": 3, "msg": {...}}   -> substitui o conteúdo da mensagem 3
+#   {"op": "del",  "id": 3}                 -> tombstone da mensagem 3
+# e um cabeçalho pequeno (<nome>.meta.json) com título, datas, nº de mensagens e uso de tokens/custo.
+EXT_LOG = ".jsonl"
+EXT_META = ".meta.json"
+EXT_LEGADO = ".json"
+
+# Compacta o log quando os registos mortos (edições/tombstones) passam deste limite
+# e representam mais de metade do ficheiro.
+LIMITE_REGISTOS_MORTOS = 50
+
+# Estado já carregado de cada conversa, validado pelo tamanho do log em disco.
+# Permite que salvar/carregar custem proporcionalmente à alteração.
+_estado_chats = {}
+_lock = threading.Lock()
+
+# O catálogo (chat_catalog) é derivado dos logs; é reconciliado com o disco
+# uma vez por processo e sempre que uma atualização incremental falhar.
+_catalogo_sincronizado = False
+
+
 def inicializar_diretorio_chats():
     """Garante que o diretório de chats existe."""
     if not os.path.exists(CHAT_HISTORY_DIR):
         os.makedirs(CHAT_HISTORY_DIR)
 
-def listar_chats_salvos():
-    """Retorna uma lista de todos os ficheiros de chat salvos."""
+def _normalizar_nome(nome_arquivo):
+    """Remove extensões conhecidas do nome da conversa."""
+    for ext in (EXT_META, EXT_LOG, EXT_LEGADO):
+        if nome_arquivo.endswith(ext):
+            return nome_arquivo[:-len(ext)]
+    return nome_arquivo
+
+def _caminhos(nome):
+    base = os.path.join(CHAT_HISTORY_DIR, nome)
+    return base + EXT_LOG, base + EXT_META, base + EXT_LEGADO
+
+def _agora():
+    return datetime.now().isoformat(timespec="seconds")
+
+def _escrever_atomico(filepath, conteudo):
+    """Escreve um ficheiro inteiro via ficheiro temporário + os.replace."""
+    tmp = filepath + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(conteudo)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filepath)
+
+def _anexar_registos(filepath, registos):
+    """Anexa registos ao log numa única escrita, com fsync."""
+    linhas = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registos)
+    with open(filepath, 'a', encoding='utf-8') as f:
+        f.write(linhas)
+        f.flush()
+        os.fsync(f.fileno())
+    return os.path.getsize(filepath)
+
+def _ler_log(filepath):
+    """
+    Reproduz o log e devolve o estado da conversa.
+    Uma última linha truncada (crash a meio de uma escrita) é descartada.
+    """
+    ids, mensagens = [], {}
+    prox_id, num_registos = 0, 0
+    tamanho_valido = 0
+
+    with open(filepath, 'rb') as f:
+        for linha in f:
+            try:
+                registo = json.loads(linha)
+            except ValueError:
+                break
+            if not linha.endswith(b"\n"):
+                break
+            tamanho_valido += len(linha)
+            num_registos += 1
+
+            op, msg_id = registo.get("op"), registo.get("id")
+            if op == "add":
+                ids.append(msg_id)
+                mensagens[msg_id] = registo["msg"]
+                prox_id = max(prox_id, msg_id + 1)
+            elif op == "edit" and msg_id in mensagens:
+                mensagens[msg_id] = registo["msg"]
+            elif op == "del" and msg_id in mensagens:
+                ids.remove(msg_id)
+                del mensagens[msg_id]
+
+    # Descarta o resto de uma escrita interrompida para que os próximos
+    # registos anexados fiquem em linhas válidas.
+    if tamanho_valido != os.path.getsize(filepath):
+        with open(filepath, 'r+b') as f:
+            f.truncate(tamanho_valido)
+
+    return {
+        "ids": ids,
+        "mensagens": [mensagens[i] for i in ids],
+        "prox_id": prox_id,
+        "num_registos": num_registos,
+        "tamanho": tamanho_valido,
+    }
+
+def _ler_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _salvar_meta(nome, meta_path, estado, meta_anterior, adicionadas=(), removidas=()):
+    agora = _agora()
+    # Total de uso acumulado: só as mensagens alteradas entram na conta; a
+    # conversa inteira só é somada se o cabeçalho ainda não tiver o total
+    uso = meta_anterior.get("uso")
+    if uso is None:
+        uso = usage_ledger.totalizar_mensagens(estado.get("mensagens", []))
+    else:
+        uso = usage_ledger.atualizar_total(uso, adicionadas, removidas)
+    meta = {
+        "titulo": nome,
+        "criado_em": meta_anterior.get("criado_em", agora),
+        "atualizado_em": agora,
+        "num_mensagens": len(estado["ids"]),
+        "uso": uso,
+    }
+    _escrever_atomico(meta_path, json.dumps(meta, ensure_ascii=False, indent=2))
+    return meta
+
+def _migrar_legado(nome, log_path, meta_path, legado_path):
+    """Converte um chat no formato antigo (lista JSON) para o log JSON Lines."""
+    with open(legado_path, 'r', encoding='utf-8') as f:
+        historico = json.load(f)
+    registos = [{"op": "add", "id": i, "msg": msg} for i, msg in enumerate(historico)]
+    _escrever_atomico(log_path, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registos))
+
+    criado_em = datetime.fromtimestamp(os.path.getmtime(legado_path)).isoformat(timespec="seconds")
+    _salvar_meta(nome, meta_path, {"ids": historico, "mensagens": historico}, {"criado_em": criado_em})
+    os.remove(legado_path)
+
+def _obter_estado(nome):
+    """Devolve o estado em cache da conversa, relendo o log só se mudou em disco."""
+    log_path, meta_path, legado_path = _caminhos(nome)
+
+    if not os.path.exists(log_path):
+        if os.path.exists(legado_path):
+            _migrar_legado(nome, log_path, meta_path, legado_path)
+        else:
+            _estado_chats.pop(nome, None)
+            return None
+
+    estado = _estado_chats.get(nome)
+    if estado is None or estado["tamanho"] != os.path.getsize(log_path):
+        estado = _ler_log(log_path)
+        _estado_chats[nome] = estado
+    return estado
+
+def _diferencas(antigas, novas):
+    """
+    Calcula as operações para passar de `antigas` para `novas`, cobrindo os
+    casos da UI: anexar, editar uma mensagem, apagar uma mensagem e regenerar
+    (troca do sufixo). Devolve uma lista de (op, posicao, mensagem).
+    """
+    n_ant, n_nov = len(antigas), len(novas)
+    p = 0
+    while p < min(n_ant, n_nov) and antigas[p] == novas[p]:
+        p += 1
+
+    if p == n_ant:                                   # só anexos
+        return [("add", None, m) for m in novas[p:]]
+    if n_nov == n_ant - 1 and antigas[p + 1:] == novas[p:]:
+        return [("del", p, None)]                    # uma mensagem apagada
+    if n_nov == n_ant and antigas[p + 1:] == novas[p + 1:]:
+        return [("edit", p, novas[p])]               # uma mensagem editada
+
+    # Caso geral (ex.: regenerar): apaga o sufixo divergente e anexa o novo
+    return [("del", i, None) for i in range(p, n_ant)] + [("add", None, m) for m in novas[p:]]
+
+def _compactar(log_path, estado):
+    """Reescreve o log só com as mensagens vivas (escrita atómica)."""
+    registos = [{"op": "add", "id": i, "msg": m} for i, m in zip(estado["ids"], estado["mensagens"])]
+    _escrever_atomico(log_path, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registos))
+    estado["num_registos"] = len(registos)
+    estado["tamanho"] = os.path.getsize(log_path)
+
+def _nomes_em_disco():
+    nomes = set()
+    for f in os.listdir(CHAT_HISTORY_DIR):
+        if f.endswith(EXT_LOG):
+            nomes.add(f[:-len(EXT_LOG)])
+        elif f.endswith(EXT_LEGADO) and not f.endswith(EXT_META):
+            nomes.add(f[:-len(EXT_LEGADO)])
+    return nomes
+
+def sincronizar_catalogo():
+    """Indexa no catálogo as conversas em disco que faltam e remove as que já não existem."""
+    global _catalogo_sincronizado
     inicializar_diretorio_chats()
-    # Filtra para mostrar apenas ficheiros .json e remove a extensão para a UI
-    files = [f.replace(".json", "") for f in os.listdir(CHAT_HISTORY_DIR) if f.endswith(".json")]
-    files.sort(reverse=True) # Mostra os mais recentes primeiro
-    return files
+    em_disco = _nomes_em_disco()
+    catalogados = set(chat_catalog.nomes_catalogados())
+
+    for nome in catalogados - em_disco:
+        chat_catalog.remover_chat(nome)
+    for nome in em_disco - catalogados:
+        with _lock:
+            estado = _obter_estado(nome)
+        if estado is not None:
+            meta = carregar_meta_chat(nome) or {"num_mensagens": len(estado["ids"])}
+            chat_catalog.indexar_chat(nome, meta, estado["ids"], estado["mensagens"])
+    _catalogo_sincronizado = True
 
+def _garantir_catalogo():
+    if not _catalogo_sincronizado:
+        sincronizar_catalogo()
+
+def pesquisar_chats(busca=None, limite=20, offset=0):
+    """
+    Pagina e pesquisa (texto completo) as conversas salvas através do catálogo.
+    Retorna (lista de dicts com nome, datas, nº de mensagens, provedores e trecho, total).
+    """
+    _garantir_catalogo()
+    return chat_catalog.pesquisar(busca, limite=limite, offset=offset)
+
+def listar_chats_salvos():
+    """Retorna os nomes de todas as conversas salvas (mais recentes primeiro)."""
+    chats, _ = pesquisar_chats(limite=-1)
+    return [c["nome"] for c in chats]
+
+@tracing.rastrear("chat.salvar")
 def salvar_chat(historico_mensagens, nome_arquivo):
-    """Salva o histórico de mensagens num ficheiro JSON."""
+    """
+    Persiste o histórico de mensagens no log da conversa.
+    Só as diferenças em relação ao último estado salvo são anexadas ao log.
+    """
     inicializar_diretorio_chats()
-    
-    # Adiciona a extensão .json se não existir
-    if not nome_arquivo.endswith(".json"):
-        nome_arquivo += ".json"
-        
-    filepath = os.path.join(CHAT_HISTORY_DIR, nome_arquivo)
-    
+    nome = _normalizar_nome(nome_arquivo)
+    log_path, meta_path, _ = _caminhos(nome)
+
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(historico_mensagens, f, ensure_ascii=False, indent=4)
-        st.toast(f"Conversa salva em '{nome_arquivo}'!", icon="💾")
+        with _lock:
+            estado = _obter_estado(nome) or {
+                "ids": [], "mensagens": [], "prox_id": 0, "num_registos": 0, "tamanho": 0
+            }
+            ids = list(estado["ids"])
+            mensagens = list(estado["mensagens"])
+            prox_id = estado["prox_id"]
+            registos = []
+            adicionadas, removidas = [], []
+
+            for op, pos, msg in _diferencas(mensagens, historico_mensagens):
+                if op == "add":
+                    msg = copy.deepcopy(msg)
+                    registos.append({"op": "add", "id": prox_id, "msg": msg})
+                    adicionadas.append(msg)
+                    ids.append(prox_id)
+                    mensagens.append(msg)
+                    prox_id += 1
+                elif op == "edit":
+                    msg = copy.deepcopy(msg)
+                    registos.append({"op": "edit", "id": ids[pos], "msg": msg})
+                    removidas.append(mensagens[pos])
+                    adicionadas.append(msg)
+                    mensagens[pos] = msg
+                elif op == "del":
+                    registos.append({"op": "del", "id": ids[pos]})
+                    removidas.append(mensagens[pos])
+                    ids[pos] = None
+                    mensagens[pos] = None
+
+            novo_estado = {
+                "ids": [i for i in ids if i is not None],
+                "mensagens": [m for m in mensagens if m is not None],
+                "prox_id": prox_id,
+                "num_registos": estado["num_registos"] + len(registos),
+                "tamanho": estado["tamanho"],
+            }
+
+            if registos or not os.path.exists(log_path):
+                novo_estado["tamanho"] = _anexar_registos(log_path, registos)
+
+                mortos = novo_estado["num_registos"] - len(novo_estado["ids"])
+                if mortos > LIMITE_REGISTOS_MORTOS and mortos > len(novo_estado["ids"]):
+                    _compactar(log_path, novo_estado)
+
+                meta = _salvar_meta(nome, meta_path, novo_estado, _ler_meta(meta_path),
+                                    adicionadas, removidas)
+                _atualizar_catalogo(chat_catalog.registar_alteracoes, nome, meta, registos)
+
+            _estado_chats[nome] = novo_estado
+
+        st.toast(f"Conversa salva em '{nome}'!", icon="💾")
         return True
     except Exception as e:
         st.error(f"Erro ao salvar a conversa: {e}")
         return False
 
+def _atualizar_catalogo(funcao, *args):
+    """O log é a fonte de verdade: uma falha no catálogo só força nova reconciliação."""
+    global _catalogo_sincronizado
+    try:
+        funcao(*args)
+    except sqlite3.Error:
+        _catalogo_sincronizado = False
+
 def carregar_chat(nome_arquivo):
-    """Carrega o histórico de mensagens de um ficheiro JSON."""
+    """Carrega o histórico de mensagens de uma conversa salva."""
     inicializar_diretorio_chats()
+    nome = _normalizar_nome(nome_arquivo)
 
-    if not nome_arquivo.endswith(".json"):
-        nome_arquivo += ".json"
-        
-    filepath = os.path.join(CHAT_HISTORY_DIR, nome_arquivo)
-    
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            historico = json.load(f)
-            st.toast(f"Conversa '{nome_arquivo}' carregada.", icon="📂")
-            return historico
-    except FileNotFoundError:
-        st.error(f"Ficheiro de conversa '{nome_arquivo}' não encontrado.")
-        return None
+        with _lock:
+            estado = _obter_estado(nome)
+        if estado is None:
+            st.error(f"Ficheiro de conversa '{nome}' não encontrado.")
+            return None
+        st.toast(f"Conversa '{nome}' carregada.", icon="📂")
+        # Cópia: a UI altera a lista da sessão e o estado em cache tem de
+        # continuar a refletir o que está em disco.
+        return copy.deepcopy(estado["mensagens"])
     except Exception as e:
         st.error(f"Erro ao carregar a conversa: {e}")
         return None
 
+def carregar_meta_chat(nome_arquivo):
+    """Devolve o cabeçalho da conversa (título, datas, nº de mensagens)."""
+    _, meta_path, _ = _caminhos(_normalizar_nome(nome_arquivo))
+    return _ler_meta(meta_path)
+
+def compactar_chat(nome_arquivo):
+    """Força a compactação do log de uma conversa."""
+    nome = _normalizar_nome(nome_arquivo)
+    log_path, _, _ = _caminhos(nome)
+    with _lock:
+        estado = _obter_estado(nome)
+        if estado is not None:
+            _compactar(log_path, estado)
+
 def apagar_chat(nome_arquivo):
-    """Apaga um ficheiro de chat salvo."""
+    """Apaga um chat salvo (log, cabeçalho e eventual ficheiro legado)."""
     inicializar_diretorio_chats()
+    nome = _normalizar_nome(nome_arquivo)
 
-    if not nome_arquivo.endswith(".json"):
-        nome_arquivo += ".json"
-        
-    filepath = os.path.join(CHAT_HISTORY_DIR, nome_arquivo)
-    
     try:
-        os.remove(filepath)
-        st.toast(f"Conversa '{nome_arquivo}' apagada!", icon="🗑️")
+        with _lock:
+            existentes = [p for p in _caminhos(nome) if os.path.exists(p)]
+            if not existentes:
+                st.error(f"Não foi possível apagar: conversa '{nome}' não encontrada.")
+                return False
+            for filepath in existentes:
+                os.remove(filepath)
+            _estado_chats.pop(nome, None)
+            _atualizar_catalogo(chat_catalog.remover_chat, nome)
+        st.toast(f"Conversa '{nome}' apagada!", icon="🗑️")
         return True
-    except FileNotFoundError:
-        st.error(f"Não foi possível apagar: ficheiro '{nome_arquivo}' não encontrado.")
-        return False
     except Exception as e:
         st.error(f"Erro ao apagar a conversa: {e}")
         return False
@@ -1,18 +1,138 @@
 # config_loader.py
+"""
+Carregamento da configuração (config.yaml).
+
+A configuração é lida uma vez por processo e partilhada por referência como
+um objeto imutável. O ficheiro é vigiado pelo mtime (no máximo uma verificação
+a cada INTERVALO_VERIFICACAO_S segundos) e recarregado quando muda.
+Funciona com ou sem Streamlit (app, scripts de avaliação, workers).
+"""
+
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
 
 import yaml
-import streamlit as st
 
-@st.cache_data
+try:
+    import streamlit as st
+except ImportError:  # execução fora da app (scripts, workers)
+    st = None
+
+CONFIG_PATH = "config.yaml"
+INTERVALO_VERIFICACAO_S = 2.0
+
+
+@dataclass(frozen=True)
+class ConfigPDF:
+    chunk_size: int = 1000
+    chunk_overlap: int = 200
+    n_results: int = 10
+
+
+@dataclass(frozen=True)
+class ConfigEmbedding:
+    model: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+    device: str = "cpu"
+    normalize: bool = True
+    batch_size: int = 32
+    num_threads: int = 0          # 0 = padrão do torch
+    multi_process: bool = False
+    num_processos: int = 2
+    backend: str = "torch"        # torch | onnx
+    onnx_quantizacao: str = "none"  # none | avx2 | avx512 | avx512_vnni | arm64
+    onnx_diretorio: str = "modelos_onnx"
+
+
+@dataclass(frozen=True)
+class Configuracao:
+    """Configuração tipada; `bruto` é a árvore completa do YAML, só de leitura."""
+    pdf: ConfigPDF
+    embedding: ConfigEmbedding
+    bruto: Mapping[str, Any]
+    mtime: float
+
+
+_lock = threading.Lock()
+_atual: Optional[Configuracao] = None
+_verificado_em = 0.0
+_erro_reportado = None   # estado do ficheiro (em falta / inválido nesse mtime) do último erro no stderr
+
+
+def _congelar(valor):
+    """Converte dicts e listas do YAML em estruturas só de leitura."""
+    if isinstance(valor, dict):
+        return MappingProxyType({k: _congelar(v) for k, v in valor.items()})
+    if isinstance(valor, list):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+def _campos(classe, secao):
+    """Valores da secção que correspondem a campos da dataclass."""
+    nomes = classe.__dataclass_fields__
+    return {k: v for k, v in (secao or {}).items() if k in nomes}
+
+
+def _reportar_erro(mensagem, estado):
+    """
+    Na app, o erro aparece em cada execução da página (que pára logo a seguir).
+    Fora dela, vai para o stderr uma vez por estado do ficheiro: cada span do
+    rastreio relê a configuração e repetiria a mensagem.
+    """
+    global _erro_reportado
+    if st is not None and st.runtime.exists():
+        st.error(mensagem)
+    elif estado != _erro_reportado:
+        _erro_reportado = estado
+        print(mensagem, file=sys.stderr)
+
+
+def _ler_ficheiro(mtime) -> Configuracao:
+    with open(CONFIG_PATH, "r") as f:
+        dados = yaml.safe_load(f) or {}
+    return Configuracao(
+        pdf=ConfigPDF(**_campos(ConfigPDF, dados.get('pdf_processing'))),
+        embedding=ConfigEmbedding(**_campos(ConfigEmbedding, dados.get('embedding'))),
+        bruto=_congelar(dados),
+        mtime=mtime,
+    )
+
+
+def obter_configuracao() -> Optional[Configuracao]:
+    """
+    Devolve a configuração partilhada, recarregando-a se o ficheiro mudou.
+    Se uma recarga falhar (ex.: YAML a meio de uma edição), mantém a anterior.
+    """
+    global _atual, _verificado_em, _erro_reportado
+
+    agora = time.monotonic()
+    if _atual is not None and agora - _verificado_em < INTERVALO_VERIFICACAO_S:
+        return _atual
+
+    with _lock:
+        if _atual is not None and agora - _verificado_em < INTERVALO_VERIFICACAO_S:
+            return _atual
+        _verificado_em = agora
+        mtime = None
+        try:
+            mtime = os.path.getmtime(CONFIG_PATH)
+            if _atual is None or mtime != _atual.mtime:
+                _atual = _ler_ficheiro(mtime)
+                _erro_reportado = None
+        except FileNotFoundError:
+            _reportar_erro("Erro: O arquivo 'config.yaml' não foi encontrado. Certifique-se de que ele existe no diretório principal.",
+                           "em falta")
+        except Exception as e:
+            _reportar_erro(f"Erro ao carregar o arquivo de configuração: {e}", ("inválido", mtime))
+        return _atual
+
+
 def carregar_config():
-    """Carrega as configurações do arquivo config.yaml."""
-    try:
-        with open("config.yaml", "r") as f:
-            config = yaml.safe_load(f)
-            return config
-    except FileNotFoundError:
-        st.error("Erro: O arquivo 'config.yaml' não foi encontrado. Certifique-se de que ele existe no diretório principal.")
-        return None
-    except Exception as e:
-        st.error(f"Erro ao carregar o arquivo de configuração: {e}")
-        return None
\ No newline at end of file
+    """Carrega as configurações do arquivo config.yaml (mapeamento só de leitura)."""
+    configuracao = obter_configuracao()
+    return configuracao.bruto if configuracao is not None else None
@@ -0,0 +1,195 @@
+# embedding_engine.py
+"""
+Motor de embedding partilhado pelos vector stores (ChromaDB e FAISS) e pela
+busca de perfis.
+
+- Os textos são ordenados por comprimento e codificados em lotes de
+  `embedding.batch_size`, para que cada lote tenha textos de tamanho parecido
+  (menos padding desperdiçado).
+- `embedding.num_threads` fixa as threads intra-op do torch ou da sessão ONNX
+  Runtime (0 = padrão).
+- `embedding.multi_process` usa o pool multi-processo do sentence-transformers
+  para lotes grandes (ingestão); consultas curtas continuam no processo atual.
+- `embedding.backend: onnx` corre o modelo exportado para ONNX Runtime
+  (exportado uma vez para `embedding.onnx_diretorio`), opcionalmente com
+  quantização int8 dinâmica (`embedding.onnx_quantizacao`). Validar com
+  testes/validar_onnx.py antes de trocar o backend de um índice existente.
+- Cada chamada atualiza métricas de throughput (chunks/s).
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+import tracing
+from config_loader import obter_configuracao
+from resource_registry import importar_modulo, obter_encoder
+
+_lock = threading.Lock()
+_lock_exportacao = threading.Lock()
+_motores = {}
+_threads_configuradas = None
+
+QUANTIZACOES_ONNX = ("avx2", "avx512", "avx512_vnni", "arm64")
+
+
+def _configurar_threads(num_threads):
+    """torch.set_num_threads afeta o processo inteiro: aplica-se uma única vez."""
+    global _threads_configuradas
+    if num_threads and _threads_configuradas != num_threads:
+        importar_modulo("torch").set_num_threads(num_threads)
+        _threads_configuradas = num_threads
+
+
+def preparar_modelo_onnx(modelo: str, quantizacao: str = "none", diretorio: str = "modelos_onnx"):
+    """
+    Exporta o modelo para ONNX (só na primeira vez) e, se pedido, gera a
+    versão com quantização int8 dinâmica (pesos int8, ativações em runtime).
+
+    Args:
+        modelo: Nome do modelo sentence-transformers
+        quantizacao: "none" ou um de QUANTIZACOES_ONNX (conjunto de instruções alvo)
+        diretorio: Onde guardar os modelos exportados
+
+    Returns:
+        tuple: (diretório do modelo exportado, ficheiro .onnx a carregar)
+    """
+    if quantizacao not in ("none", *QUANTIZACOES_ONNX):
+        raise ValueError(f"Quantização ONNX desconhecida: {quantizacao}")
+
+    destino = os.path.join(diretorio, modelo.replace("/", "__"))
+    ficheiro = "onnx/model.onnx" if quantizacao == "none" else f"onnx/model_qint8_{quantizacao}.onnx"
+    if os.path.exists(os.path.join(destino, ficheiro)):
+        return destino, ficheiro
+
+    with _lock_exportacao:
+        st_mod = importar_modulo("sentence_transformers")
+        if not os.path.exists(os.path.join(destino, "onnx", "model.onnx")):
+            # backend="onnx" sem ficheiro ONNX no modelo faz a exportação (requer optimum)
+            st_mod.SentenceTransformer(modelo, device="cpu", backend="onnx").save_pretrained(destino)
+        if quantizacao != "none" and not os.path.exists(os.path.join(destino, ficheiro)):
+            st_mod.export_dynamic_quantized_onnx_model(
+                st_mod.SentenceTransformer(destino, device="cpu", backend="onnx"),
+                quantizacao, destino, file_suffix=f"qint8_{quantizacao}"
+            )
+    return destino, ficheiro
+
+
+class MotorEmbedding:
+    def __init__(self, modelo: str, device: str = "cpu", batch_size: int = 32,
+                 num_threads: int = 0, multi_process: bool = False, num_processos: int = 2,
+                 backend: str = "torch", onnx_quantizacao: str = "none",
+                 onnx_diretorio: str = "modelos_onnx"):
+        self.modelo = modelo
+        self.device = device
+        self.batch_size = max(1, batch_size)
+        self.multi_process = multi_process
+        self.num_processos = num_processos
+        self.backend = backend
+        if backend == "onnx":
+            caminho, ficheiro = preparar_modelo_onnx(modelo, onnx_quantizacao, onnx_diretorio)
+            self.encoder = obter_encoder(caminho, device, "onnx", ficheiro, num_threads)
+            self.variante = ficheiro
+        elif backend == "torch":
+            self.encoder = obter_encoder(modelo, device)
+            self.variante = "fp32"
+        else:
+            raise ValueError(f"Backend de embedding desconhecido: {backend}")
+        self._pool = None
+        self._lock_metricas = threading.Lock()
+        self._metricas = {"chunks": 0, "segundos": 0.0, "ultimo_chunks_por_s": 0.0}
+        if backend == "torch":
+            _configurar_threads(num_threads)
+
+    def dimensao(self) -> int:
+        return self.encoder.get_sentence_embedding_dimension()
+
+    # ---------- codificação ----------
+    def _pool_multi_processo(self):
+        if self._pool is None:
+            self._pool = self.encoder.start_multi_process_pool(
+                target_devices=[self.device] * self.num_processos
+            )
+            atexit.register(self.encoder.stop_multi_process_pool, self._pool)
+        return self._pool
+
+    @tracing.rastrear("embedding.codificar")
+    def codificar(self, textos: List[str], normalizar: bool = True) -> np.ndarray:
+        """
+        Codifica textos, devolvendo uma matriz float32 na ordem original.
+
+        Args:
+            textos: Lista de textos (chunks ou consultas)
+            normalizar: Normaliza os vetores (norma L2 = 1)
+        """
+        if not textos:
+            return np.zeros((0, self.dimensao()), dtype=np.float32)
+
+        tracing.atual().definir(textos=len(textos), modelo=self.modelo)
+        inicio = time.perf_counter()
+        if self.multi_process and len(textos) >= 4 * self.batch_size:
+            embs = self.encoder.encode_multi_process(
+                textos, self._pool_multi_processo(),
+                batch_size=self.batch_size, normalize_embeddings=normalizar
+            )
+            resultado = np.asarray(embs, dtype=np.float32)
+        else:
+            # Ordena por comprimento (do maior para o menor): cada lote fica com
+            # textos de tamanho semelhante e o padding por lote é mínimo
+            ordem = np.argsort([-len(t) for t in textos], kind="stable")
+            resultado = np.empty((len(textos), self.dimensao()), dtype=np.float32)
+            for i in range(0, len(textos), self.batch_size):
+                idx = ordem[i:i + self.batch_size]
+                resultado[idx] = self.encoder.encode(
+                    [textos[j] for j in idx],
+                    batch_size=len(idx),
+                    normalize_embeddings=normalizar,
+                    convert_to_numpy=True,
+                    show_progress_bar=False,
+                )
+        self._registar(len(textos), time.perf_counter() - inicio)
+        return resultado
+
+    # ---------- métricas ----------
+    def _registar(self, n, segundos):
+        with self._lock_metricas:
+            self._metricas["chunks"] += n
+            self._metricas["segundos"] += segundos
+            self._metricas["ultimo_chunks_por_s"] = n / segundos if segundos > 0 else 0.0
+
+    def metricas(self) -> dict:
+        """Totais acumulados e throughput (chunks/s) global e da última chamada."""
+        with self._lock_metricas:
+            m = dict(self._metricas)
+        m["chunks_por_s"] = m["chunks"] / m["segundos"] if m["segundos"] > 0 else 0.0
+        return m
+
+
+def obter_motor(modelo: Optional[str] = None, device: Optional[str] = None) -> MotorEmbedding:
+    """
+    Motor partilhado no processo, configurado pela secção `embedding` do config.yaml.
+    `modelo`/`device` substituem os valores do config (ex.: vector store com outro modelo).
+    """
+    cfg = obter_configuracao().embedding
+    parametros = dict(
+        modelo=modelo or cfg.model, device=device or cfg.device, batch_size=cfg.batch_size,
+        num_threads=cfg.num_threads, multi_process=cfg.multi_process,
+        num_processos=cfg.num_processos, backend=cfg.backend,
+        onnx_quantizacao=cfg.onnx_quantizacao, onnx_diretorio=cfg.onnx_diretorio,
+    )
+    chave = tuple(parametros.values())
+    with _lock:
+        if chave not in _motores:
+            _motores[chave] = MotorEmbedding(**parametros)
+        return _motores[chave]
+
+
+def metricas_motores() -> dict:
+    """Métricas de todos os motores criados no processo, por modelo."""
+    with _lock:
+        return {f"{m.modelo} ({m.device}, {m.backend} {m.variante}, lote {m.batch_size})": m.metricas()
+                for m in _motores.values()}
@@ -0,0 +1,85 @@
+# file_lock.py
+"""
+Lock exclusivo entre processos, num ficheiro `<caminho>.lock` ao lado do
+ficheiro protegido (fcntl no Linux/macOS, msvcrt no Windows).
+
+A app, o worker de ingestão e o serviço de recuperação escrevem nos mesmos
+índices e manifestos: cada um relê, altera e grava com este lock, para não
+apagar a escrita de outro processo que tenha gravado entretanto.
+
+O lock é do processo: pode ser adquirido várias vezes (também por threads
+diferentes) e só é libertado no ficheiro quando todas o libertarem. A
+exclusão entre threads continua a ser feita pelos locks de cada módulo.
+"""
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+
+class LockFicheiro:
+    def __init__(self, caminho: str):
+        self.caminho = f"{caminho}.lock"
+        self._f = None
+        self._contagem = 0
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        with self._lock:
+            if self._contagem == 0:
+                pasta = os.path.dirname(self.caminho)
+                if pasta:
+                    os.makedirs(pasta, exist_ok=True)
+                f = open(self.caminho, "a+b")
+                try:
+                    _bloquear(f)
+                except BaseException:
+                    f.close()
+                    raise
+                self._f = f
+            self._contagem += 1
+
+    def libertar(self):
+        with self._lock:
+            if self._contagem == 0:
+                raise RuntimeError(f"Lock não adquirido: {self.caminho}")
+            self._contagem -= 1
+            if self._contagem == 0:
+                _desbloquear(self._f)
+                self._f.close()
+                self._f = None
+
+    def __enter__(self):
+        self.adquirir()
+        return self
+
+    def __exit__(self, *exc):
+        self.libertar()
+
+
+def _bloquear(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    # msvcrt bloqueia bytes, não o ficheiro: usa-se sempre o primeiro
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def _desbloquear(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,303 @@
+# ingestion_queue.py
+"""
+Fila de jobs de ingestão (SQLite) partilhada entre a app e o worker.
+
+A app enfileira um job com os PDFs carregados (guardados em disco, já que o
+worker corre noutro processo). O worker reserva o job, processa um documento
+de cada vez e marca-o como concluído logo a seguir a indexá-lo (checkpoint),
+por isso um job interrompido retoma no primeiro documento por concluir.
+Os PDFs de um job são apagados quando este termina (concluído ou falhado).
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from config_loader import carregar_config
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    vector_store TEXT NOT NULL,
+    workspace TEXT NOT NULL DEFAULT 'geral',
+    status TEXT NOT NULL DEFAULT 'pendente',   -- pendente | executando | concluido | falhou
+    worker TEXT,
+    heartbeat REAL,
+    tentativas INTEGER NOT NULL DEFAULT 0,     -- reservas pelo worker (retomas após crash incluídas)
+    criado_em REAL NOT NULL,
+    atualizado_em REAL NOT NULL,
+    erro TEXT
+);
+CREATE TABLE IF NOT EXISTS documentos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    ordem INTEGER NOT NULL,
+    nome TEXT NOT NULL,
+    caminho TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pendente',   -- pendente | concluido | falhou
+    num_chunks INTEGER DEFAULT 0,
+    metadados TEXT,
+    erro TEXT,
+    concluido_em REAL
+);
+CREATE INDEX IF NOT EXISTS idx_documentos_job ON documentos(job_id, ordem);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    pid INTEGER,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+def _config_ingestao():
+    config = carregar_config() or {}
+    return config.get('ingestao', {})
+
+
+def diretorio_base() -> str:
+    return _config_ingestao().get('diretorio', 'ingestao')
+
+
+def timeout_heartbeat() -> float:
+    return float(_config_ingestao().get('heartbeat_timeout_s', 30))
+
+
+def max_tentativas() -> int:
+    return int(_config_ingestao().get('max_tentativas', 3))
+
+
+def _pasta_uploads(job_id: str) -> str:
+    return os.path.join(diretorio_base(), "uploads", job_id)
+
+
+def _remover_uploads(job_id: str):
+    """Apaga os PDFs de um job terminado (já não vão ser lidos)."""
+    shutil.rmtree(_pasta_uploads(job_id), ignore_errors=True)
+
+
+def _conexao() -> sqlite3.Connection:
+    os.makedirs(diretorio_base(), exist_ok=True)
+    con = sqlite3.connect(os.path.join(diretorio_base(), "fila.db"), timeout=30,
+                          isolation_level=None)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(_ESQUEMA)
+    colunas = {linha[1] for linha in con.execute("PRAGMA table_info(jobs)")}
+    if 'workspace' not in colunas:   # filas criadas antes dos workspaces
+        con.execute("ALTER TABLE jobs ADD COLUMN workspace TEXT NOT NULL DEFAULT 'geral'")
+    if 'tentativas' not in colunas:
+        con.execute("ALTER TABLE jobs ADD COLUMN tentativas INTEGER NOT NULL DEFAULT 0")
+    return con
+
+
+# ---------- lado da app ----------
+
+def enfileirar_job(vector_store: str, arquivos: List[Tuple[str, bytes]], workspace: str = 'geral') -> str:
+    """
+    Guarda os PDFs em disco e cria um job pendente.
+
+    Args:
+        vector_store: Nome do vector store (chave em config['vector_stores'])
+        arquivos: Lista de (nome do ficheiro, bytes)
+        workspace: Workspace onde os documentos são indexados
+
+    Returns:
+        str: id do job
+    """
+    job_id = uuid.uuid4().hex[:12]
+    pasta = _pasta_uploads(job_id)
+    os.makedirs(pasta, exist_ok=True)
+
+    documentos = []
+    for ordem, (nome, conteudo) in enumerate(arquivos):
+        caminho = os.path.join(pasta, f"{ordem:04d}.pdf")
+        with open(caminho, 'wb') as f:
+            f.write(conteudo)
+        documentos.append((job_id, ordem, nome, caminho))
+
+    agora = time.time()
+    con = _conexao()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        con.execute("INSERT INTO jobs(id, vector_store, workspace, criado_em, atualizado_em) "
+                    "VALUES (?, ?, ?, ?, ?)", (job_id, vector_store, workspace, agora, agora))
+        con.executemany("INSERT INTO documentos(job_id, ordem, nome, caminho) VALUES (?, ?, ?, ?)",
+                        documentos)
+        con.execute("COMMIT")
+    finally:
+        con.close()
+    return job_id
+
+
+def obter_progresso(job_id: str) -> Optional[Dict]:
+    """
+    Estado de um job para a UI.
+
+    Returns:
+        dict com status, total, concluidos, falhas, erro, documentos
+        (nome, status, num_chunks, metadados) ou None se o job não existir
+    """
+    con = _conexao()
+    try:
+        job = con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        docs = con.execute("SELECT nome, status, num_chunks, metadados, erro FROM documentos "
+                           "WHERE job_id = ? ORDER BY ordem", (job_id,)).fetchall()
+    finally:
+        con.close()
+
+    documentos = [
+        {**dict(d), 'metadados': json.loads(d['metadados']) if d['metadados'] else None}
+        for d in docs
+    ]
+    return {
+        'id': job_id,
+        'vector_store': job['vector_store'],
+        'workspace': job['workspace'],
+        'status': job['status'],
+        'erro': job['erro'],
+        'total': len(documentos),
+        'concluidos': sum(d['status'] == 'concluido' for d in documentos),
+        'falhas': sum(d['status'] == 'falhou' for d in documentos),
+        'documentos': documentos,
+    }
+
+
+def listar_jobs(limite: int = 20) -> List[Dict]:
+    """Jobs mais recentes (sem os documentos)."""
+    con = _conexao()
+    try:
+        return [dict(r) for r in con.execute(
+            "SELECT id, vector_store, workspace, status, criado_em, atualizado_em, erro FROM jobs "
+            "ORDER BY criado_em DESC LIMIT ?", (limite,))]
+    finally:
+        con.close()
+
+
+def worker_ativo() -> bool:
+    """Há algum worker com heartbeat recente?"""
+    con = _conexao()
+    try:
+        linha = con.execute("SELECT MAX(heartbeat) FROM workers").fetchone()
+    finally:
+        con.close()
+    return bool(linha[0]) and time.time() - linha[0] < timeout_heartbeat()
+
+
+# ---------- lado do worker ----------
+
+def registar_heartbeat(worker_id: str, job_id: Optional[str] = None):
+    agora = time.time()
+    con = _conexao()
+    try:
+        con.execute("INSERT INTO workers(id, pid, heartbeat) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                    (worker_id, os.getpid(), agora))
+        if job_id:
+            con.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ?",
+                        (agora, job_id, worker_id))
+    finally:
+        con.close()
+
+
+def remover_worker(worker_id: str):
+    con = _conexao()
+    try:
+        con.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+    finally:
+        con.close()
+
+
+def recuperar_jobs_orfaos() -> int:
+    """
+    Devolve à fila os jobs 'executando' cujo worker deixou de dar sinal (crash).
+    Um job que já esgotou `ingestao.max_tentativas` (ex.: um PDF que derruba o
+    worker sempre) é dado como falhado e os seus PDFs apagados.
+    """
+    agora = time.time()
+    limite = agora - timeout_heartbeat()
+    con = _conexao()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        orfaos = con.execute("SELECT id, tentativas FROM jobs WHERE status = 'executando' "
+                             "AND (heartbeat IS NULL OR heartbeat < ?)", (limite,)).fetchall()
+        desistidos = [o['id'] for o in orfaos if o['tentativas'] >= max_tentativas()]
+        for job_id in desistidos:
+            con.execute("UPDATE jobs SET status = 'falhou', worker = NULL, erro = ?, atualizado_em = ? "
+                        "WHERE id = ?",
+                        (f"Worker interrompido {max_tentativas()} vez(es) durante o job", agora, job_id))
+        con.executemany("UPDATE jobs SET status = 'pendente', worker = NULL WHERE id = ?",
+                        [(o['id'],) for o in orfaos if o['id'] not in desistidos])
+        con.execute("COMMIT")
+    finally:
+        con.close()
+    for job_id in desistidos:
+        _remover_uploads(job_id)
+    return len(orfaos) - len(desistidos)
+
+
+def reservar_proximo_job(worker_id: str) -> Optional[Dict]:
+    """Reserva atomicamente o job pendente mais antigo."""
+    con = _conexao()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        job = con.execute("SELECT * FROM jobs WHERE status = 'pendente' "
+                          "ORDER BY criado_em LIMIT 1").fetchone()
+        if job is None:
+            con.execute("COMMIT")
+            return None
+        agora = time.time()
+        con.execute("UPDATE jobs SET status = 'executando', worker = ?, heartbeat = ?, "
+                    "tentativas = tentativas + 1, atualizado_em = ? WHERE id = ?",
+                    (worker_id, agora, agora, job['id']))
+        con.execute("COMMIT")
+        return dict(job)
+    finally:
+        con.close()
+
+
+def documentos_pendentes(job_id: str) -> List[Dict]:
+    """Documentos do job ainda por processar (os concluídos são saltados ao retomar)."""
+    con = _conexao()
+    try:
+        return [dict(r) for r in con.execute(
+            "SELECT id, nome, caminho FROM documentos WHERE job_id = ? AND status = 'pendente' "
+            "ORDER BY ordem", (job_id,))]
+    finally:
+        con.close()
+
+
+def concluir_documento(doc_id: int, num_chunks: int, metadados: Optional[Dict]):
+    """Checkpoint: o documento já está indexado."""
+    con = _conexao()
+    try:
+        con.execute("UPDATE documentos SET status = 'concluido', num_chunks = ?, metadados = ?, "
+                    "concluido_em = ? WHERE id = ?",
+                    (num_chunks, json.dumps(metadados, ensure_ascii=False) if metadados else None,
+                     time.time(), doc_id))
+    finally:
+        con.close()
+
+
+def falhar_documento(doc_id: int, erro: str):
+    con = _conexao()
+    try:
+        con.execute("UPDATE documentos SET status = 'falhou', erro = ?, concluido_em = ? WHERE id = ?",
+                    (erro, time.time(), doc_id))
+    finally:
+        con.close()
+
+
+def finalizar_job(job_id: str, erro: Optional[str] = None):
+    con = _conexao()
+    try:
+        con.execute("UPDATE jobs SET status = ?, erro = ?, atualizado_em = ? WHERE id = ?",
+                    ('falhou' if erro else 'concluido', erro, time.time(), job_id))
+    finally:
+        con.close()
+    _remover_uploads(job_id)
@@ -0,0 +1,182 @@
+# ingestion_worker.py
+"""
+Worker de ingestão de documentos, num processo separado da app.
+
+Uso: python ingestion_worker.py   (normalmente lançado pela app)
+
+Reserva jobs da fila (ingestion_queue), extrai texto e metadados de cada PDF,
+divide em chunks e indexa no vector store do job. Cada documento é marcado
+como concluído logo após ser indexado; se o processo morrer, o próximo worker
+devolve o job à fila (heartbeat expirado) e continua no documento seguinte ao
+último checkpoint. Um documento interrompido a meio da indexação pode ficar
+com chunks repetidos no índice (é reprocessado por inteiro).
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+import ingestion_queue as fila
+import tracing
+from config_loader import carregar_config
+
+INTERVALO_SONDAGEM_S = 1.0
+
+
+def _iniciar_heartbeat(worker_id, estado, parar):
+    """Thread que mantém o heartbeat do worker (e do job em curso) atualizado."""
+    intervalo = max(1.0, fila.timeout_heartbeat() / 3)
+
+    def ciclo():
+        while not parar.wait(intervalo):
+            try:
+                fila.registar_heartbeat(worker_id, estado.get('job_id'))
+            except Exception as e:
+                print(f"[ingestão] Falha no heartbeat: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=ciclo, name="heartbeat-ingestao", daemon=True)
+    thread.start()
+    return thread
+
+
+class QuotaExcedida(Exception):
+    pass
+
+
+def processar_documento(vector_store, caminho, nome, workspace=None):
+    """
+    Extrai, divide e indexa um PDF. Com `workspace`, recusa (QuotaExcedida)
+    um documento cujos chunks não cabem na quota de chunks do workspace.
+
+    Returns:
+        tuple: (número de chunks indexados, metadados bibliográficos)
+    """
+    import workspace_manager
+    from metadata_extractor import extrair_metadados_pdf
+    from rag_processor import dividir_texto_em_chunks, extrair_texto_pdf
+
+    with tracing.span("ingestao.documento", documento=nome) as s:
+        with open(caminho, 'rb') as f:
+            pdf_bytes = f.read()
+
+        with tracing.span("ingestao.metadados"):
+            metadados_completos = extrair_metadados_pdf(pdf_bytes, nome)
+        chunks, metadados = dividir_texto_em_chunks(extrair_texto_pdf(pdf_bytes), nome)
+        if workspace is not None:
+            cabe, erro_quota = workspace_manager.verificar_quota(workspace, novos_documentos=1,
+                                                                 novos_chunks=len(chunks))
+            if not cabe:
+                raise QuotaExcedida(erro_quota)
+        if chunks:
+            vector_store.adicionar(chunks, metadados)
+        s.definir(chunks=len(chunks), bytes=len(pdf_bytes))
+    return len(chunks), metadados_completos
+
+
+def executar_job(job):
+    """Processa os documentos pendentes de um job, com checkpoint por documento."""
+    import workspace_manager
+
+    nome_store, workspace = job['vector_store'], job['workspace']
+    config_stores = (carregar_config() or {}).get('vector_stores', {})
+    if nome_store not in config_stores:
+        fila.finalizar_job(job['id'], erro=f"Vector store desconhecido: {nome_store}")
+        return
+    if not workspace_manager.partilhavel_entre_processos(nome_store):
+        fila.finalizar_job(job['id'], erro=f"'{nome_store}' é um Chroma embutido, aberto só pela app: "
+                                           "configure `servidor` para o processar em segundo plano")
+        return
+
+    # Cache LRU partilhada: um worker que atende vários workspaces não os
+    # mantém todos em memória
+    vector_store = workspace_manager.obter_store(nome_store, workspace)
+
+    for doc in fila.documentos_pendentes(job['id']):
+        try:
+            cabe, erro_quota = workspace_manager.verificar_quota(workspace, novos_documentos=1)
+            if not cabe:
+                fila.falhar_documento(doc['id'], erro_quota)
+                continue
+            inicio = time.perf_counter()
+            num_chunks, metadados = processar_documento(vector_store, doc['caminho'], doc['nome'], workspace)
+            workspace_manager.registar_documentos(workspace, nome_store, [(doc['nome'], num_chunks, metadados)])
+            fila.concluir_documento(doc['id'], num_chunks, metadados)
+            duracao = time.perf_counter() - inicio
+            print(f"[ingestão] {doc['nome']}: {num_chunks} chunks em {duracao:.1f}s "
+                  f"({num_chunks / duracao if duracao > 0 else 0:.1f} chunks/s)")
+        except QuotaExcedida as e:
+            fila.falhar_documento(doc['id'], str(e))
+        except Exception as e:
+            traceback.print_exc()
+            fila.falhar_documento(doc['id'], str(e))
+
+    fila.finalizar_job(job['id'])
+
+
+def executar(ociosidade_max_s=None):
+    """
+    Ciclo principal: reserva e processa jobs até ficar ocioso durante
+    `ociosidade_max_s` segundos (None = para sempre).
+    """
+    worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    estado = {'job_id': None}
+    parar = threading.Event()
+
+    fila.registar_heartbeat(worker_id)
+    _iniciar_heartbeat(worker_id, estado, parar)
+    ocioso_desde = time.monotonic()
+    try:
+        while True:
+            fila.recuperar_jobs_orfaos()
+            job = fila.reservar_proximo_job(worker_id)
+            if job is None:
+                if ociosidade_max_s is not None and time.monotonic() - ocioso_desde > ociosidade_max_s:
+                    break
+                time.sleep(INTERVALO_SONDAGEM_S)
+                continue
+
+            estado['job_id'] = job['id']
+            print(f"[ingestão] Job {job['id']} ({job['vector_store']}, workspace {job['workspace']}) iniciado")
+            try:
+                executar_job(job)
+            except Exception as e:
+                traceback.print_exc()
+                fila.finalizar_job(job['id'], erro=str(e))
+            print(f"[ingestão] Job {job['id']} terminado")
+            estado['job_id'] = None
+            ocioso_desde = time.monotonic()
+    finally:
+        parar.set()
+        fila.remover_worker(worker_id)
+
+
+def iniciar_worker_em_segundo_plano():
+    """
+    Lança um worker num processo independente (sobrevive a recargas da
+    página e ao fim da sessão do Streamlit), se nenhum estiver ativo.
+
+    Returns:
+        bool: True se foi lançado um novo worker
+    """
+    if fila.worker_ativo():
+        return False
+
+    os.makedirs(fila.diretorio_base(), exist_ok=True)
+    log = open(os.path.join(fila.diretorio_base(), "worker.log"), 'a')
+    subprocess.Popen(
+        [sys.executable, "-u", os.path.abspath(__file__)],
+        cwd=os.getcwd(),
+        stdout=log, stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+    log.close()
+    return True
+
+
+if __name__ == "__main__":
+    config_ingestao = (carregar_config() or {}).get('ingestao', {})
+    executar(ociosidade_max_s=config_ingestao.get('ociosidade_max_s', 300))
@@ -1,8 +1,7 @@
 # llm_factory.py
 
-from llm_providers.gemini import GeminiProvider
-from llm_providers.openai import OpenAIProvider
-from llm_providers.claude import ClaudeProvider
+from resource_registry import importar_modulo
+# Os SDKs de cada provedor só são importados quando o provedor é usado.
 # O Deepseek usa a classe OpenAIProvider, então não precisamos de importação extra
 
 def get_llm_provider(provider_name, api_key, model_config):
@@ -10,15 +9,21 @@ def get_llm_provider(provider_name, api_key, model_config):
     Retorna uma instância do provedor de LLM apropriado.
     """
     if provider_name == "Gemini":
+        GeminiProvider = importar_modulo("llm_providers.gemini").GeminiProvider
         return GeminiProvider(api_key=api_key, model_name=model_config['model'])
         
     elif provider_name == "OpenAI":
-        return OpenAIProvider(api_key=api_key, model_name=model_config['model'])
+        OpenAIProvider = importar_modulo("llm_providers.openai").OpenAIProvider
+        return OpenAIProvider(api_key=api_key, model_name=model_config['model'],
+                              api_base_url=model_config.get('api_base_url'))
         
     elif provider_name == "Claude":
-        return ClaudeProvider(api_key=api_key, model_name=model_config['model'])
+        ClaudeProvider = importar_modulo("llm_providers.claude").ClaudeProvider
+        return ClaudeProvider(api_key=api_key, model_name=model_config['model'],
+                              cache_prompt=model_config.get('cache_prompt', True))
         
     elif provider_name == "Deepseek":
+        OpenAIProvider = importar_modulo("llm_providers.openai").OpenAIProvider
         return OpenAIProvider(
             api_key=api_key,
             model_name=model_config['model'],
@@ -26,11 +31,33 @@ def get_llm_provider(provider_name, api_key, model_config):
         )
         
     elif provider_name == "Moonshot Kimi":
+        OpenAIProvider = importar_modulo("llm_providers.openai").OpenAIProvider
         return OpenAIProvider(
             api_key=api_key,
             model_name=model_config['model'],
             api_base_url="https://api.moonshot.cn/v1"
         )
         
+    elif model_config.get('tipo') == "mock":
+        MockProvider = importar_modulo("llm_providers.mock").MockProvider
+        return MockProvider(
+            model_name=model_config.get('model', 'mock'),
+            ttft_ms=model_config.get('ttft_ms', 300),
+            tokens_por_s=model_config.get('tokens_por_s', 50),
+            tokens_resposta=model_config.get('tokens_resposta', 120),
+            taxa_erro=model_config.get('taxa_erro', 0.0),
+            taxa_429=model_config.get('taxa_429', 0.0),
+            semente=model_config.get('semente', 42)
+        )
+
+    elif model_config.get('tipo') == "openai":
+        # Qualquer API compatível com a da OpenAI (ex.: testes/servidor_openai_stub.py)
+        OpenAIProvider = importar_modulo("llm_providers.openai").OpenAIProvider
+        return OpenAIProvider(
+            api_key=api_key,
+            model_name=model_config['model'],
+            api_base_url=model_config.get('api_base_url')
+        )
+
     else:
         raise ValueError(f"Provedor desconhecido: {provider_name}")
\ No newline at end of file
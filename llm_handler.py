@@ -1,41 +1,120 @@
 # llm_handler.py
 
 from llm_factory import get_llm_provider
+from llm_providers.base import ResultadoLLM
+import tracing
+
+
+def _injetar_citacoes(contexto, metadados):
+    """Acrescenta a citação (fonte/página/secção) a cada bloco do contexto."""
+    # Quebra o contexto nos blocos separados por "---"
+    blocos = contexto.split("\n---\n")
+    if len(blocos) != len(metadados):          # segurança: mesma quantidade
+        return contexto
+    blocos_citados = []
+    for texto, meta in zip(blocos, metadados):
+        cit = f"(Fonte: {meta['fonte']}, p. {meta['page']}, sec. {meta['section']})"
+        blocos_citados.append(f"{texto.strip()} {cit}")
+    return "\n---\n".join(blocos_citados)
+
+
+def gerar_resultado_com_llm(provider_name, api_key, model_config, contexto, pergunta,
+                            historico_chat, nomes_ficheiros, config_geracao, metadados=None,
+                            system_prompt=None, persona_prompt=None):
+    """
+    Como gerar_resposta_com_llm, mas devolve o ResultadoLLM completo:
+    texto, tokens de entrada/saída/cache reportados pelo provedor e latência.
+    """
+    with tracing.span("llm.gerar", provedor=provider_name) as s:
+        try:
+            if metadados:
+                contexto = _injetar_citacoes(contexto, metadados)
+            provedor = get_llm_provider(provider_name, api_key, model_config)
+            resultado = provedor.gerar_resultado(
+                contexto=contexto,
+                pergunta=pergunta,
+                historico_chat=historico_chat,
+                nomes_ficheiros=nomes_ficheiros,
+                config_geracao=config_geracao,
+                system_prompt=system_prompt,
+                persona_prompt=persona_prompt
+            )
+        except Exception as e:
+            resultado = ResultadoLLM(texto=f"Ocorreu um erro no handler do LLM: {e}",
+                                     modelo=(model_config or {}).get('model', ''), erro=str(e))
+        _definir_uso(s, resultado)
+    return resultado
 
 
 def gerar_resposta_com_llm(provider_name, api_key, model_config, contexto, pergunta,
                           historico_chat, nomes_ficheiros, config_geracao, metadados=None,
-                          system_prompt=None, persona_prompt=None):
+                          system_prompt=None, persona_prompt=None, stream=False):
     """
     Obtém o provedor de LLM correto e solicita a geração da resposta.
     Se 'metadados' for fornecido, injeta citações (página/secão) em cada chunk do contexto.
+    Com stream=True devolve uma RespostaEmStream: iterável de trechos da resposta
+    (para st.write_stream) cujo `.resultado` tem o uso de tokens no fim.
     """
+    if not stream:
+        return gerar_resultado_com_llm(provider_name, api_key, model_config, contexto, pergunta,
+                                       historico_chat, nomes_ficheiros, config_geracao, metadados,
+                                       system_prompt, persona_prompt).texto
     try:
-        # 1. Injeta citações no contexto (caso haja metadados)
         if metadados:
-            # Quebra o contexto nos blocos separados por "---"
-            blocos = contexto.split("\n---\n")
-            if len(blocos) == len(metadados):          # segurança: mesma quantidade
-                blocos_citados = []
-                for texto, meta in zip(blocos, metadados):
-                    cit = f"(Fonte: {meta['fonte']}, p. {meta['page']}, sec. {meta['section']})"
-                    blocos_citados.append(f"{texto.strip()} {cit}")
-                contexto = "\n---\n".join(blocos_citados)
-
-        # 2. Fábrica de provedores
+            contexto = _injetar_citacoes(contexto, metadados)
         provedor = get_llm_provider(provider_name, api_key, model_config)
-
-        # 3. Geração da resposta
-        resposta = provedor.gerar_resposta(
+        return RespostaEmStream(provedor, provedor.gerar_resposta_stream(
             contexto=contexto,
             pergunta=pergunta,
             historico_chat=historico_chat,
             nomes_ficheiros=nomes_ficheiros,
             config_geracao=config_geracao,
-            system_prompt=system_prompt,      
-            persona_prompt=persona_prompt     
-        )
-        return resposta
-
+            system_prompt=system_prompt,
+            persona_prompt=persona_prompt
+        ))
     except Exception as e:
-        return f"Ocorreu um erro no handler do LLM: {e}"
\ No newline at end of file
+        mensagem = f"Ocorreu um erro no handler do LLM: {e}"
+        return RespostaEmStream(None, iter([mensagem]),
+                                ResultadoLLM(texto=mensagem, modelo=(model_config or {}).get('model', ''),
+                                             erro=str(e)))
+
+
+class RespostaEmStream:
+    """
+    Trechos da resposta à medida que chegam. Erros a meio do streaming terminam
+    a resposta com a mensagem de erro. Depois de consumido, `resultado` tem o
+    ResultadoLLM reportado pelo provedor (None se o provedor não o indicar).
+    """
+
+    def __init__(self, provedor, trechos, resultado=None):
+        self._provedor = provedor
+        self._trechos = trechos
+        self.resultado = resultado
+
+    def __iter__(self):
+        modelo = getattr(self._provedor, 'model_name', '')
+        with tracing.span("llm.gerar_stream", modelo=modelo) as s:
+            # Pedido, rede e prefill até ao primeiro trecho; o resto do span é a geração
+            espera = tracing.iniciar("llm.primeiro_token")
+            try:
+                for trecho in self._trechos:
+                    espera.terminar()
+                    yield trecho
+            except Exception as e:
+                espera.terminar(erro=e)
+                yield f"\n\nOcorreu um erro no handler do LLM: {e}"
+                self.resultado = ResultadoLLM(texto="", modelo=modelo, erro=str(e))
+            espera.terminar()
+            if self.resultado is None:
+                self.resultado = getattr(self._provedor, 'ultimo_resultado', None)
+            _definir_uso(s, self.resultado)
+
+
+def _definir_uso(s, resultado):
+    """Tokens e erro do ResultadoLLM como atributos do span."""
+    if resultado is None:
+        return
+    s.definir(tokens_entrada=resultado.tokens_entrada, tokens_saida=resultado.tokens_saida,
+              tokens_cache=resultado.tokens_cache, tokens_cache_escrita=resultado.tokens_cache_escrita)
+    if resultado.erro:
+        s.definir(erro=resultado.erro)
@@ -2,7 +2,40 @@
 
 # llm_providers/base.py
 
+import time
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import prompt_templates
+import tracing
+
+# Respostas 429 (limite de taxa): número de tentativas e espera inicial (exponencial)
+TENTATIVAS_LIMITE_TAXA = 3
+ESPERA_LIMITE_TAXA_S = 1.0
+
+
+@dataclass
+class ResultadoLLM:
+    """Resposta de um provedor com o uso de tokens reportado pelo SDK."""
+    texto: str
+    modelo: str
+    tokens_entrada: int = 0
+    tokens_saida: int = 0
+    tokens_cache: int = 0          # tokens de entrada servidos pela cache do provedor
+    tokens_cache_escrita: int = 0  # tokens de entrada escritos na cache (Claude; cobrados à parte)
+    latencia_ms: float = 0.0
+    estimado: bool = False         # True quando o provedor não reporta uso (contagem aproximada)
+    erro: Optional[str] = None
+
+    def para_dict(self):
+        return asdict(self)
+
+
+def estimar_tokens(texto):
+    """Aproximação usada quando o SDK não devolve o uso (~1,3 tokens por palavra)."""
+    return int(len((texto or "").split()) * 1.3)
+
 
 class LLMProvider(ABC):
     """
@@ -11,7 +44,8 @@ class LLMProvider(ABC):
     """
 
     @abstractmethod
-    def gerar_resposta(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao):
+    def gerar_resultado(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                        system_prompt=None, persona_prompt=None):
         """
         Gera uma resposta baseada no prompt.
 
@@ -23,52 +57,48 @@ class LLMProvider(ABC):
             config_geracao (dict): Dicionário com parâmetros como 'temperature', 'top_p', etc.
 
         Returns:
-            str: A resposta gerada pelo modelo.
+            ResultadoLLM: O texto gerado, o uso de tokens e a latência da chamada.
         """
         pass
 
+    def gerar_resposta(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                       system_prompt=None, persona_prompt=None):
+        """Só o texto da resposta (ver gerar_resultado)."""
+        return self.gerar_resultado(contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                                    system_prompt=system_prompt, persona_prompt=persona_prompt).texto
+
+    def gerar_resposta_stream(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                              system_prompt=None, persona_prompt=None):
+        """
+        Gera a resposta em partes, à medida que o modelo as produz.
+        Por omissão devolve a resposta completa de uma vez; os provedores com
+        streaming nativo substituem este método. No fim, `self.ultimo_resultado`
+        tem o ResultadoLLM da chamada.
+
+        Yields:
+            str: Trechos consecutivos da resposta.
+        """
+        self.ultimo_resultado = self.gerar_resultado(contexto, pergunta, historico_chat, nomes_ficheiros,
+                                                     config_geracao, system_prompt=system_prompt,
+                                                     persona_prompt=persona_prompt)
+        yield self.ultimo_resultado.texto
+
+    def _com_retentativas(self, chamada):
+        """Executa `chamada()`, repetindo-a com espera exponencial se o provedor responder 429."""
+        for tentativa in range(TENTATIVAS_LIMITE_TAXA):
+            try:
+                return chamada()
+            except Exception as e:
+                if getattr(e, 'status_code', None) != 429 or tentativa == TENTATIVAS_LIMITE_TAXA - 1:
+                    raise
+                time.sleep(ESPERA_LIMITE_TAXA_S * 2 ** tentativa)
+
+    @tracing.rastrear("llm.construir_prompt")
     def _construir_prompt(self, contexto, pergunta, historico_chat, nomes_ficheiros,
                          system_prompt=None, persona_prompt=None):
         """
-        Constrói o prompt final com instruções de citação.
-        """
-        historico_formatado = "\n".join([f"{msg['role']}: {msg['content']}" for msg in historico_chat])
-
-        # Usar system_prompt customizado se fornecido
-        if system_prompt is None:
-            base_instruction = "Você é um assistente de pesquisa acadêmica. Responda à **Última pergunta do usuário** baseando-se **apenas** no **Contexto** e no **Histórico da Conversa**."
-        else:
-            base_instruction = system_prompt
-        
-        # Adicionar persona se fornecida
-        persona_section = ""
-        if persona_prompt is not None:
-            persona_section = f"\n\n**PERSONA ATIVA:**\n{persona_prompt}"
-
-        # --- nova instrução de citação ---
-        citacao_instrucao = (
-            "IMPORTANTE: sempre que usar informações do contexto, "
-            "cite a fonte exatamente como: (Fonte, p. {page}, sec. {section}). "
-            "Se a página ou seção não estiver disponível, omita esse campo."
-        )
-
-        prompt = f"""
-        {base_instruction}{persona_section}
-
-        {citacao_instrucao}
-
-        Arquivos carregados: {', '.join(nomes_ficheiros)}.
-
-        **Histórico da Conversa:**
-        {historico_formatado}
-
-        **Contexto (cada trecho já inclui página/seção):**
-        ---
-        {contexto}
-        ---
-
-        **Última pergunta do usuário:** {pergunta}
-
-        **Sua resposta (em português, com citações):**
+        Constrói o prompt final com instruções de citação (prefixo estático
+        primeiro, ver prompt_templates).
         """
-        return prompt
\ No newline at end of file
+        return prompt_templates.prompt_texto(contexto, pergunta, historico_chat, nomes_ficheiros,
+                                             system_prompt=system_prompt, persona_prompt=persona_prompt)
@@ -1,61 +1,80 @@
 # llm_providers/claude.py
 
+import time
 import anthropic
-from .base import LLMProvider
+import prompt_templates
+import tracing
+from .base import LLMProvider, ResultadoLLM
 
 class ClaudeProvider(LLMProvider):
-    def __init__(self, api_key, model_name='claude-sonnet-4-20250514'):
+    def __init__(self, api_key, model_name='claude-sonnet-4-20250514', cache_prompt=True):
         self.api_key = api_key
         self.model_name = model_name
-        self.client = anthropic.Anthropic(api_key=self.api_key)
-
-    def gerar_resposta(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
-                      system_prompt=None, persona_prompt=None):
-        # Claude também prefere um prompt de sistema e um histórico de mensagens
-        # Usar system_prompt customizado se fornecido
-        if system_prompt is None:
-            system_prompt = """Você é um assistente de pesquisa acadêmica. Responda à última pergunta do usuário baseando-se no "Contexto" fornecido.
-
-IMPORTANTE: sempre que usar informações do contexto, cite a fonte exatamente como: (Fonte, p. {page}, sec. {section})."""
-        
-        # Adicionar persona se fornecida
-        persona_section = ""
-        if persona_prompt is not None:
-            persona_section = f"\n\n**PERSONA ATIVA:**\n{persona_prompt}\n"
-        
-        # Montar prompt_sistema final
-        prompt_sistema = f"""{system_prompt}{persona_section}
-
-**Arquivos carregados:** {', '.join(nomes_ficheiros)}
-
-**Contexto relevante:**
----
-{contexto}
----"""
-
-        # Adapta o histórico, garantindo que começa com 'user'
+        self.cache_prompt = cache_prompt
+        # Sem retentativas no SDK: as de 429 são feitas só por _com_retentativas
+        self.client = anthropic.Anthropic(api_key=self.api_key, max_retries=0)
+
+    @tracing.rastrear("llm.construir_prompt")
+    def _pedido(self, contexto, pergunta, historico_chat, nomes_ficheiros, system_prompt=None, persona_prompt=None):
+        """
+        Prompt de sistema e mensagens. Com cache_prompt, o prefixo estático e o
+        histórico levam pontos de corte `cache_control`: nos turnos seguintes
+        são lidos da cache (ao preço `cache`) em vez de processados de novo.
+        """
+        prompt_sistema = prompt_templates.prefixo_estatico(system_prompt, persona_prompt, nomes_ficheiros)
+
+        *historico, atual = prompt_templates.mensagens_chat(historico_chat, contexto, pergunta)
+        # Adapta o histórico, garantindo a alternância correta de roles
         mensagens = []
-        for msg in historico_chat:
-            # Garante a alternância correta de roles
+        for msg in historico:
             if not mensagens or mensagens[-1]["role"] != msg["role"]:
-                 mensagens.append({"role": msg["role"], "content": msg["content"]})
-        
-        # Adiciona a pergunta atual
+                mensagens.append(msg)
+
+        # Adiciona o contexto e a pergunta atual
         if not mensagens or mensagens[-1]["role"] == "assistant":
-            mensagens.append({"role": "user", "content": pergunta})
+            mensagens.append(atual)
         else: # Se a última mensagem já for do usuário, anexa a pergunta
-            mensagens[-1]["content"] += f"\n\n{pergunta}"
+            mensagens[-1]["content"] += f"\n\n{atual['content']}"
+
+        if not self.cache_prompt:
+            return prompt_sistema, mensagens
+        sistema = [{"type": "text", "text": prompt_sistema, "cache_control": {"type": "ephemeral"}}]
+        if len(mensagens) > 1:
+            # Fim do histórico (tudo menos o contexto e a pergunta do turno atual)
+            anterior = mensagens[-2]
+            mensagens[-2] = {"role": anterior["role"], "content": [
+                {"type": "text", "text": anterior["content"], "cache_control": {"type": "ephemeral"}}
+            ]}
+        return sistema, mensagens
 
+    def gerar_resultado(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                        system_prompt=None, persona_prompt=None):
+        prompt_sistema, mensagens = self._pedido(contexto, pergunta, historico_chat, nomes_ficheiros,
+                                                 system_prompt, persona_prompt)
 
+        inicio = time.perf_counter()
         try:
-            resposta = self.client.messages.create(
+            resposta = self._com_retentativas(lambda: self.client.messages.create(
                 model=self.model_name,
                 system=prompt_sistema,
                 messages=mensagens,
                 temperature=config_geracao.get('temperature'),
                 top_p=config_geracao.get('top_p'),
                 max_tokens=config_geracao.get('max_output_tokens'),
-            )
-            return resposta.content[0].text
+            ))
         except Exception as e:
-            return f"Erro ao chamar a API do Claude: {e}"
\ No newline at end of file
+            return ResultadoLLM(texto=f"Erro ao chamar a API do Claude: {e}", modelo=self.model_name,
+                                erro=str(e), latencia_ms=(time.perf_counter() - inicio) * 1000)
+        uso = resposta.usage
+        cache = getattr(uso, 'cache_read_input_tokens', 0) or 0
+        cache_escrita = getattr(uso, 'cache_creation_input_tokens', 0) or 0
+        return ResultadoLLM(
+            texto=resposta.content[0].text,
+            modelo=self.model_name,
+            # input_tokens não inclui os tokens lidos nem os escritos na cache
+            tokens_entrada=uso.input_tokens + cache + cache_escrita,
+            tokens_saida=uso.output_tokens,
+            tokens_cache=cache,
+            tokens_cache_escrita=cache_escrita,
+            latencia_ms=(time.perf_counter() - inicio) * 1000
+        )
\ No newline at end of file
@@ -1,7 +1,8 @@
 # llm_providers/gemini.py
 
+import time
 import google.generativeai as genai
-from .base import LLMProvider
+from .base import LLMProvider, ResultadoLLM, estimar_tokens
 
 class GeminiProvider(LLMProvider):
     def __init__(self, api_key, model_name='gemini-2.5-flash'):
@@ -9,8 +10,8 @@ class GeminiProvider(LLMProvider):
         self.model_name = model_name
         genai.configure(api_key=self.api_key)
 
-    def gerar_resposta(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
-                      system_prompt=None, persona_prompt=None):
+    def gerar_resultado(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                        system_prompt=None, persona_prompt=None):
         prompt = self._construir_prompt(contexto, pergunta, historico_chat, nomes_ficheiros,
                                        system_prompt=system_prompt, persona_prompt=persona_prompt)
         
@@ -23,8 +24,24 @@ class GeminiProvider(LLMProvider):
         
         model = genai.GenerativeModel(self.model_name, generation_config=generation_config)
         
+        inicio = time.perf_counter()
         try:
             resposta = model.generate_content(prompt)
-            return resposta.text
         except Exception as e:
-            return f"Erro ao chamar a API do Gemini: {e}"
\ No newline at end of file
+            mensagem = f"Erro ao chamar a API do Gemini: {e}"
+            return ResultadoLLM(texto=mensagem, modelo=self.model_name, erro=str(e),
+                                latencia_ms=(time.perf_counter() - inicio) * 1000)
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        uso = getattr(resposta, 'usage_metadata', None)
+        if uso is None:
+            return ResultadoLLM(texto=resposta.text, modelo=self.model_name, latencia_ms=latencia_ms,
+                                tokens_entrada=estimar_tokens(prompt), tokens_saida=estimar_tokens(resposta.text),
+                                estimado=True)
+        return ResultadoLLM(
+            texto=resposta.text,
+            modelo=self.model_name,
+            tokens_entrada=uso.prompt_token_count,
+            tokens_saida=uso.candidates_token_count,
+            tokens_cache=getattr(uso, 'cached_content_token_count', 0) or 0,
+            latencia_ms=latencia_ms
+        )
\ No newline at end of file
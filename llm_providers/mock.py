@@ -0,0 +1,118 @@
+# llm_providers/mock.py
+
+import hashlib
+import random
+import re
+import threading
+import time
+
+import prompt_templates
+from .base import LLMProvider, ResultadoLLM, estimar_tokens
+
+PALAVRAS = ("os resultados indicam que o modelo proposto melhora a deteção de ataques "
+            "com base nas métricas avaliadas no conjunto de dados considerado").split()
+
+_lock = threading.Lock()
+_geradores = {}   # semente -> random.Random partilhado por todas as instâncias
+_prefixos_vistos = set()   # cache de prompt simulada: prefixos estáticos já enviados
+
+
+class ErroLimiteTaxa(Exception):
+    """429 simulado (mesmo atributo que os erros de limite de taxa dos SDKs)."""
+    status_code = 429
+
+
+def _sortear(semente, probabilidade):
+    with _lock:
+        gerador = _geradores.setdefault(semente, random.Random(semente))
+        return gerador.random() < probabilidade
+
+
+def _tokens_em_cache(prefixo):
+    """Como a cache de prefixos de um provedor real: o prefixo só é servido da cache a partir do 2.º pedido."""
+    with _lock:
+        visto = prefixo in _prefixos_vistos
+        _prefixos_vistos.add(prefixo)
+    return estimar_tokens(prefixo) if visto else 0
+
+
+def resposta_simulada(contexto, pergunta, num_tokens):
+    """
+    Texto determinístico para (contexto, pergunta): cita as fontes do
+    contexto como um modelo real faria e completa até `num_tokens` palavras.
+    """
+    # Citações já injetadas pelo llm_handler ("(Fonte: x, p. 1, sec. y)") ou só o nome da fonte
+    citacoes = list(dict.fromkeys(re.findall(r"\(Fonte: [^)]*\)", contexto or "")))
+    if not citacoes:
+        fontes = dict.fromkeys(f.strip() for f in re.findall(r"Fonte: ([^\n]+)", contexto or ""))
+        citacoes = [f"({fonte})" for fonte in fontes]
+    partes = [f"Resposta simulada para: {pergunta.strip()}"]
+    partes += [f"O contexto aborda o tema {citacao}." for citacao in citacoes[:3]]
+    tokens = " ".join(partes).split()
+
+    semente = int(hashlib.md5(f"{pergunta}|{contexto}".encode("utf-8")).hexdigest()[:8], 16)
+    gerador = random.Random(semente)
+    while len(tokens) < num_tokens:
+        tokens.append(gerador.choice(PALAVRAS))
+    return [t + " " for t in tokens]
+
+
+class MockProvider(LLMProvider):
+    """
+    Provedor local para testes de carga e latência, sem chamadas a APIs.
+
+    Simula o tempo até ao primeiro token, a velocidade de geração, erros e
+    respostas 429 (repetidas com a mesma espera exponencial dos provedores reais).
+    """
+
+    def __init__(self, model_name="mock", ttft_ms=300, tokens_por_s=50, tokens_resposta=120,
+                 taxa_erro=0.0, taxa_429=0.0, semente=42):
+        self.model_name = model_name
+        self.ttft_s = ttft_ms / 1000
+        self.tokens_por_s = tokens_por_s
+        self.tokens_resposta = tokens_resposta
+        self.taxa_erro = taxa_erro
+        self.taxa_429 = taxa_429
+        self.semente = semente
+
+    def _abrir(self, contexto, pergunta, config_geracao):
+        """Equivalente ao pedido à API: pode falhar antes do primeiro token."""
+        if _sortear(self.semente, self.taxa_429):
+            raise ErroLimiteTaxa("429 Too Many Requests (simulado)")
+        if _sortear(self.semente, self.taxa_erro):
+            raise RuntimeError("500 Internal Server Error (simulado)")
+        num_tokens = min(self.tokens_resposta, config_geracao.get('max_output_tokens') or self.tokens_resposta)
+        return resposta_simulada(contexto, pergunta, num_tokens)
+
+    def gerar_resposta_stream(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                              system_prompt=None, persona_prompt=None):
+        inicio = time.perf_counter()
+        # Uso "reportado" pelo mock: contagem aproximada do que um provedor real receberia
+        prefixo = prompt_templates.prefixo_estatico(system_prompt, persona_prompt, nomes_ficheiros)
+        entrada = estimar_tokens(" ".join([prefixo, contexto or "", pergunta,
+                                           *(m["content"] for m in historico_chat)]))
+        cache = _tokens_em_cache(prefixo)
+        try:
+            tokens = self._com_retentativas(lambda: self._abrir(contexto, pergunta, config_geracao))
+        except Exception as e:
+            mensagem = f"Erro ao chamar a API ({self.model_name}): {e}"
+            self.ultimo_resultado = ResultadoLLM(texto=mensagem, modelo=self.model_name, erro=str(e),
+                                                 latencia_ms=(time.perf_counter() - inicio) * 1000)
+            yield mensagem
+            return
+        time.sleep(self.ttft_s)
+        intervalo = 1 / self.tokens_por_s if self.tokens_por_s else 0
+        for token in tokens:
+            yield token
+            time.sleep(intervalo)
+        self.ultimo_resultado = ResultadoLLM(
+            texto="".join(tokens).strip(), modelo=self.model_name, tokens_entrada=entrada,
+            tokens_saida=len(tokens), tokens_cache=cache, latencia_ms=(time.perf_counter() - inicio) * 1000
+        )
+
+    def gerar_resultado(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                        system_prompt=None, persona_prompt=None):
+        for _ in self.gerar_resposta_stream(contexto, pergunta, historico_chat, nomes_ficheiros,
+                                            config_geracao, system_prompt, persona_prompt):
+            pass
+        return self.ultimo_resultado
@@ -1,7 +1,10 @@
 # llm_providers/openai.py
 
+import time
 import openai
-from .base import LLMProvider
+import prompt_templates
+import tracing
+from .base import LLMProvider, ResultadoLLM, estimar_tokens
 
 class OpenAIProvider(LLMProvider):
     def __init__(self, api_key, model_name, api_base_url=None):
@@ -10,52 +13,76 @@ class OpenAIProvider(LLMProvider):
         self.api_base_url = api_base_url
         
         self.client = openai.OpenAI(
-            api_key=self.api_key,
-            base_url=self.api_base_url  # Será None para a OpenAI oficial
+            api_key=self.api_key or "local",  # servidores locais compatíveis não exigem chave
+            base_url=self.api_base_url,  # Será None para a OpenAI oficial
+            max_retries=0  # as retentativas (429) são feitas só por _com_retentativas
         )
 
-    def gerar_resposta(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
-                      system_prompt=None, persona_prompt=None):
-        # Para APIs do tipo OpenAI, é melhor enviar o histórico como uma lista de mensagens
-        # e o prompt do sistema separadamente.
-        
-        # Usar system_prompt customizado se fornecido
-        if system_prompt is None:
-            system_prompt = """Você é um assistente de pesquisa acadêmica. Responda à última pergunta do usuário baseando-se no "Contexto" fornecido.
+    @tracing.rastrear("llm.construir_prompt")
+    def _mensagens(self, contexto, pergunta, historico_chat, nomes_ficheiros,
+                   system_prompt=None, persona_prompt=None):
+        # Prefixo estático (sistema) e histórico primeiro, contexto e pergunta no fim:
+        # o início do pedido repete-se entre turnos e é servido pela cache de prefixos
+        # da API (OpenAI e Deepseek fazem-no automaticamente)
+        prompt_sistema = prompt_templates.prefixo_estatico(system_prompt, persona_prompt, nomes_ficheiros)
+        return [{"role": "system", "content": prompt_sistema},
+                *prompt_templates.mensagens_chat(historico_chat, contexto, pergunta)]
 
-IMPORTANTE: sempre que usar informações do contexto, cite a fonte exatamente como: (Fonte, p. {page}, sec. {section})."""
-        
-        # Adicionar persona se fornecida
-        persona_section = ""
-        if persona_prompt is not None:
-            persona_section = f"\n\n**PERSONA ATIVA:**\n{persona_prompt}\n"
-        
-        # Montar prompt_sistema final
-        prompt_sistema = f"""{system_prompt}{persona_section}
+    def _criar(self, mensagens, config_geracao, stream=False):
+        extra = {"stream_options": {"include_usage": True}} if stream else {}
+        return self._com_retentativas(lambda: self.client.chat.completions.create(
+            model=self.model_name,
+            messages=mensagens,
+            temperature=config_geracao.get('temperature'),
+            top_p=config_geracao.get('top_p'),
+            max_tokens=config_geracao.get('max_output_tokens'),
+            stream=stream,
+            **extra,
+        ))
 
-**Arquivos carregados:** {', '.join(nomes_ficheiros)}
+    def _resultado(self, texto, uso, mensagens, inicio):
+        """ResultadoLLM a partir do campo `usage` (estimado se a API não o devolver)."""
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        if uso is None:
+            entrada = sum(estimar_tokens(m["content"]) for m in mensagens)
+            return ResultadoLLM(texto=texto, modelo=self.model_name, tokens_entrada=entrada,
+                                tokens_saida=estimar_tokens(texto), latencia_ms=latencia_ms, estimado=True)
+        detalhes = getattr(uso, 'prompt_tokens_details', None)
+        # OpenAI: prompt_tokens_details.cached_tokens; Deepseek: prompt_cache_hit_tokens
+        cache = (getattr(detalhes, 'cached_tokens', None) if detalhes else None) \
+            or getattr(uso, 'prompt_cache_hit_tokens', 0) or 0
+        return ResultadoLLM(texto=texto, modelo=self.model_name, tokens_entrada=uso.prompt_tokens,
+                            tokens_saida=uso.completion_tokens, tokens_cache=cache, latencia_ms=latencia_ms)
 
-**Contexto relevante:**
----
-{contexto}
----"""
-        
-        mensagens = [{"role": "system", "content": prompt_sistema}]
-        
-        # Adapta o histórico para o formato do OpenAI
-        for msg in historico_chat:
-            mensagens.append({"role": msg["role"], "content": msg["content"]})
-            
-        mensagens.append({"role": "user", "content": pergunta})
+    def gerar_resultado(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                        system_prompt=None, persona_prompt=None):
+        mensagens = self._mensagens(contexto, pergunta, historico_chat, nomes_ficheiros,
+                                    system_prompt, persona_prompt)
+        inicio = time.perf_counter()
+        try:
+            resposta = self._criar(mensagens, config_geracao)
+        except Exception as e:
+            return ResultadoLLM(texto=f"Erro ao chamar a API ({self.model_name}): {e}", modelo=self.model_name,
+                                erro=str(e), latencia_ms=(time.perf_counter() - inicio) * 1000)
+        return self._resultado(resposta.choices[0].message.content, resposta.usage, mensagens, inicio)
 
+    def gerar_resposta_stream(self, contexto, pergunta, historico_chat, nomes_ficheiros, config_geracao,
+                              system_prompt=None, persona_prompt=None):
+        mensagens = self._mensagens(contexto, pergunta, historico_chat, nomes_ficheiros,
+                                    system_prompt, persona_prompt)
+        inicio = time.perf_counter()
+        trechos, uso = [], None
         try:
-            resposta = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=mensagens,
-                temperature=config_geracao.get('temperature'),
-                top_p=config_geracao.get('top_p'),
-                max_tokens=config_geracao.get('max_output_tokens'),
-            )
-            return resposta.choices[0].message.content
+            for parte in self._criar(mensagens, config_geracao, stream=True):
+                # Com include_usage, o último evento traz o uso e nenhuma escolha
+                uso = getattr(parte, 'usage', None) or uso
+                if parte.choices and parte.choices[0].delta.content:
+                    trechos.append(parte.choices[0].delta.content)
+                    yield trechos[-1]
         except Exception as e:
-            return f"Erro ao chamar a API ({self.model_name}): {e}"
\ No newline at end of file
+            mensagem = f"Erro ao chamar a API ({self.model_name}): {e}"
+            self.ultimo_resultado = ResultadoLLM(texto="".join(trechos) + mensagem, modelo=self.model_name,
+                                                 erro=str(e), latencia_ms=(time.perf_counter() - inicio) * 1000)
+            yield mensagem
+            return
+        self.ultimo_resultado = self._resultado("".join(trechos), uso, mensagens, inicio)
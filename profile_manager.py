@@ -6,13 +6,24 @@ Permite salvar, carregar, buscar e organizar perfis com tags.
 
 import os
 import json
+import threading
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import re
 
 # Diretório para salvar perfis
 PERFIS_DIR = "perfis_salvos"
 
+# Catálogo com os resumos dos perfis, invalidado por ficheiro via mtime e tamanho
+CATALOGO_FILE = os.path.join(PERFIS_DIR, "_catalogo.json")
+
+# As sessões do Streamlit correm em threads: a atualização do catálogo é
+# feita com o lock e as estruturas novas substituem as antigas de uma só vez
+# (quem já as leu continua com uma versão completa e coerente)
+_lock = threading.Lock()
+_catalogo = None          # {filename: {'mtime', 'size', 'resumo'}}
+_indices = ([], {})       # (resumos do mais recente para o mais antigo, tag (minúsculas) -> {filepath})
+
 def inicializar_diretorio_perfis():
     """Garante que o diretório de perfis existe."""
     if not os.path.exists(PERFIS_DIR):
@@ -115,44 +126,165 @@ def salvar_perfil(nome_pesquisador: str,
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(perfil_completo, f, ensure_ascii=False, indent=2)
     
+    # Indexa para a busca semântica (falhas não impedem o salvamento;
+    # o perfil é indexado depois por profile_search.indexar_pendentes)
+    try:
+        import profile_search
+        profile_search.indexar_perfil(filepath, perfil_completo)
+    except Exception:
+        pass
+    
     return filepath
 
-def listar_perfis_salvos() -> List[Dict]:
+def _resumir_perfil(perfil_data: Dict, filepath: str) -> Dict:
+    """Extrai apenas os campos usados nos cards da biblioteca."""
+    return {
+        'nome': perfil_data.get('nome_pesquisador', 'Desconhecido'),
+        'data': perfil_data.get('data_criacao', ''),
+        'tags': perfil_data.get('tags', []),
+        'num_artigos': perfil_data.get('estatisticas', {}).get('num_artigos', 0),
+        'filepath': filepath,
+        'anos': perfil_data.get('estatisticas', {}).get('anos', [])
+    }
+
+def _carregar_catalogo() -> Dict:
+    """Lê o catálogo persistido ({filename: {mtime, size, resumo}})."""
+    try:
+        with open(CATALOGO_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _salvar_catalogo(catalogo: Dict):
+    tmp = CATALOGO_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(catalogo, f, ensure_ascii=False)
+    os.replace(tmp, CATALOGO_FILE)
+
+def _reconstruir_indices(catalogo: Dict) -> Tuple[List[Dict], Dict[str, set]]:
+    """Cria a lista ordenada de resumos e o índice invertido de tags."""
+    perfis_ordenados = sorted(
+        (entrada['resumo'] for entrada in catalogo.values()),
+        key=lambda x: x['data'], reverse=True
+    )
+    indice_tags = {}
+    for perfil in perfis_ordenados:
+        for tag in perfil['tags']:
+            indice_tags.setdefault(tag.lower(), set()).add(perfil['filepath'])
+    return perfis_ordenados, indice_tags
+
+def _atualizar_catalogo() -> Tuple[List[Dict], Dict[str, set]]:
     """
-    Lista todos os perfis salvos com seus metadados.
-    
+    Sincroniza o catálogo com o diretório: só os ficheiros novos ou cujo
+    mtime/tamanho mudou são relidos; os restantes usam o resumo em cache.
+
     Returns:
-        Lista de dicionários com: nome, data, tags, num_artigos, filepath
+        tuple: (perfis ordenados, índice de tags) atuais; não devem ser alterados
     """
+    global _catalogo, _indices
     inicializar_diretorio_perfis()
-    
-    perfis = []
-    
-    for filename in os.listdir(PERFIS_DIR):
-        if filename.endswith('.json'):
-            filepath = os.path.join(PERFIS_DIR, filename)
-            
+
+    with _lock:
+        if _catalogo is None:
+            _catalogo = _carregar_catalogo()
+            _indices = _reconstruir_indices(_catalogo)
+        catalogo = dict(_catalogo)
+
+        alterado = _sincronizar_com_diretorio(catalogo)
+        if alterado:
+            _catalogo, _indices = catalogo, _reconstruir_indices(catalogo)
+            try:
+                _salvar_catalogo(catalogo)
+            except OSError:
+                pass  # O catálogo em disco é só uma cache; volta a ser gerado
+        return _indices
+
+def _sincronizar_com_diretorio(catalogo: Dict) -> bool:
+    """Atualiza `catalogo` com os ficheiros do diretório; True se algo mudou."""
+    alterado = False
+    vistos = set()
+
+    with os.scandir(PERFIS_DIR) as entradas:
+        for entrada in entradas:
+            # Ficheiros começados por "_" são internos (catálogo, índices)
+            if not entrada.name.endswith('.json') or entrada.name.startswith('_'):
+                continue
+            vistos.add(entrada.name)
+            stat = entrada.stat()
+            em_cache = catalogo.get(entrada.name)
+            if em_cache and em_cache['mtime'] == stat.st_mtime and em_cache['size'] == stat.st_size:
+                continue
+
+            filepath = os.path.join(PERFIS_DIR, entrada.name)
             try:
                 with open(filepath, 'r', encoding='utf-8') as f:
                     perfil_data = json.load(f)
-                
-                perfis.append({
-                    'nome': perfil_data.get('nome_pesquisador', 'Desconhecido'),
-                    'data': perfil_data.get('data_criacao', ''),
-                    'tags': perfil_data.get('tags', []),
-                    'num_artigos': perfil_data.get('estatisticas', {}).get('num_artigos', 0),
-                    'filepath': filepath,
-                    'anos': perfil_data.get('estatisticas', {}).get('anos', [])
-                })
-            except Exception as e:
+            except Exception:
                 # Se houver erro ao ler, pula o arquivo
+                if catalogo.pop(entrada.name, None) is not None:
+                    alterado = True
                 continue
+
+            catalogo[entrada.name] = {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'resumo': _resumir_perfil(perfil_data, filepath)
+            }
+            alterado = True
+
+    for removido in set(catalogo) - vistos:
+        del catalogo[removido]
+        alterado = True
+    return alterado
+
+def listar_perfis_salvos() -> List[Dict]:
+    """
+    Lista todos os perfis salvos com seus metadados.
+    Usa o catálogo em cache: o conteúdo completo dos perfis não é lido.
+    
+    Returns:
+        Lista de dicionários com: nome, data, tags, num_artigos, filepath
+    """
+    perfis_ordenados, _ = _atualizar_catalogo()
+    return list(perfis_ordenados)
+
+def listar_tags() -> List[Tuple[str, int]]:
+    """
+    Lista as tags dos perfis salvos com o número de perfis de cada uma.
+    
+    Returns:
+        Lista de (tag, contagem), da mais frequente para a menos frequente
+    """
+    _, indice_tags = _atualizar_catalogo()
+    return sorted(((tag, len(fps)) for tag, fps in indice_tags.items()),
+                  key=lambda x: (-x[1], x[0]))
+
+def filtrar_perfis(perfis: List[Dict], tag: Optional[str] = None,
+                   ano: Optional[int] = None) -> List[Dict]:
+    """
+    Filtra perfis por tag exata (via índice invertido) e/ou ano de publicação.
     
-    # Ordena por data (mais recente primeiro)
-    perfis.sort(key=lambda x: x['data'], reverse=True)
+    Args:
+        perfis: Lista de perfis (retorno de listar_perfis_salvos)
+        tag: Tag que o perfil deve ter
+        ano: Ano em que o pesquisador deve ter publicado
     
+    Returns:
+        Lista filtrada de perfis, na mesma ordem
+    """
+    if tag:
+        _, indice_tags = _atualizar_catalogo()
+        com_tag = indice_tags.get(tag.lower(), set())
+        perfis = [p for p in perfis if p['filepath'] in com_tag]
+    if ano:
+        perfis = [p for p in perfis if ano in p.get('anos', [])]
     return perfis
 
+def paginar_perfis(perfis: List[Dict], pagina: int, por_pagina: int = 10) -> List[Dict]:
+    """Devolve a página (começando em 1) de uma lista de perfis."""
+    inicio = (max(pagina, 1) - 1) * por_pagina
+    return perfis[inicio:inicio + por_pagina]
+
 def carregar_perfil(filepath: str) -> Optional[Dict]:
     """
     Carrega um perfil completo de um arquivo.
@@ -181,10 +313,17 @@ def apagar_perfil(filepath: str) -> bool:
     """
     try:
         os.remove(filepath)
-        return True
     except Exception:
         return False
 
+    # As linhas do perfil no índice semântico passam a ser lixo; compacta acima do limite
+    try:
+        import profile_search
+        profile_search.compactar_se_necessario()
+    except Exception:
+        pass
+    return True
+
 def buscar_perfis(query: str, perfis: List[Dict]) -> List[Dict]:
     """
     Busca perfis por nome ou tags.
@@ -200,21 +339,19 @@ def buscar_perfis(query: str, perfis: List[Dict]) -> List[Dict]:
         return perfis
     
     query_lower = query.lower().strip()
-    resultados = []
-    
-    for perfil in perfis:
-        # Busca no nome
-        if query_lower in perfil['nome'].lower():
-            resultados.append(perfil)
-            continue
-        
-        # Busca nas tags
-        tags_str = ' '.join(perfil.get('tags', [])).lower()
-        if query_lower in tags_str:
-            resultados.append(perfil)
-            continue
     
-    return resultados
+    # Tags que contêm a busca, resolvidas pelo índice invertido
+    # (varre o vocabulário de tags, não cada perfil)
+    _, indice_tags = _atualizar_catalogo()
+    com_tag = set()
+    for tag, filepaths in indice_tags.items():
+        if query_lower in tag:
+            com_tag |= filepaths
+    
+    return [
+        perfil for perfil in perfis
+        if query_lower in perfil['nome'].lower() or perfil['filepath'] in com_tag
+    ]
 
 def exportar_perfil_markdown(perfil_data: Dict) -> str:
     """
@@ -0,0 +1,225 @@
+# profile_search.py
+"""
+Busca semântica sobre os perfis de pesquisadores salvos.
+Os textos e keywords de cada perfil são codificados com o modelo de
+embedding configurado (embedding.model) num índice vetorial próprio,
+guardado ao lado dos perfis e atualizado por anexação.
+"""
+
+import os
+import json
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from embedding_engine import obter_motor
+
+# Índice: matriz float32 (uma linha por perfil, normalizada) + ids em JSON Lines.
+# Os vetores são sempre escritos antes dos ids: mais linhas de vetores do que
+# ids é uma anexação interrompida (as linhas a mais são descartadas); mais ids
+# do que vetores é um índice inconsistente, que é apagado e reconstruído.
+INDICE_DIR = "perfis_salvos"
+VETORES_FILE = os.path.join(INDICE_DIR, "_vetores.f32")
+IDS_FILE = os.path.join(INDICE_DIR, "_vetores_ids.jsonl")
+
+# Fração de linhas mortas (perfis apagados ou re-salvos) que dispara a compactação
+COMPACTAR_ACIMA_DE = 0.25
+
+_lock = threading.Lock()
+_cache = {"tamanho": -1, "matriz": None, "ids": [], "linha_de": {}}
+
+
+def texto_para_embedding(perfil_data: Dict) -> str:
+    """Monta o texto representativo de um perfil (nome, tags, títulos e resumo)."""
+    titulos = "; ".join(a.get('titulo', '') for a in perfil_data.get('artigos', []))
+    return "\n".join([
+        perfil_data.get('nome_pesquisador', ''),
+        ", ".join(perfil_data.get('tags', [])),
+        titulos,
+        perfil_data.get('perfil_markdown', '')[:2000],
+    ])
+
+
+def _codificar(textos: List[str]) -> np.ndarray:
+    # Motor configurado, partilhado com os vector stores
+    return obter_motor().codificar(textos, normalizar=True)
+
+
+def _num_ids() -> int:
+    if not os.path.exists(IDS_FILE):
+        return 0
+    with open(IDS_FILE, 'r', encoding='utf-8') as f:
+        return sum(1 for l in f if l.strip())
+
+
+def _descartar_indice():
+    for caminho in (IDS_FILE, VETORES_FILE):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+    _cache.update(tamanho=-1, matriz=None, ids=[], linha_de={})
+
+
+def _anexar(nomes_ficheiros: List[str], embs: np.ndarray):
+    """Anexa linhas ao índice (os ids são escritos depois dos vetores)."""
+    os.makedirs(INDICE_DIR, exist_ok=True)
+    # Linhas de vetores de uma anexação interrompida ficariam desalinhadas com os novos ids
+    esperado = _num_ids() * embs.shape[1] * 4
+    tamanho = os.path.getsize(VETORES_FILE) if os.path.exists(VETORES_FILE) else 0
+    if tamanho < esperado:
+        _descartar_indice()
+        esperado = tamanho = 0
+    with open(VETORES_FILE, 'r+b' if tamanho else 'wb') as f:
+        f.truncate(esperado)
+        f.seek(esperado)
+        f.write(embs.tobytes())
+    with open(IDS_FILE, 'a', encoding='utf-8') as f:
+        for nome in nomes_ficheiros:
+            f.write(json.dumps({"ficheiro": nome, "dim": int(embs.shape[1])}) + "\n")
+
+
+def _carregar_indice():
+    """Lê o índice do disco só quando o ficheiro de vetores mudou de tamanho."""
+    if not os.path.exists(VETORES_FILE) or not os.path.exists(IDS_FILE):
+        return None, []
+
+    tamanho = os.path.getsize(VETORES_FILE)
+    if tamanho != _cache["tamanho"]:
+        with open(IDS_FILE, 'r', encoding='utf-8') as f:
+            linhas = [json.loads(l) for l in f if l.strip()]
+        if not linhas:
+            return None, []
+        dim = linhas[0]["dim"]
+        matriz = np.fromfile(VETORES_FILE, dtype=np.float32)
+        n = len(linhas)
+        if matriz.size // dim < n:
+            # Ids sem vetor (ex.: compactação interrompida): reconstruído por indexar_pendentes
+            _descartar_indice()
+            return None, []
+        ids = [l["ficheiro"] for l in linhas]
+        _cache.update(
+            tamanho=tamanho,
+            matriz=matriz[:n * dim].reshape(n, dim),
+            ids=ids,
+            # Última linha de cada ficheiro (um perfil re-salvo gera nova linha)
+            linha_de={nome: i for i, nome in enumerate(ids)},
+        )
+    return _cache["matriz"], _cache["ids"]
+
+
+def indexar_perfil(filepath: str, perfil_data: Dict):
+    """Codifica um perfil e anexa-o ao índice (chamado por salvar_perfil)."""
+    emb = _codificar([texto_para_embedding(perfil_data)])
+    with _lock:
+        _anexar([os.path.basename(filepath)], emb)
+    compactar_se_necessario()
+
+
+def indexar_pendentes(perfis: List[Dict]) -> int:
+    """
+    Indexa, em lote, os perfis que ainda não têm embedding
+    (ex.: salvos antes de existir o índice). Retorna quantos foram indexados.
+    """
+    from profile_manager import carregar_perfil
+
+    with _lock:
+        _carregar_indice()
+        indexados = _cache["linha_de"]
+        pendentes = [p for p in perfis if os.path.basename(p['filepath']) not in indexados]
+        if not pendentes:
+            return 0
+
+        dados = [(p['filepath'], carregar_perfil(p['filepath'])) for p in pendentes]
+        dados = [(fp, d) for fp, d in dados if d]
+        if dados:
+            embs = _codificar([texto_para_embedding(d) for _, d in dados])
+            _anexar([os.path.basename(fp) for fp, _ in dados], embs)
+        return len(dados)
+
+
+def compactar_indice(perfis: Optional[List[Dict]] = None, acima_de: float = 0.0) -> int:
+    """
+    Reescreve o índice só com a última linha de cada perfil ainda existente.
+
+    Args:
+        perfis: Perfis existentes (None = os ficheiros de perfil em INDICE_DIR)
+        acima_de: Só compacta se a fração de linhas mortas passar deste valor
+
+    Returns:
+        int: Número de linhas eliminadas
+    """
+    if perfis is None:
+        vivos = {nome for nome in os.listdir(INDICE_DIR)
+                 if nome.endswith('.json') and not nome.startswith('_')} if os.path.isdir(INDICE_DIR) else set()
+    else:
+        vivos = {os.path.basename(p['filepath']) for p in perfis}
+    with _lock:
+        matriz, ids = _carregar_indice()
+        if matriz is None:
+            return 0
+        ultima = {nome: i for i, nome in enumerate(ids) if nome in vivos}
+        linhas = sorted(ultima.values())
+        mortas = len(ids) - len(linhas)
+        if mortas == 0 or mortas / len(ids) <= acima_de:
+            return 0
+
+        tmp_vetores, tmp_ids = VETORES_FILE + '.tmp', IDS_FILE + '.tmp'
+        with open(tmp_vetores, 'wb') as f:
+            f.write(matriz[linhas].tobytes())
+        with open(tmp_ids, 'w', encoding='utf-8') as f:
+            for i in linhas:
+                f.write(json.dumps({"ficheiro": ids[i], "dim": int(matriz.shape[1])}) + "\n")
+        # Vetores primeiro: se o segundo replace não chegar a correr, ficam mais
+        # ids do que vetores e _carregar_indice reconstrói o índice
+        os.replace(tmp_vetores, VETORES_FILE)
+        os.replace(tmp_ids, IDS_FILE)
+        _cache["tamanho"] = -1
+        return mortas
+
+
+def compactar_se_necessario() -> int:
+    """Compacta o índice quando as linhas mortas passam de COMPACTAR_ACIMA_DE (após salvar/apagar perfis)."""
+    return compactar_indice(acima_de=COMPACTAR_ACIMA_DE)
+
+
+def buscar_semantico(query: str, perfis: List[Dict], top_k: Optional[int] = 20) -> List[Dict]:
+    """
+    Ordena perfis por similaridade semântica com a busca.
+
+    Args:
+        query: Texto livre (ex.: "adversarial robustness")
+        perfis: Perfis candidatos (já filtrados por tag/ano, se for o caso)
+        top_k: Número máximo de resultados (None = todos)
+
+    Returns:
+        Cópias dos perfis com o campo 'score' (cosseno), do mais ao menos similar
+    """
+    if not query or not query.strip() or not perfis:
+        return perfis
+
+    indexar_pendentes(perfis)
+    with _lock:
+        matriz, ids = _carregar_indice()
+    if matriz is None:
+        return []
+
+    por_ficheiro = {os.path.basename(p['filepath']): p for p in perfis}
+    linha_de = _cache["linha_de"]
+    nomes = [nome for nome in por_ficheiro if nome in linha_de]
+    if not nomes:
+        return []
+    linhas = np.fromiter((linha_de[nome] for nome in nomes), dtype=np.int64, count=len(nomes))
+    q = _codificar([query.strip()])[0]
+
+    # Produto escalar só nas linhas candidatas quando são poucas; na matriz
+    # inteira (uma única multiplicação) quando o filtro deixa quase tudo.
+    if len(linhas) < len(ids) // 2:
+        scores = matriz[linhas] @ q
+    else:
+        scores = (matriz @ q)[linhas]
+
+    k = len(nomes) if top_k is None else min(top_k, len(nomes))
+    melhores = np.argpartition(-scores, k - 1)[:k]
+    melhores = melhores[np.argsort(-scores[melhores])]
+
+    return [dict(por_ficheiro[nomes[i]], score=float(scores[i])) for i in melhores]
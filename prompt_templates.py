@@ -0,0 +1,105 @@
+# prompt_templates.py
+"""
+Modelos de prompt com o prefixo estático pré-compilado.
+
+Cada pedido ao LLM é montado por esta ordem:
+  1. prefixo estático: prompt de sistema, persona, instrução de citação e
+     ficheiros carregados. Só muda quando se troca de persona/prompt ou se
+     carregam ficheiros, por isso é montado uma vez por combinação (cache por
+     conteúdo) e reutilizado em todos os turnos da sessão
+  2. histórico da conversa: só cresce no fim, logo também é um prefixo
+     estável do pedido seguinte
+  3. parte variável: o contexto recuperado e a pergunta, sempre no fim
+
+Assim o início do pedido é idêntico de turno para turno e as caches de prompt
+dos provedores funcionam: automáticas na OpenAI, Deepseek e Gemini (prefixos
+iguais) e explícitas no Claude (`cache_control`). Os tokens servidos pela
+cache chegam em ResultadoLLM.tokens_cache.
+"""
+
+from functools import lru_cache
+
+import tracing
+
+# Prompt de sistema quando o utilizador não definiu nenhum, por formato:
+# "texto" para prompts de uma só string (Gemini), "chat" para APIs com mensagens
+SISTEMA_PADRAO = {
+    "texto": "Você é um assistente de pesquisa acadêmica. Responda à **Última pergunta do usuário** baseando-se **apenas** no **Contexto** e no **Histórico da Conversa**.",
+    "chat": 'Você é um assistente de pesquisa acadêmica. Responda à última pergunta do usuário baseando-se no "Contexto" fornecido.',
+}
+
+INSTRUCAO_CITACAO = (
+    "IMPORTANTE: sempre que usar informações do contexto, "
+    "cite a fonte exatamente como: (Fonte, p. {page}, sec. {section}). "
+    "Se a página ou seção não estiver disponível, omita esse campo."
+)
+
+# Marcadores da parte variável (também usados para a separar, ver separar_parte_variavel)
+MARCADOR_CONTEXTO = "**Contexto relevante (cada trecho já inclui página/seção):**\n---\n"
+MARCADOR_PERGUNTA = "\n---\n\n**Última pergunta do usuário:** "
+
+
+@lru_cache(maxsize=64)
+def _prefixo(system_prompt, persona_prompt, nomes_ficheiros, formato):
+    partes = [system_prompt if system_prompt is not None else SISTEMA_PADRAO[formato]]
+    if persona_prompt is not None:
+        partes.append(f"**PERSONA ATIVA:**\n{persona_prompt}")
+    partes.append(INSTRUCAO_CITACAO)
+    partes.append(f"**Arquivos carregados:** {', '.join(nomes_ficheiros)}")
+    return "\n\n".join(partes)
+
+
+def prefixo_estatico(system_prompt, persona_prompt, nomes_ficheiros, formato="chat"):
+    """
+    Prefixo estático do prompt (sistema, persona, citações, ficheiros).
+
+    Args:
+        formato (str): "chat" (prompt de sistema das APIs de mensagens) ou "texto".
+
+    Returns:
+        str: O mesmo objeto enquanto os argumentos não mudarem.
+    """
+    reutilizado = _prefixo.cache_info().hits
+    prefixo = _prefixo(system_prompt, persona_prompt, tuple(nomes_ficheiros), formato)
+    tracing.atual().definir(prefixo_reutilizado=_prefixo.cache_info().hits > reutilizado,
+                            caracteres_prefixo=len(prefixo))
+    return prefixo
+
+
+def parte_variavel(contexto, pergunta):
+    """Contexto recuperado e pergunta do turno atual (a última mensagem do utilizador)."""
+    return f"{MARCADOR_CONTEXTO}{contexto}{MARCADOR_PERGUNTA}{pergunta}"
+
+
+def separar_parte_variavel(texto):
+    """
+    Inverso de parte_variavel (ex.: no servidor stub, que recebe só as mensagens).
+
+    Returns:
+        tuple: (contexto, pergunta); ("", texto) se não tiver os marcadores
+    """
+    if not texto.startswith(MARCADOR_CONTEXTO) or MARCADOR_PERGUNTA not in texto:
+        return "", texto
+    contexto, pergunta = texto[len(MARCADOR_CONTEXTO):].rsplit(MARCADOR_PERGUNTA, 1)
+    return contexto, pergunta
+
+
+def mensagens_chat(historico_chat, contexto, pergunta):
+    """Histórico no formato {role, content}, seguido da parte variável como mensagem do utilizador."""
+    mensagens = [{"role": msg["role"], "content": msg["content"]} for msg in historico_chat]
+    mensagens.append({"role": "user", "content": parte_variavel(contexto, pergunta)})
+    return mensagens
+
+
+def prompt_texto(contexto, pergunta, historico_chat, nomes_ficheiros, system_prompt=None, persona_prompt=None):
+    """Prompt numa só string (prefixo, histórico, parte variável) para provedores sem mensagens."""
+    historico_formatado = "\n".join(f"{msg['role']}: {msg['content']}" for msg in historico_chat)
+    return f"""{prefixo_estatico(system_prompt, persona_prompt, nomes_ficheiros, formato="texto")}
+
+**Histórico da Conversa:**
+{historico_formatado}
+
+{parte_variavel(contexto, pergunta)}
+
+**Sua resposta (em português, com citações):**
+"""
@@ -0,0 +1,175 @@
+# query_batcher.py
+"""
+Agrupamento de consultas concorrentes (micro-batching).
+
+Com vários utilizadores a perguntar ao mesmo tempo, cada busca codificaria a
+sua consulta sozinha; no CPU, o transformer é muito mais eficiente com lotes.
+As buscas que chegam ao mesmo vector store dentro de `consultas.espera_ms`
+(até `consultas.max_lote`) são resolvidas com um único buscar_lote: um encode
+e uma busca no índice, com os resultados devolvidos a cada chamador.
+
+Uso: query_batcher.buscar(vector_store, pergunta, n_results, where)
+"""
+
+import json
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+import tracing
+from config_loader import carregar_config
+
+OCIOSIDADE_S = 2.0   # a thread de um agrupador termina após este tempo sem consultas
+
+_lock = threading.Lock()
+_agrupadores = weakref.WeakKeyDictionary()   # vector store -> AgrupadorConsultas
+
+
+def _config_consultas():
+    config = carregar_config() or {}
+    return config.get('consultas', {})
+
+
+class AgrupadorConsultas:
+    """Junta buscas concorrentes do mesmo vector store num único buscar_lote."""
+
+    def __init__(self, store, max_lote=16, espera_ms=5):
+        # Referência fraca: o agrupador não mantém vivo um store saído da cache
+        self._store = weakref.ref(store)
+        self.max_lote = max(1, max_lote)
+        self.espera_s = espera_ms / 1000
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._ativo = False
+        # Métricas
+        self.lotes = 0
+        self.consultas = 0
+        self.lote_max = 0
+        self._esperas_ms = deque(maxlen=1000)
+
+    def buscar(self, query, n_results, where=None):
+        futuro = Future()
+        with self._lock:
+            self._fila.put((time.perf_counter(), query, n_results, where, tracing.atual(), futuro))
+            if not self._ativo:
+                self._ativo = True
+                threading.Thread(target=self._ciclo, name="agrupador-consultas", daemon=True).start()
+        return futuro.result()
+
+    def _ciclo(self):
+        while True:
+            try:
+                pedidos = [self._fila.get(timeout=OCIOSIDADE_S)]
+            except queue.Empty:
+                with self._lock:
+                    if self._fila.empty():
+                        self._ativo = False
+                        return
+                continue
+            limite = time.monotonic() + self.espera_s
+            while len(pedidos) < self.max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    pedidos.append(self._fila.get(timeout=restante))
+                except queue.Empty:
+                    break
+            # Só consultas com os mesmos parâmetros partilham uma busca
+            grupos = {}
+            for pedido in pedidos:
+                chave = (pedido[2], json.dumps(pedido[3], sort_keys=True))
+                grupos.setdefault(chave, []).append(pedido)
+            for grupo in grupos.values():
+                self._resolver(grupo)
+
+    def _resolver(self, grupo):
+        agora = time.perf_counter()
+        with self._lock:
+            self.lotes += 1
+            self.consultas += len(grupo)
+            self.lote_max = max(self.lote_max, len(grupo))
+            self._esperas_ms.extend((agora - pedido[0]) * 1000 for pedido in grupo)
+
+        _, _, n_results, where, pai, _ = grupo[0]
+        for pedido in grupo:
+            pedido[4].definir(lote=len(grupo), espera_ms=round((agora - pedido[0]) * 1000, 2),
+                              trace_lote=pai.trace_id)
+        try:
+            store = self._store()
+            if store is None:
+                raise RuntimeError("Vector store já não está disponível.")
+            # Os spans do lote ficam no trace do primeiro pedido; os restantes guardam trace_lote
+            with tracing.span("query_batcher.lote", pai=pai, consultas=len(grupo)):
+                resultados = store.buscar_lote([p[1] for p in grupo], n_results, where=where)
+        except Exception as e:
+            for *_, futuro in grupo:
+                futuro.set_exception(e)
+            return
+        for i, (*_, futuro) in enumerate(grupo):
+            futuro.set_result({
+                "documents": [resultados["documents"][i]],
+                "metadatas": [resultados["metadatas"][i]],
+            })
+
+    def _instantaneo(self):
+        """(lotes, consultas, lote_max, esperas) copiados de uma vez, sem a thread a meio de um lote."""
+        with self._lock:
+            return self.lotes, self.consultas, self.lote_max, list(self._esperas_ms)
+
+    def metricas(self):
+        """Tamanho dos lotes conseguidos e tempo de espera na fila (últimas 1000 consultas)."""
+        lotes, consultas, lote_max, esperas = self._instantaneo()
+        esperas = np.array(esperas or [0.0])
+        return {
+            "lotes": lotes,
+            "consultas": consultas,
+            "lote_medio": consultas / lotes if lotes else 0.0,
+            "lote_max": lote_max,
+            "espera_media_ms": float(esperas.mean()),
+            "espera_p95_ms": float(np.percentile(esperas, 95)),
+        }
+
+
+def obter_agrupador(store):
+    """Agrupador do vector store, criado na primeira consulta."""
+    with _lock:
+        agrupador = _agrupadores.get(store)
+        if agrupador is None:
+            cfg = _config_consultas()
+            agrupador = AgrupadorConsultas(store, cfg.get('max_lote', 16), cfg.get('espera_ms', 5))
+            _agrupadores[store] = agrupador
+        return agrupador
+
+
+def buscar(store, query_texts, n_results=5, where=None):
+    """store.buscar(...), agrupado com buscas concorrentes se `consultas.micro_batching` estiver ativo."""
+    with tracing.span("query_batcher.buscar", n_results=n_results):
+        if not _config_consultas().get('micro_batching', True):
+            return store.buscar(query_texts=query_texts, n_results=n_results, where=where)
+        return obter_agrupador(store).buscar(query_texts, n_results, where)
+
+
+def metricas_agrupadores():
+    """Métricas agregadas de todos os agrupadores ativos no processo."""
+    with _lock:
+        agrupadores = list(_agrupadores.values())
+    if not agrupadores:
+        return {}
+    instantaneos = [a._instantaneo() for a in agrupadores]
+    lotes = sum(i[0] for i in instantaneos)
+    consultas = sum(i[1] for i in instantaneos)
+    esperas = [e for i in instantaneos for e in i[3]] or [0.0]
+    return {
+        "lotes": lotes,
+        "consultas": consultas,
+        "lote_medio": consultas / lotes if lotes else 0.0,
+        "lote_max": max(i[2] for i in instantaneos),
+        "espera_media_ms": float(np.mean(esperas)),
+        "espera_p95_ms": float(np.percentile(esperas, 95)),
+    }
@@ -1,17 +1,25 @@
 # rag_processor.py 
 
 import streamlit as st
-from config_loader import carregar_config
-from pypdf import PdfReader
+from config_loader import obter_configuracao
+import query_batcher
+import tracing
+import io
 import re 
 
-# Carrega a configuração no início do módulo
-config = carregar_config()
-pdf_config = config['pdf_processing']
 
+@tracing.rastrear("ingestao.extrair_texto")
+def extrair_texto_pdf(pdf_bytes):
+    """Extrai o texto de todas as páginas de um PDF (usado pela app e pelo worker de ingestão)."""
+    import pypdf  # importado só quando há PDFs para processar
+    return "".join(p.extract_text() or "" for p in pypdf.PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+@tracing.rastrear("ingestao.dividir")
 def dividir_texto_em_chunks(texto, nome_ficheiro, debug_mode=False):
-    tamanho_chunk = pdf_config.get('chunk_size', 1000)
-    sobreposicao_chunk = pdf_config.get('chunk_overlap', 200)
+    # Configuração partilhada (sem leitura de disco; recarregada se o ficheiro mudar)
+    pdf_config = obter_configuracao().pdf
+    tamanho_chunk = pdf_config.chunk_size
+    sobreposicao_chunk = pdf_config.chunk_overlap
 
     if not texto:
         if debug_mode:
@@ -50,10 +58,11 @@ def dividir_texto_em_chunks(texto, nome_ficheiro, debug_mode=False):
     return chunks, metadados
 
 
+@tracing.rastrear("rag.buscar_contexto")
 def buscar_contexto_relevante(vector_store, pergunta, nomes_ficheiros, debug_mode=False):
     """Busca contexto relevante usando a abstração do Vector Store."""
     # Lê o n_results a partir do ficheiro de configuração
-    n_results = carregar_config()['pdf_processing']['n_results']
+    n_results = obter_configuracao().pdf.n_results
 
     if vector_store is None:
         if debug_mode:
@@ -78,13 +87,15 @@ def buscar_contexto_relevante(vector_store, pergunta, nomes_ficheiros, debug_mod
             for nome_arquivo in nomes_ficheiros:
                 # Onde clause só funciona com ChromaDB, então verificamos se o método suporta
                 try:
-                    resultados = vector_store.buscar(
+                    resultados = query_batcher.buscar(
+                        vector_store,
                         query_texts=f"abstract introduction summary conclusion {pergunta}",
                         n_results=2,
                         where={"fonte": nome_arquivo}
                     )
                 except TypeError: # Se o 'where' não for suportado (como no FAISS)
-                    resultados = vector_store.buscar(
+                    resultados = query_batcher.buscar(
+                        vector_store,
                         query_texts=f"abstract introduction summary conclusion {pergunta}",
                         n_results=2
                     )
@@ -103,7 +114,7 @@ def buscar_contexto_relevante(vector_store, pergunta, nomes_ficheiros, debug_mod
             # Busca semântica normal
             if debug_mode:
                 st.info("🔍 DEBUG: Busca semântica normal")
-            resultados = vector_store.buscar(query_texts=pergunta, n_results=n_results)
+            resultados = query_batcher.buscar(vector_store, query_texts=pergunta, n_results=n_results)
             contexto_final, fontes_final = _formatar_resultados_da_busca(resultados)
             resultados_para_debug = resultados # Guarda para o debug
 
@@ -131,6 +142,7 @@ def buscar_contexto_relevante(vector_store, pergunta, nomes_ficheiros, debug_mod
         return ""
 
 
+@tracing.rastrear("rag.formatar_contexto")
 def _formatar_resultados_da_busca(resultados):
     """Função auxiliar para formatar os resultados da busca."""
     contexto, fontes = "", set()
@@ -0,0 +1,97 @@
+# resource_registry.py
+"""
+Registo de recursos pesados partilhados pelo processo.
+
+- Importações lentas (SDKs de LLM, chromadb, faiss, sentence-transformers/torch)
+  são feitas só quando usadas, através de `importar_modulo`, que mede o tempo.
+- Os modelos de embedding são carregados uma única vez por (modelo, device,
+  backend) e partilhados entre sessões do Streamlit e vector stores.
+- `relatorio_inicializacao` separa o custo de importação do custo de carregar
+  modelos, para diagnosticar arranques lentos.
+"""
+
+import importlib
+import sys
+import threading
+import time
+
+_lock = threading.RLock()
+_modelos = {}      # (modelo, device, backend, ficheiro) -> SentenceTransformer
+_tempos = {"imports": {}, "modelos": {}, "etapas": {}}
+
+
+def importar_modulo(nome):
+    """Importa um módulo (se ainda não estiver carregado) e regista quanto demorou."""
+    if nome in sys.modules:
+        return sys.modules[nome]
+    with _lock:
+        inicio = time.perf_counter()
+        modulo = importlib.import_module(nome)
+        _tempos["imports"].setdefault(nome, time.perf_counter() - inicio)
+    return modulo
+
+
+def registar_etapa(nome, segundos):
+    """
+    Regista a duração de uma etapa de arranque (ex.: imports da app).
+    Só a primeira ocorrência (a execução a frio) é guardada.
+    """
+    _tempos["etapas"].setdefault(nome, segundos)
+
+
+def obter_encoder(modelo, device="cpu", backend="torch", ficheiro=None, num_threads=0):
+    """
+    Devolve o SentenceTransformer partilhado para (modelo, device, backend),
+    carregando-o na primeira chamada.
+
+    Args:
+        modelo: Nome no Hugging Face ou diretório local
+        device: cpu / cuda / mps
+        backend: "torch" ou "onnx" (ONNX Runtime)
+        ficheiro: Ficheiro .onnx dentro do modelo (ex.: "onnx/model_qint8_avx2.onnx")
+        num_threads: Threads intra-op da sessão ONNX Runtime (0 = padrão)
+    """
+    chave = (modelo, device, backend, ficheiro, num_threads if backend == "onnx" else 0)
+    encoder = _modelos.get(chave)
+    if encoder is not None:
+        return encoder
+
+    with _lock:
+        if chave not in _modelos:
+            st_mod = importar_modulo("sentence_transformers")
+            kwargs = {}
+            if backend != "torch":
+                kwargs["backend"] = backend
+            model_kwargs = {}
+            if ficheiro:
+                model_kwargs["file_name"] = ficheiro
+            if backend == "onnx" and num_threads:
+                opcoes = importar_modulo("onnxruntime").SessionOptions()
+                opcoes.intra_op_num_threads = num_threads
+                model_kwargs["session_options"] = opcoes
+            if model_kwargs:
+                kwargs["model_kwargs"] = model_kwargs
+            inicio = time.perf_counter()
+            _modelos[chave] = st_mod.SentenceTransformer(modelo, device=device, **kwargs)
+            descricao = f"{modelo} ({device}" + (f", {backend}" if backend != "torch" else "") + ")"
+            _tempos["modelos"][descricao] = time.perf_counter() - inicio
+        return _modelos[chave]
+
+
+def modelos_carregados():
+    """Lista os (modelo, device, backend, ficheiro, threads) atualmente em memória."""
+    return list(_modelos)
+
+
+def relatorio_inicializacao():
+    """
+    Resumo dos custos de arranque do processo.
+
+    Returns:
+        dict com 'etapas', 'imports' e 'modelos' ({nome: segundos}) e os totais
+    """
+    with _lock:
+        relatorio = {k: dict(v) for k, v in _tempos.items()}
+    relatorio["total_imports_s"] = sum(relatorio["imports"].values())
+    relatorio["total_modelos_s"] = sum(relatorio["modelos"].values())
+    return relatorio
@@ -0,0 +1,149 @@
+# retrieval_server.py
+"""
+Serviço local de recuperação: um único processo com o encoder e os índices
+carregados, partilhado por várias réplicas da app e pelos scripts de avaliação
+(vector store `type: remote`).
+
+Uso: python retrieval_server.py [--host 127.0.0.1] [--porta 8765]
+
+API (JSON sobre HTTP):
+    GET  /saude                          estado e vector stores abertos
+    GET  /metrics                        duração das etapas (texto Prometheus, ver tracing.py)
+    POST /buscar       {vector_store, workspace, query, n_results, where}
+    POST /buscar_lote  {vector_store, workspace, queries, n_results, where}
+    POST /adicionar    {vector_store, workspace, chunks, metadados}
+    POST /remover      {vector_store, workspace, where}
+    POST /compactar    {vector_store, workspace}
+    POST /contexto     {vector_store, workspace, pergunta, nomes_ficheiros}
+
+As buscas simples que chegam ao mesmo tempo (vários utilizadores) são
+agrupadas pelo query_batcher num só encode e numa só busca no índice.
+"""
+
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import query_batcher
+import tracing
+import workspace_manager
+from config_loader import carregar_config
+
+
+def _config_servico():
+    config = carregar_config() or {}
+    return config.get('servico_recuperacao', {})
+
+
+def _obter(pedido):
+    """Vector store do (vector_store, workspace) do pedido."""
+    workspace = pedido.get('workspace') or workspace_manager.workspace_padrao()
+    return workspace_manager.obter_store(pedido['vector_store'], workspace)
+
+
+def _buscar(store, pedido):
+    return query_batcher.buscar(store, pedido['query'], pedido.get('n_results', 5), pedido.get('where'))
+
+
+def _buscar_lote(store, pedido):
+    return store.buscar_lote(pedido['queries'], pedido.get('n_results', 5), where=pedido.get('where'))
+
+
+def _adicionar(store, pedido):
+    store.adicionar(pedido['chunks'], pedido.get('metadados'))
+    return {"adicionados": len(pedido['chunks'])}
+
+
+def _remover(store, pedido):
+    return {"removidos": store.remover(pedido['where'])}
+
+
+def _compactar(store, pedido):
+    return {"compactados": store.compactar()}
+
+
+def _contexto(store, pedido):
+    from rag_processor import buscar_contexto_relevante
+    return {"contexto": buscar_contexto_relevante(store, pedido['pergunta'], pedido.get('nomes_ficheiros', []))}
+
+
+ROTAS = {
+    "/buscar": _buscar,
+    "/buscar_lote": _buscar_lote,
+    "/adicionar": _adicionar,
+    "/remover": _remover,
+    "/compactar": _compactar,
+    "/contexto": _contexto,
+}
+
+
+class ManipuladorRecuperacao(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _responder(self, estado, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _responder_texto(self, estado, texto):
+        dados = texto.encode('utf-8')
+        self.send_response(estado)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            return self._responder_texto(200, tracing.texto_prometheus())
+        if self.path != "/saude":
+            return self._responder(404, {"erro": f"Rota desconhecida: {self.path}"})
+        self._responder(200, {
+            "estado": "ok",
+            "stores": [list(chave) for chave in workspace_manager.stores_em_cache()],
+            "agrupamento": query_batcher.metricas_agrupadores(),
+        })
+
+    def do_POST(self):
+        rota = ROTAS.get(self.path)
+        if rota is None:
+            return self._responder(404, {"erro": f"Rota desconhecida: {self.path}"})
+        try:
+            tamanho = int(self.headers.get("Content-Length", 0))
+            pedido = json.loads(self.rfile.read(tamanho) or b"{}")
+            with tracing.span(f"servico{self.path}", workspace=pedido.get('workspace')):
+                corpo = rota(_obter(pedido), pedido)
+            self._responder(200, corpo)
+        except (KeyError, ValueError) as e:
+            self._responder(400, {"erro": str(e)})
+        except Exception as e:
+            self._responder(500, {"erro": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def executar(host=None, porta=None):
+    cfg = _config_servico()
+    host = host or cfg.get('host', '127.0.0.1')
+    porta = porta or cfg.get('porta', 8765)
+    servidor = ThreadingHTTPServer((host, porta), ManipuladorRecuperacao)
+    servidor.daemon_threads = True
+    print(f"[recuperação] A servir em http://{host}:{porta}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço local de recuperação (encoder e índices partilhados).")
+    parser.add_argument("--host")
+    parser.add_argument("--porta", type=int)
+    args = parser.parse_args()
+    executar(args.host, args.porta)
@@ -1,15 +1,29 @@
 # secrets_manager.py
 import json
 import os
-import streamlit as st
+import pathlib
+import sys
+import threading
+import time
+
+try:
+    import streamlit as st
+except ImportError:  # execução fora da app (scripts de avaliação)
+    st = None
 
-import os, pathlib
 SECRETS_DIR  = pathlib.Path.home() / ".unespedia"
 SECRETS_FILE = SECRETS_DIR / "secrets.json"
-SECRETS_DIR.mkdir(exist_ok=True)   # ← add this line
+SECRETS_DIR.mkdir(exist_ok=True)
 
-def load_secrets():
-    """Carrega os segredos do ficheiro JSON."""
+# Os segredos ficam em memória; o ficheiro só é relido se o mtime mudar
+# (verificado no máximo a cada INTERVALO_VERIFICACAO_S segundos).
+INTERVALO_VERIFICACAO_S = 2.0
+
+_lock = threading.Lock()
+_cache = {"segredos": None, "mtime": None, "verificado_em": 0.0}
+
+
+def _ler_ficheiro():
     if os.path.exists(SECRETS_FILE):
         try:
             with open(SECRETS_FILE, 'r') as f:
@@ -18,21 +32,50 @@ def load_secrets():
             return {}
     return {}
 
+def _segredos():
+    """Devolve o dicionário de segredos em cache (partilhado; não alterar)."""
+    agora = time.monotonic()
+    if _cache["segredos"] is not None and agora - _cache["verificado_em"] < INTERVALO_VERIFICACAO_S:
+        return _cache["segredos"]
+
+    with _lock:
+        _cache["verificado_em"] = agora
+        mtime = os.path.getmtime(SECRETS_FILE) if os.path.exists(SECRETS_FILE) else None
+        if _cache["segredos"] is None or mtime != _cache["mtime"]:
+            _cache["segredos"] = _ler_ficheiro()
+            _cache["mtime"] = mtime
+        return _cache["segredos"]
+
+def load_secrets():
+    """Carrega os segredos (cópia, que o chamador pode alterar)."""
+    return dict(_segredos())
+
 def save_secrets(secrets_dict):
-    """Salva o dicionário de segredos no ficheiro JSON."""
+    """Salva o dicionário de segredos no ficheiro JSON (escrita atómica)."""
     try:
-        with open(SECRETS_FILE, 'w') as f:
-            json.dump(secrets_dict, f, indent=4)
+        with _lock:
+            tmp = f"{SECRETS_FILE}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(secrets_dict, f, indent=4)
+            os.replace(tmp, SECRETS_FILE)
+            _cache["segredos"] = dict(secrets_dict)
+            _cache["mtime"] = os.path.getmtime(SECRETS_FILE)
+            _cache["verificado_em"] = time.monotonic()
     except Exception as e:
-        st.error(f"Não foi possível salvar os segredos: {e}")
+        mensagem = f"Não foi possível salvar os segredos: {e}"
+        if st is not None and st.runtime.exists():
+            st.error(mensagem)
+        else:
+            print(mensagem, file=sys.stderr)
 
 def get_api_key(provider_name):
     """Obtém a chave de API para um provedor específico."""
-    secrets = load_secrets()
-    return secrets.get(provider_name)
+    return _segredos().get(provider_name)
 
 def save_api_key(provider_name, api_key):
     """Salva a chave de API para um provedor específico."""
+    if _segredos().get(provider_name) == api_key:
+        return
     secrets = load_secrets()
     secrets[provider_name] = api_key
-    save_secrets(secrets)
\ No newline at end of file
+    save_secrets(secrets)
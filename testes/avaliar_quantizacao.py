@@ -0,0 +1,123 @@
+# avaliar_quantizacao.py
+"""
+Compara os formatos de armazenamento do FAISSStore (flat, fp16, int8 e int8
+com re-score) em memória e recall@k em relação ao índice float32 exato.
+
+Os vetores são os chunks dos PDFs de teste; com --distratores N juntam-se N
+vetores sintéticos (perturbações dos reais, re-normalizadas) para aproximar
+um corpus maior, onde a perda de recall da quantização é mais visível.
+
+Cada formato é construído como em produção: um FAISSStore a receber os
+vetores em lotes do tamanho de um documento (--lote), como o worker de
+ingestão e a app, e pesquisado pelo próprio store (com ou sem re-score).
+
+Uso (a partir da raiz do projeto):
+    python testes/avaliar_quantizacao.py --k 10 --distratores 200000 --lote 30
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+PASTA_TESTES = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PASTA_TESTES))
+sys.path.insert(0, PASTA_TESTES)
+
+from config_loader import obter_configuracao
+from embedding_engine import obter_motor
+from vector_stores.faiss_store import FAISSStore, criar_indice
+from validar_onnx import carregar_chunks, carregar_consultas
+
+CHUNKS_REFERENCIA = 2_000_000   # para a estimativa de memória por instalação
+
+
+def gerar_distratores(base, n, ruido=0.35, semente=0):
+    """Vetores sintéticos perto dos reais (mesma distribuição aproximada)."""
+    rng = np.random.default_rng(semente)
+    origem = base[rng.integers(0, len(base), size=n)]
+    sinteticos = origem + ruido * rng.standard_normal(origem.shape).astype(np.float32) / np.sqrt(base.shape[1])
+    sinteticos /= np.linalg.norm(sinteticos, axis=1, keepdims=True)
+    return sinteticos.astype(np.float32)
+
+
+def construir_store(caminho, vetores, quantizacao, rescoring, candidatos_rescoring, lote):
+    """FAISSStore alimentado lote a lote, como na ingestão de documentos."""
+    cfg = obter_configuracao().embedding
+    store = FAISSStore(caminho, cfg.model, cfg.device,
+                       quantizacao=quantizacao, rescoring=rescoring,
+                       candidatos_rescoring=candidatos_rescoring)
+    # Uma só escrita do pickle no fim: não muda o índice e torna o teste viável com distratores
+    with store.insercao_em_lotes():
+        for inicio in range(0, len(vetores), lote):
+            ids = range(inicio, min(inicio + lote, len(vetores)))
+            store.adicionar_vetores(vetores[inicio:inicio + lote], [""] * len(ids), [{"id": i} for i in ids],
+                                    salvar=False)
+    return store
+
+
+def avaliar(k, distratores, candidatos_rescoring, lote):
+    motor = obter_motor()
+    chunks = carregar_chunks()
+    if not chunks:
+        print("❌ Nenhum chunk gerado a partir dos PDFs de teste.")
+        return None
+    vetores = motor.codificar(chunks, normalizar=True)
+    consultas = motor.codificar(carregar_consultas(chunks), normalizar=True)
+    if distratores:
+        vetores = np.vstack([vetores, gerar_distratores(vetores, distratores)])
+    k = min(k, len(vetores))
+    print(f"📄 {len(vetores)} vetores ({len(chunks)} reais) · ❓ {len(consultas)} consultas · k={k} · "
+          f"lotes de {lote}")
+
+    exato = criar_indice(vetores.shape[1], "flat")
+    exato.add(vetores)
+    _, referencia = exato.search(consultas, k)
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for i, (nome, quantizacao, rescoring) in enumerate([("flat", "flat", False), ("fp16", "fp16", False),
+                                                            ("int8", "int8", False),
+                                                            ("int8 + re-score", "int8", True)]):
+            store = construir_store(os.path.join(pasta, f"formato_{i}.pkl"), vetores, quantizacao,
+                                    rescoring, candidatos_rescoring, lote)
+
+            inicio = time.perf_counter()
+            hits = store.buscar_vetores(consultas, k)
+            latencia_ms = (time.perf_counter() - inicio) * 1000 / len(consultas)
+
+            encontrados = [[meta["id"] for _, _, meta in h] for h in hits]
+            recall = np.mean([len(set(r) & set(e)) / k for r, e in zip(referencia, encontrados)])
+            stats = store.estatisticas()
+            bytes_por_vetor = stats["bytes_por_vetor"]
+            resultados.append({
+                "formato": nome,
+                # float32 enquanto o int8 ainda não tem vetores de treino suficientes
+                "indice": type(store.index).__name__,
+                "bytes_por_vetor": bytes_por_vetor,
+                "memoria_mb": stats["memoria_indice_mb"],
+                f"memoria_{CHUNKS_REFERENCIA // 1_000_000}M_gb": CHUNKS_REFERENCIA * bytes_por_vetor / 2**30,
+                f"recall@{k}": float(recall),
+                "latencia_ms": latencia_ms,
+            })
+
+    print("\n" + "=" * 70)
+    print("📊 Formatos de armazenamento FAISS")
+    print("=" * 70)
+    for r in resultados:
+        print("  " + " | ".join(f"{c}: {v:.4f}" if isinstance(v, float) else f"{c}: {v}" for c, v in r.items()))
+    print("\nObs.: com re-score, os vetores float32 ficam em disco (memmap), fora da RAM.")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memória e recall dos formatos do FAISSStore.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--distratores", type=int, default=0)
+    parser.add_argument("--candidatos-rescoring", type=int, default=4)
+    parser.add_argument("--lote", type=int, default=30, help="Chunks por documento adicionado")
+    args = parser.parse_args()
+    avaliar(args.k, args.distratores, args.candidatos_rescoring, args.lote)
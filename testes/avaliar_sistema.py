@@ -2,8 +2,20 @@
 """
 Script de Avaliação Experimental do UNESPedia
 Compara LLMs (Gemini, Deepseek, Claude) e Vector Stores (ChromaDB, FAISS)
+
+Cada execução tem uma pasta em resultados_experimento/execucoes/<id>/ com um
+log JSONL (uma linha por pergunta respondida, escrita de imediato). Para
+continuar uma execução interrompida, sem repetir as células já concluídas:
+    python testes/avaliar_sistema.py --retomar            (a mais recente)
+    python testes/avaliar_sistema.py --retomar 20251128_173752
+Os índices ficam em resultados_experimento/indices/ e são reutilizados
+enquanto os PDFs, o chunking, o modelo de embedding e o vector store não mudarem.
 """
 
+import argparse
+import hashlib
+import re
+import shutil
 import time
 import json
 import os
@@ -12,20 +24,20 @@ from datetime import datetime
 from pathlib import Path
 import pypdf
 import io
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 # Importar módulos do projeto
-import yaml
-from llm_handler import gerar_resposta_com_llm
+from config_loader import carregar_config, obter_configuracao
+from llm_handler import gerar_resultado_com_llm
+from usage_ledger import registo_uso
 from rag_processor import dividir_texto_em_chunks, buscar_contexto_relevante
 from vector_store_factory import get_vector_store
 import secrets_manager
 
-def carregar_config():
-    """Carrega configuração sem Streamlit."""
-    with open("config.yaml", "r") as f:
-        return yaml.safe_load(f)
-
-
 # =============================================================================
 # CONFIGURAÇÃO DO EXPERIMENTO
 # =============================================================================
@@ -42,10 +54,26 @@ EXCEL_PERGUNTAS = "Perguntas.xlsx"
 
 # LLMs a testar
 LLM_PROVIDERS = ["Gemini", "Deepseek", "Claude"]
+# Ex.: AVALIACAO_PROVEDORES="Mock (local)" para correr sem chaves de API
+if os.environ.get("AVALIACAO_PROVEDORES"):
+    LLM_PROVIDERS = os.environ["AVALIACAO_PROVEDORES"].split(",")
 
 # Vector Stores a testar
 VECTOR_STORES = ["ChromaDB", "FAISS"]
 
+# Vector store do experimento de LLMs. Um vector store `type: remote`
+# (retrieval_server.py) usa o índice já carregado no serviço, sem reindexar.
+VECTOR_STORE_LLM = os.environ.get("AVALIACAO_VECTOR_STORE", "ChromaDB")
+
+# Dataset Parquet com os resultados de todas as execuções, particionado por
+# execução (e por provedor, no caso dos LLMs); lido por visualizar_resultados.py
+PASTA_DATASET = os.path.join("resultados_experimento", "dataset")
+
+# Ingestão: processos de extração de texto e chunks por lote de embedding
+PROCESSOS_EXTRACAO = os.cpu_count() or 1
+LOTE_EMBEDDING = 512
+ETAPAS_INDEXACAO = ("extracao_s", "chunking_s", "embedding_s", "insercao_s")
+
 # Configuração de geração
 CONFIG_GERACAO = {
     "temperature": 0.7,
@@ -55,6 +83,134 @@ CONFIG_GERACAO = {
 }
 
 
+PASTA_RESULTADOS = "resultados_experimento"
+PASTA_EXECUCOES = os.path.join(PASTA_RESULTADOS, "execucoes")
+PASTA_INDICES = os.path.join(PASTA_RESULTADOS, "indices")
+
+
+# =============================================================================
+# EXECUÇÕES RETOMÁVEIS E REUTILIZAÇÃO DE ÍNDICES
+# =============================================================================
+
+def preparar_execucao(retomar=None):
+    """
+    Pasta da execução: nova (id = data/hora) ou, com `retomar`, uma existente
+    ("ultima" = a mais recente).
+    """
+    if retomar:
+        existentes = sorted(p.name for p in Path(PASTA_EXECUCOES).glob("*") if p.is_dir())
+        id_execucao = existentes[-1] if retomar == "ultima" and existentes else retomar
+        pasta = os.path.join(PASTA_EXECUCOES, id_execucao)
+        if not os.path.isdir(pasta):
+            raise FileNotFoundError(f"Execução não encontrada: {pasta}")
+        print(f"🔁 A retomar a execução {id_execucao}")
+        return id_execucao, pasta
+
+    id_execucao = datetime.now().strftime("%Y%m%d_%H%M%S")
+    pasta = os.path.join(PASTA_EXECUCOES, id_execucao)
+    os.makedirs(pasta, exist_ok=True)
+    return id_execucao, pasta
+
+
+def chave_celula(provider, model_config, vs_name, pergunta):
+    """Identifica uma célula (provedor, configuração, pergunta) do experimento."""
+    celula = [provider, model_config.get('model'), vs_name, CONFIG_GERACAO, pergunta]
+    return hashlib.sha1(json.dumps(celula, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def carregar_log(pasta):
+    """Resultados já registados (ignora uma última linha incompleta)."""
+    caminho = os.path.join(pasta, "resultados.jsonl")
+    if not os.path.exists(caminho):
+        return []
+    registos = []
+    with open(caminho, 'r', encoding='utf-8') as f:
+        for linha in f:
+            try:
+                registos.append(json.loads(linha))
+            except json.JSONDecodeError:
+                continue
+    return registos
+
+
+def registar_resultado(pasta, registo):
+    """Anexa um resultado ao log da execução (persistido antes de continuar)."""
+    with open(os.path.join(pasta, "resultados.jsonl"), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registo, ensure_ascii=False, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def salvar_dataset(df, nome, particoes):
+    """
+    Escreve `df` no dataset Parquet <PASTA_DATASET>/<nome>. As partições presentes
+    em `df` são substituídas, pelo que voltar a guardar uma execução retomada não
+    duplica linhas.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pq.write_to_dataset(pa.Table.from_pandas(df, preserve_index=False), os.path.join(PASTA_DATASET, nome),
+                        partition_cols=particoes, existing_data_behavior="delete_matching")
+
+
+def impressao_digital_indice(vs_name, vs_config):
+    """Hash dos PDFs de teste, dos parâmetros de chunking, do modelo de embedding e do vector store."""
+    cfg = obter_configuracao()
+    h = hashlib.sha256()
+    for pdf_path in PDFS_TESTE:
+        if os.path.exists(pdf_path):
+            h.update(pdf_path.encode("utf-8"))
+            h.update(hashlib.sha256(Path(pdf_path).read_bytes()).digest())
+    h.update(json.dumps({
+        "vector_store": vs_name,
+        "config": dict(vs_config),
+        "chunk_size": cfg.pdf.chunk_size,
+        "chunk_overlap": cfg.pdf.chunk_overlap,
+        "modelo": cfg.embedding.model,
+        "backend": cfg.embedding.backend,
+        "onnx_quantizacao": cfg.embedding.onnx_quantizacao,
+    }, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def obter_indice(vs_name, vs_config):
+    """
+    Vector store com os PDFs de teste indexados, reutilizando o índice de uma
+    execução anterior se a impressão digital for a mesma.
+
+    Returns:
+        tuple: (vector store, {tempo_indexacao_s, tempos por etapa, num_chunks, reutilizado})
+    """
+    if vs_config.get('type') == 'remote':
+        # O serviço de recuperação já tem o índice carregado
+        return get_vector_store(vs_config), {"tempo_indexacao_s": 0.0, "num_chunks": 0, "reutilizado": True}
+
+    impressao = impressao_digital_indice(vs_name, vs_config)
+    pasta = os.path.join(PASTA_INDICES, f"{re.sub(r'[^A-Za-z0-9]+', '_', vs_name)}_{impressao}")
+    config_local = dict(vs_config)
+    if vs_config.get('type') == 'chroma':
+        config_local['path'] = pasta
+    else:
+        config_local['path'] = os.path.join(pasta, os.path.basename(vs_config['path']))
+
+    marcador = os.path.join(pasta, "indice.json")
+    if os.path.exists(marcador):
+        with open(marcador, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        print(f"♻️  A reutilizar o índice {vs_name} ({impressao}): {info['num_chunks']} chunks")
+        return get_vector_store(config_local), {**info, "reutilizado": True}
+
+    # Sem marcador: índice inexistente ou construção interrompida
+    shutil.rmtree(pasta, ignore_errors=True)
+    os.makedirs(pasta)
+    vs, tempos, num_chunks = processar_pdfs(config_local)
+    info = {**tempos, "num_chunks": num_chunks, "impressao_digital": impressao}
+    with open(marcador, 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2)
+    return vs, {**info, "reutilizado": False}
+
+
 # =============================================================================
 # FUNÇÕES DE AVALIAÇÃO
 # =============================================================================
@@ -99,35 +255,103 @@ def carregar_perguntas():
         ]
 
 
+def extrair_pdf(pdf_path):
+    """Extrai o texto de um PDF (corre num processo do pool de extração)."""
+    inicio = time.perf_counter()
+    with open(pdf_path, 'rb') as f:
+        reader = pypdf.PdfReader(io.BytesIO(f.read()))
+        texto = "".join(p.extract_text() or "" for p in reader.pages)
+    return len(reader.pages), texto, time.perf_counter() - inicio
+
+
+def _codificador(vs):
+    """Codificação igual à de vs.adicionar(), para medir o embedding à parte da inserção."""
+    if hasattr(vs, 'ef'):   # ChromaDB: a função de embedding da coleção
+        return lambda chunks: np.asarray(vs.ef(chunks), dtype=np.float32)
+    return lambda chunks: vs.motor.codificar(chunks, normalizar=True)
+
+
+def indexar_em_pipeline(vs, chunks, metadados, tempos):
+    """
+    Codifica os chunks por lotes numa thread enquanto a thread principal insere
+    o lote anterior no índice. Acumula embedding_s e insercao_s em `tempos`.
+    """
+    if not hasattr(vs, 'adicionar_vetores'):
+        inicio = time.perf_counter()
+        vs.adicionar(chunks, metadados)
+        tempos["insercao_s"] += time.perf_counter() - inicio
+        return
+
+    codificar = _codificador(vs)
+    lotes = queue.Queue(maxsize=2)   # no máximo dois lotes codificados à espera
+
+    def produtor():
+        try:
+            for i in range(0, len(chunks), LOTE_EMBEDDING):
+                inicio = time.perf_counter()
+                embs = codificar(chunks[i:i + LOTE_EMBEDDING])
+                tempos["embedding_s"] += time.perf_counter() - inicio
+                lotes.put((i, embs))
+        except Exception as e:
+            lotes.put(e)
+            return
+        lotes.put(None)
+
+    thread = threading.Thread(target=produtor, name="embedding-avaliacao", daemon=True)
+    thread.start()
+    # O FAISS só escreve o índice no fim do bloco: salvar a cada lote mediria o
+    # pickle, não a inserção (e se algo falhar, os lotes são descartados)
+    with vs.insercao_em_lotes():
+        while (item := lotes.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            i, embs = item
+            inicio = time.perf_counter()
+            vs.adicionar_vetores(embs, chunks[i:i + LOTE_EMBEDDING], metadados[i:i + LOTE_EMBEDDING], salvar=False)
+            tempos["insercao_s"] += time.perf_counter() - inicio
+        thread.join()
+        inicio = time.perf_counter()
+    tempos["insercao_s"] += time.perf_counter() - inicio   # a escrita no fim do bloco
+
+
 def processar_pdfs(vector_store_config):
-    """Processa PDFs e retorna tempo de indexação."""
+    """
+    Extrai, divide e indexa os PDFs de teste.
+
+    A extração corre num pool de processos; os PDFs são divididos em chunks pela
+    ordem da lista, cada um assim que o seu texto (e o dos anteriores) chega. O embedding e a inserção correm em pipeline, pelo que
+    tempo_indexacao_s mede o vector store (e o embedding), não o pypdf.
+
+    Returns:
+        tuple: (vector store, tempos em segundos por etapa, número de chunks)
+    """
     print(f"\n📄 Processando {len(PDFS_TESTE)} PDFs...")
     
-    start_time = time.time()
+    inicio_total = time.perf_counter()
+    tempos = {"extracao_s": 0.0, "chunking_s": 0.0, "embedding_s": 0.0, "insercao_s": 0.0}
     
     # Criar vector store
     vs = get_vector_store(vector_store_config)
     
-    # Processar cada PDF com chunk_size reduzido
     lista_chunks = []
     lista_metadados = []
     
+    existentes = []
     for pdf_path in PDFS_TESTE:
-        if not os.path.exists(pdf_path):
+        if os.path.exists(pdf_path):
+            existentes.append(pdf_path)
+        else:
             print(f"⚠️  Arquivo não encontrado: {pdf_path}")
-            continue
-            
-        try:
-            with open(pdf_path, 'rb') as f:
-                pdf_bytes = f.read()
-                reader = pypdf.PdfReader(io.BytesIO(pdf_bytes))
-                
-                print(f"  📄 {pdf_path}: {len(reader.pages)} páginas")
-                
-                texto = "".join(
-                    p.extract_text() or "" 
-                    for p in reader.pages
-                )
+    
+    inicio_extracao = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, min(PROCESSOS_EXTRACAO, len(existentes)))) as pool:
+        futuros = [(pdf_path, pool.submit(extrair_pdf, pdf_path)) for pdf_path in existentes]
+        # Pela ordem de submissão: a ordem dos chunks (e dos ids) não depende de
+        # qual PDF termina primeiro, e o índice é igual de execução para execução
+        for pdf_path, futuro in futuros:
+            try:
+                paginas, texto, _ = futuro.result()
+                print(f"  📄 {pdf_path}: {paginas} páginas")
                 
                 if not texto.strip():
                     print(f"  ⚠️  Nenhum texto extraído de {pdf_path}")
@@ -135,6 +359,7 @@ def processar_pdfs(vector_store_config):
                 
                 print(f"  📝 Texto extraído: {len(texto)} caracteres")
                 
+                inicio = time.perf_counter()
                 # FORÇAR CHUNKING SIMPLES para textos curtos
                 # Se o texto todo cabe em um chunk, usar ele inteiro
                 if len(texto) < 1000:
@@ -144,21 +369,27 @@ def processar_pdfs(vector_store_config):
                 else:
                     chunks, metadados = dividir_texto_em_chunks(texto, pdf_path)
                     print(f"  ✂️  Gerados {len(chunks)} chunks")
+                tempos["chunking_s"] += time.perf_counter() - inicio
                 
                 lista_chunks.extend(chunks)
                 lista_metadados.extend(metadados)
-        except Exception as e:
-            print(f"❌ Erro ao processar {pdf_path}: {e}")
+            except Exception as e:
+                print(f"❌ Erro ao processar {pdf_path}: {e}")
+    # Tempo de parede da extração em paralelo (sem o chunking, feito à medida que os textos chegam)
+    tempos["extracao_s"] = time.perf_counter() - inicio_extracao - tempos["chunking_s"]
     
     # Adicionar ao vector store
+    inicio_indexacao = time.perf_counter()
     if lista_chunks:
-        vs.adicionar(lista_chunks, lista_metadados)
-    
-    tempo_indexacao = time.time() - start_time
+        indexar_em_pipeline(vs, lista_chunks, lista_metadados, tempos)
+    tempos["tempo_indexacao_s"] = time.perf_counter() - inicio_indexacao
+    tempos["tempo_total_s"] = time.perf_counter() - inicio_total
     
-    print(f"✅ Indexados {len(lista_chunks)} chunks em {tempo_indexacao:.2f}s")
+    print(f"✅ Indexados {len(lista_chunks)} chunks em {tempos['tempo_indexacao_s']:.2f}s "
+          f"(extração {tempos['extracao_s']:.2f}s · chunking {tempos['chunking_s']:.2f}s · "
+          f"embedding {tempos['embedding_s']:.2f}s · inserção {tempos['insercao_s']:.2f}s)")
     
-    return vs, tempo_indexacao, len(lista_chunks)
+    return vs, tempos, len(lista_chunks)
 
 
 def avaliar_citacoes(resposta):
@@ -190,7 +421,7 @@ def avaliar_resposta_llm(provider, api_key, model_config, vector_store, pergunta
     
     # Tempo de geração da resposta
     start_geracao = time.time()
-    resposta = gerar_resposta_com_llm(
+    resultado_llm = gerar_resultado_com_llm(
         provider_name=provider,
         api_key=api_key,
         model_config=model_config,
@@ -201,10 +432,16 @@ def avaliar_resposta_llm(provider, api_key, model_config, vector_store, pergunta
         config_geracao=CONFIG_GERACAO
     )
     tempo_geracao = time.time() - start_geracao
+    if resultado_llm.erro:
+        raise RuntimeError(resultado_llm.erro)
+    resposta = resultado_llm.texto
     
     # Avaliar citações
     qualidade_citacoes = avaliar_citacoes(resposta)
     
+    # Tokens reportados pelo provedor e custo com os preços do config.yaml
+    uso = registo_uso(resultado_llm, provider, model_config)
+    
     return {
         "provider": provider,
         "pergunta": pergunta,
@@ -213,39 +450,31 @@ def avaliar_resposta_llm(provider, api_key, model_config, vector_store, pergunta
         "tempo_geracao_ms": tempo_geracao * 1000,
         "tempo_total_ms": (tempo_busca + tempo_geracao) * 1000,
         "tamanho_resposta": len(resposta),
+        "tokens_entrada": uso["tokens_entrada"],
+        "tokens_saida": uso["tokens_saida"],
+        "tokens_cache": uso["tokens_cache"],
+        "tokens_cache_escrita": uso["tokens_cache_escrita"],
+        "tokens_estimados": uso["estimado"],
+        "custo_estimado_usd": uso["custo_usd"],
         **qualidade_citacoes
     }
 
 
-def estimar_custo(provider, num_tokens_entrada, num_tokens_saida):
-    """Estima custo aproximado por consulta."""
-    # Preços aproximados por 1M tokens (valores de referência)
-    precos = {
-        "Gemini": {"entrada": 0.075, "saida": 0.30},  # Flash
-        "Claude": {"entrada": 3.00, "saida": 15.00},  # Sonnet
-        "Deepseek": {"entrada": 0.27, "saida": 1.10},
-        "OpenAI": {"entrada": 3.00, "saida": 15.00}   # GPT-4
-    }
-    
-    if provider not in precos:
-        return 0.0
-    
-    custo_entrada = (num_tokens_entrada / 1_000_000) * precos[provider]["entrada"]
-    custo_saida = (num_tokens_saida / 1_000_000) * precos[provider]["saida"]
-    
-    return custo_entrada + custo_saida
-
-
 # =============================================================================
 # EXPERIMENTO PRINCIPAL
 # =============================================================================
 
-def executar_experimento():
-    """Executa o experimento completo."""
+def executar_experimento(retomar=None):
+    """Executa o experimento completo (ou retoma uma execução interrompida)."""
     print("="*70)
     print("🧪 AVALIAÇÃO EXPERIMENTAL - UNESPedia")
     print("="*70)
     
+    id_execucao, pasta_execucao = preparar_execucao(retomar)
+    concluidas = {r['chave'] for r in carregar_log(pasta_execucao) if not r.get('erro')}
+    if concluidas:
+        print(f"⏭️  {len(concluidas)} células já concluídas serão saltadas")
+    
     config = carregar_config()
     providers_config = config['llm_providers']
     vector_stores_config = config['vector_stores']
@@ -254,40 +483,48 @@ def executar_experimento():
     perguntas = carregar_perguntas()
     print(f"\n📋 {len(perguntas)} perguntas carregadas")
     
-    resultados = []
-    
     # ==== EXPERIMENTO 1: Comparar Vector Stores ====
     print("\n" + "="*70)
     print("📊 EXPERIMENTO 1: Comparação de Vector Stores")
     print("="*70)
     
     metricas_vs = {}
+    stores = {}
     
     for vs_name in VECTOR_STORES:
         print(f"\n🗄️  Testando {vs_name}...")
         
         vs_config = vector_stores_config[vs_name]
-        vs, tempo_idx, num_chunks = processar_pdfs(vs_config)
+        stores[vs_name], info = obter_indice(vs_name, vs_config)
+        tempo_idx, num_chunks = info['tempo_indexacao_s'], info['num_chunks']
         
         metricas_vs[vs_name] = {
             "tempo_indexacao_s": tempo_idx,
+            # Etapas (índices construídos antes desta divisão só têm o tempo de indexação)
+            **{etapa: info.get(etapa) for etapa in ETAPAS_INDEXACAO},
             "num_chunks": num_chunks,
-            "tempo_por_chunk_ms": (tempo_idx / num_chunks) * 1000 if num_chunks > 0 else 0
+            "tempo_por_chunk_ms": (tempo_idx / num_chunks) * 1000 if num_chunks > 0 else 0,
+            "indice_reutilizado": info['reutilizado']
         }
+    with open(os.path.join(pasta_execucao, "metricas_vectorstores.json"), 'w', encoding='utf-8') as f:
+        json.dump(metricas_vs, f, ensure_ascii=False, indent=2)
     
     # ==== EXPERIMENTO 2: Comparar LLMs ====
     print("\n" + "="*70)
     print("🤖 EXPERIMENTO 2: Comparação de LLMs")
     print("="*70)
     
-    # Usar ChromaDB como padrão para testes de LLM
-    vs_padrao_config = vector_stores_config["ChromaDB"]
-    vs_padrao, _, _ = processar_pdfs(vs_padrao_config)
+    # Usar ChromaDB como padrão para testes de LLM (o índice do experimento 1, se já existir)
+    if VECTOR_STORE_LLM in stores:
+        vs_padrao = stores[VECTOR_STORE_LLM]
+    else:
+        vs_padrao, _ = obter_indice(VECTOR_STORE_LLM, vector_stores_config[VECTOR_STORE_LLM])
     
     for provider in LLM_PROVIDERS:
         api_key = secrets_manager.get_api_key(provider)
         
-        if not api_key or "SUA_CHAVE" in str(api_key):
+        requer_chave = providers_config[provider].get('requer_chave', True)
+        if requer_chave and (not api_key or "SUA_CHAVE" in str(api_key)):
             print(f"⚠️  Pulando {provider} - sem chave API configurada")
             continue
         
@@ -299,6 +536,9 @@ def executar_experimento():
         
         for i, pergunta_item in enumerate(perguntas, 1):
             pergunta = pergunta_item['pergunta']
+            chave = chave_celula(provider, model_config, VECTOR_STORE_LLM, pergunta)
+            if chave in concluidas:
+                continue
             
             print(f"  📝 Pergunta {i}/{len(perguntas)}: {pergunta[:50]}...")
             
@@ -311,19 +551,17 @@ def executar_experimento():
                     pergunta=pergunta,
                     nomes_ficheiros=PDFS_TESTE
                 )
+
                 
-                # Estimar custo
-                tokens_entrada = len(pergunta.split()) * 1.3  # Aproximação
-                tokens_saida = len(resultado['resposta'].split()) * 1.3
-                resultado['custo_estimado_usd'] = estimar_custo(
-                    provider, tokens_entrada, tokens_saida
-                )
-                
-                resultados.append(resultado)
+                resultado.update(chave=chave, vector_store=VECTOR_STORE_LLM)
+                registar_resultado(pasta_execucao, resultado)
                 print(f"  ✅ Tempo: {resultado['tempo_total_ms']:.0f}ms | Citações: {resultado['num_citacoes']}")
                 
             except Exception as e:
                 print(f"  ❌ Erro: {str(e)[:60]}...")
+                # Registada, mas não conta como concluída: é repetida ao retomar
+                registar_resultado(pasta_execucao, {"chave": chave, "provider": provider,
+                                                    "pergunta": pergunta, "erro": str(e)})
                 continue
     
     # ==== SALVAR RESULTADOS ====
@@ -331,6 +569,9 @@ def executar_experimento():
     print("💾 Salvando Resultados...")
     print("="*70)
     
+    # Todas as células concluídas da execução (incluindo sessões anteriores)
+    resultados = list({r['chave']: r for r in carregar_log(pasta_execucao) if not r.get('erro')}.values())
+    
     if not resultados:
         print("⚠️  Nenhum resultado de LLM coletado!")
         print("   Verifique se as chaves API estão configuradas corretamente.")
@@ -338,34 +579,34 @@ def executar_experimento():
     
     # Criar diretório de resultados
     Path("resultados_experimento").mkdir(exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = id_execucao
     
     # 1. Salvar métricas de Vector Stores
     df_vs = pd.DataFrame.from_dict(metricas_vs, orient='index')
-    df_vs.to_csv(f"resultados_experimento/metricas_vectorstores_{timestamp}.csv")
+    salvar_dataset(df_vs.rename_axis('vector_store').reset_index().assign(execucao=id_execucao),
+                   "vectorstores", ["execucao"])
     print(f"✅ Métricas de Vector Stores salvas")
     
-    # 2. Salvar métricas de LLMs
+    # 2. Salvar métricas de LLMs (uma linha por pergunta, com a resposta completa)
     df_llm = pd.DataFrame(resultados)
-    df_llm.to_csv(f"resultados_experimento/metricas_llms_{timestamp}.csv", index=False)
-    print(f"✅ Métricas de LLMs salvas")
+    salvar_dataset(df_llm.assign(execucao=id_execucao), "llms", ["execucao", "provider"])
+    print(f"✅ Métricas e respostas dos LLMs salvas em {PASTA_DATASET}/")
     
     # 3. Criar resumo estatístico
     resumo = df_llm.groupby('provider').agg({
         'tempo_total_ms': ['mean', 'std', 'min', 'max'],
         'num_citacoes': ['mean', 'sum'],
         'tem_citacoes': 'sum',
+        'tokens_entrada': 'sum',
+        'tokens_saida': 'sum',
+        'tokens_cache': 'sum',
+        'tokens_cache_escrita': 'sum',
         'custo_estimado_usd': 'sum'
-    }).round(3)
+    }).round(4)
     
     resumo.to_csv(f"resultados_experimento/resumo_estatistico_{timestamp}.csv")
     print(f"✅ Resumo estatístico salvo")
     
-    # 4. Salvar respostas completas (para análise qualitativa)
-    with open(f"resultados_experimento/respostas_completas_{timestamp}.json", 'w', encoding='utf-8') as f:
-        json.dump(resultados, f, ensure_ascii=False, indent=2)
-    print(f"✅ Respostas completas salvas")
-    
     # ==== MOSTRAR RESUMO ====
     print("\n" + "="*70)
     print("📈 RESUMO DOS RESULTADOS")
@@ -390,8 +631,15 @@ def executar_experimento():
 # =============================================================================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Avaliação experimental de LLMs e vector stores.")
+    parser.add_argument("--retomar", nargs="?", const="ultima", metavar="ID",
+                        help="Retoma uma execução (sem ID: a mais recente)")
+    args = parser.parse_args()
     try:
-        resultados, metricas_vs = executar_experimento()
+        resultados, metricas_vs = executar_experimento(args.retomar)
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrompido. Os resultados já obtidos estão no log da execução;"
+              " continue com: python testes/avaliar_sistema.py --retomar")
     except Exception as e:
         print(f"\n❌ Erro durante experimento: {e}")
         import traceback
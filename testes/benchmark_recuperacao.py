@@ -0,0 +1,190 @@
+# benchmark_recuperacao.py
+"""
+Benchmark offline da recuperação (sem chaves de API): recall@k, MRR,
+latência p50/p95/p99 e QPS do ChromaDBStore e do FAISSStore em vários
+tamanhos de corpus.
+
+Conjunto rotulado (consulta -> chunks relevantes):
+  - frases retiradas dos chunks dos PDFs de teste (o chunk de origem é o relevante)
+  - perguntas de Perguntas.xlsx cuja resposta ouro aparece literalmente num chunk
+
+Os tamanhos maiores juntam vetores sintéticos (perturbações dos reais) até ao
+total pedido, para medir a degradação até ~1M de vetores. Os resultados vão
+para um JSON em resultados_experimento/ para acompanhar regressões.
+
+Uso (a partir da raiz do projeto):
+    python testes/benchmark_recuperacao.py --tamanhos 0 10000 100000 1000000 --backends faiss chroma
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+PASTA_TESTES = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PASTA_TESTES))
+sys.path.insert(0, PASTA_TESTES)
+
+from config_loader import carregar_config, obter_configuracao
+from embedding_engine import obter_motor
+from avaliar_quantizacao import gerar_distratores
+from validar_onnx import EXCEL_PERGUNTAS, carregar_chunks
+
+PASTA_RESULTADOS = "resultados_experimento"
+BLOCO_SINTETICOS = 100_000   # limita a memória temporária ao gerar os distratores
+
+
+def gerar_conjunto_rotulado(chunks, n_frases=200, semente=0):
+    """
+    Returns:
+        list: [(consulta, conjunto de índices de chunks relevantes), ...]
+    """
+    rng = np.random.default_rng(semente)
+    conjunto = []
+    for i in rng.permutation(len(chunks)):
+        frases = [f.strip() for f in chunks[i].replace('\n', ' ').split('. ') if len(f.strip()) > 30]
+        if frases:
+            conjunto.append((frases[rng.integers(len(frases))][:300], {int(i)}))
+        if len(conjunto) >= n_frases:
+            break
+
+    try:
+        df = pd.read_excel(os.path.join(PASTA_TESTES, EXCEL_PERGUNTAS))
+        col_pergunta = 'Pergunta (Query)' if 'Pergunta (Query)' in df.columns else df.columns[0]
+        col_resposta = 'Resposta Ouro (GT Answer)' if 'Resposta Ouro (GT Answer)' in df.columns else None
+        if col_resposta:
+            for pergunta, resposta in df[[col_pergunta, col_resposta]].dropna().astype(str).values:
+                relevantes = {i for i, c in enumerate(chunks) if resposta.strip().lower() in c.lower()}
+                if relevantes:
+                    conjunto.append((pergunta, relevantes))
+    except Exception as e:
+        print(f"⚠️  Não foi possível ler {EXCEL_PERGUNTAS}: {e}")
+    return conjunto
+
+
+def criar_store(backend, pasta):
+    cfg = obter_configuracao().embedding
+    if backend == "faiss":
+        from vector_stores.faiss_store import FAISSStore
+        opcoes = (carregar_config() or {})['vector_stores'].get('FAISS', {})
+        return FAISSStore(os.path.join(pasta, "benchmark.pkl"), cfg.model, cfg.device,
+                          quantizacao=opcoes.get('quantizacao', 'flat'),
+                          rescoring=opcoes.get('rescoring', False),
+                          candidatos_rescoring=opcoes.get('candidatos_rescoring', 4))
+    if backend == "chroma":
+        from vector_stores.chroma_store import ChromaDBStore
+        return ChromaDBStore(pasta, "benchmark", cfg.model, cfg.device)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def percentis(latencias_ms):
+    p50, p95, p99 = np.percentile(latencias_ms, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def medir(backend, vetores, textos, consultas, relevantes, ks):
+    k_max = max(ks)
+    with tempfile.TemporaryDirectory() as pasta:
+        store = criar_store(backend, pasta)
+
+        inicio = time.perf_counter()
+        store.adicionar_vetores(vetores, textos, [{"id": i} for i in range(len(vetores))])
+        tempo_insercao = time.perf_counter() - inicio
+
+        # Aquecimento (carregamento preguiçoso, caches)
+        store.buscar_vetores(consultas[:1], k_max)
+
+        latencias, posicoes = [], []
+        for q, rel in zip(consultas, relevantes):
+            inicio = time.perf_counter()
+            hits = store.buscar_vetores(q[None, :], k_max)[0]
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            ids = [meta["id"] for _, _, meta in hits]
+            posicoes.append(next((p for p, i in enumerate(ids, 1) if i in rel), None))
+
+        inicio = time.perf_counter()
+        store.buscar_vetores(consultas, k_max)
+        qps_lote = len(consultas) / (time.perf_counter() - inicio)
+
+    resultado = {
+        "insercao_s": tempo_insercao,
+        "vetores_por_s": len(vetores) / tempo_insercao if tempo_insercao else 0.0,
+        **{f"recall@{k}": float(np.mean([p is not None and p <= k for p in posicoes])) for k in ks},
+        "mrr": float(np.mean([1 / p if p else 0.0 for p in posicoes])),
+        **percentis(latencias),
+        "qps": 1000 / float(np.mean(latencias)),
+        "qps_lote": qps_lote,
+    }
+    return resultado
+
+
+def executar(backends, tamanhos, ks, n_frases):
+    cfg = obter_configuracao().embedding
+    motor = obter_motor()
+    chunks = carregar_chunks()
+    if not chunks:
+        print("❌ Nenhum chunk gerado a partir dos PDFs de teste.")
+        return None
+    conjunto = gerar_conjunto_rotulado(chunks, n_frases)
+    print(f"📄 {len(chunks)} chunks · ❓ {len(conjunto)} consultas rotuladas · modelo {cfg.model}")
+
+    base = motor.codificar(chunks, normalizar=True)
+    consultas = motor.codificar([c for c, _ in conjunto], normalizar=True)
+    relevantes = [r for _, r in conjunto]
+
+    resultados = []
+    for tamanho in sorted(tamanhos):
+        extra = max(0, tamanho - len(chunks))
+        vetores = np.vstack([base] + [
+            gerar_distratores(base, min(BLOCO_SINTETICOS, extra - i), semente=i)
+            for i in range(0, extra, BLOCO_SINTETICOS)
+        ])
+        textos = chunks + [f"sintetico_{i}" for i in range(extra)]
+        for backend in backends:
+            print(f"\n🗄️  {backend} · {len(vetores)} vetores...")
+            medicao = medir(backend, vetores, textos, consultas, relevantes, ks)
+            medicao.update(backend=backend, num_vetores=len(vetores), num_consultas=len(consultas))
+            resultados.append(medicao)
+            print("  " + " | ".join(f"{c}: {v:.4f}" if isinstance(v, float) else f"{c}: {v}"
+                                    for c, v in medicao.items()))
+
+    relatorio = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "processador": platform.processor(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "modelo": cfg.model,
+            "backend_embedding": cfg.backend,
+            "faiss": dict((carregar_config() or {})['vector_stores'].get('FAISS', {})),
+            "ks": ks,
+        },
+        "resultados": resultados,
+    }
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    caminho = os.path.join(PASTA_RESULTADOS, f"benchmark_recuperacao_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados em {caminho}")
+    return relatorio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline de recall e latência dos vector stores.")
+    parser.add_argument("--backends", nargs="+", default=["faiss", "chroma"], choices=["faiss", "chroma"])
+    parser.add_argument("--tamanhos", nargs="+", type=int, default=[0, 10_000, 100_000],
+                        help="Total de vetores por corpus (0 = só os chunks reais)")
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 5, 10])
+    parser.add_argument("--consultas", type=int, default=200, help="Frases rotuladas a gerar")
+    args = parser.parse_args()
+    executar(args.backends, args.tamanhos, args.k, args.consultas)
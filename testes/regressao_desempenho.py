@@ -0,0 +1,408 @@
+# regressao_desempenho.py
+"""
+Deteção contínua de regressões de desempenho (sem chaves de API).
+
+Cada execução mede, com os PDFs de teste:
+  - chunking_ms               extração + divisão dos PDFs (menor é melhor)
+  - indexacao_chunks_por_s    throughput de adicionar() por backend (maior é melhor)
+  - busca_ms                  latência de buscar() por consulta: encode + índice + formatação
+  - ponta_a_ponta_ms          buscar_contexto_relevante + gerar_resposta_com_llm com o
+                              MockProvider sem atrasos (só o overhead do pipeline)
+
+e guarda as amostras num histórico SQLite, com o ambiente, o hash da
+configuração e a revisão git. As amostras são comparadas com as da baseline
+(teste de Mann-Whitney): uma métrica regrediu quando a diferença é
+significativa (p < --alfa) e a mediana piorou mais do que --limiar (e, nas
+latências, mais do que --limiar-ms, para ignorar ruído abaixo do milissegundo). O relatório
+inclui gráficos de tendência de todas as execuções.
+
+Uso (a partir da raiz do projeto):
+    python testes/regressao_desempenho.py                      # mede e compara com a baseline
+    python testes/regressao_desempenho.py --definir-baseline   # mede e passa a ser a baseline
+    python testes/regressao_desempenho.py --so-relatorio       # só os gráficos do histórico
+
+O código de saída é 1 quando há regressões (para usar em CI).
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import asdict
+from datetime import datetime
+from importlib import metadata
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+PASTA_TESTES = os.path.dirname(os.path.abspath(__file__))
+PASTA_PROJETO = os.path.dirname(PASTA_TESTES)
+sys.path.insert(0, PASTA_PROJETO)
+sys.path.insert(0, PASTA_TESTES)
+
+from config_loader import carregar_config, obter_configuracao
+from benchmark_recuperacao import criar_store, gerar_conjunto_rotulado
+from validar_onnx import PDFS_TESTE, carregar_chunks
+
+PASTA_RESULTADOS = "resultados_experimento"
+CAMINHO_HISTORICO = os.path.join(PASTA_RESULTADOS, "historico_desempenho.db")
+PACOTES_AMBIENTE = ("numpy", "faiss-cpu", "chromadb", "torch", "sentence-transformers", "onnxruntime")
+
+# Métrica -> True se valores maiores são melhores
+METRICAS = {
+    "chunking_ms": False,
+    "indexacao_chunks_por_s": True,
+    "busca_ms": False,
+    "ponta_a_ponta_ms": False,
+}
+
+# LLM sem atrasos: o tempo de ponta a ponta mede o pipeline, não o modelo
+CONFIG_MOCK = {"tipo": "mock", "model": "mock", "ttft_ms": 0, "tokens_por_s": 0, "tokens_resposta": 120}
+
+
+# =============================================================================
+# CONTEXTO DA EXECUÇÃO
+# =============================================================================
+
+def _descongelar(valor):
+    if isinstance(valor, (dict, MappingProxyType)):
+        return {k: _descongelar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_descongelar(v) for v in valor]
+    return valor
+
+
+def config_relevante(backends):
+    """Partes da configuração que afetam as medições."""
+    cfg = obter_configuracao()
+    bruto = carregar_config() or {}
+    stores = bruto.get('vector_stores', {})
+    return {
+        "pdf": asdict(cfg.pdf),
+        "embedding": asdict(cfg.embedding),
+        "consultas": _descongelar(bruto.get('consultas', {})),
+        "tracing": _descongelar(bruto.get('tracing', {})),
+        "vector_stores": {b: _descongelar(stores.get({"faiss": "FAISS", "chroma": "ChromaDB"}[b], {}))
+                          for b in backends},
+    }
+
+
+def hash_config(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def revisao_git():
+    """(revisão curta, True se há alterações por commitar) ou (None, None) fora de um repositório."""
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PASTA_PROJETO,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        estado = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PASTA_PROJETO,
+                                capture_output=True, text=True, check=True).stdout
+        return rev, bool(estado.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def ambiente():
+    versoes = {}
+    for pacote in PACOTES_AMBIENTE:
+        try:
+            versoes[pacote] = metadata.version(pacote)
+        except metadata.PackageNotFoundError:
+            pass
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "pacotes": versoes,
+    }
+
+
+# =============================================================================
+# MEDIÇÕES
+# =============================================================================
+
+def medir(backends, repeticoes, n_consultas):
+    """
+    Returns:
+        list: [(metrica, backend, valor), ...] com todas as amostras
+    """
+    from llm_handler import gerar_resposta_com_llm
+    from rag_processor import buscar_contexto_relevante
+
+    amostras = []
+    chunks = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        chunks = carregar_chunks()
+        amostras.append(("chunking_ms", "-", (time.perf_counter() - inicio) * 1000))
+    if not chunks:
+        raise RuntimeError("Nenhum chunk gerado a partir dos PDFs de teste.")
+    metadados = [{"fonte": PDFS_TESTE[i % len(PDFS_TESTE)], "id": i} for i in range(len(chunks))]
+    consultas = [c for c, _ in gerar_conjunto_rotulado(chunks, n_consultas)]
+    print(f"📄 {len(chunks)} chunks · ❓ {len(consultas)} consultas · {repeticoes} repetições")
+
+    for backend in backends:
+        print(f"\n🗄️  {backend}...")
+        with tempfile.TemporaryDirectory() as pasta:
+            for r in range(repeticoes):
+                pasta_store = os.path.join(pasta, f"indexacao_{r}")
+                os.makedirs(pasta_store)
+                store = criar_store(backend, pasta_store)
+                inicio = time.perf_counter()
+                store.adicionar(chunks, metadados)
+                amostras.append(("indexacao_chunks_por_s", backend, len(chunks) / (time.perf_counter() - inicio)))
+
+            # Aquecimento (carregamento preguiçoso, caches)
+            store.buscar(consultas[0], 5)
+            for consulta in consultas:
+                inicio = time.perf_counter()
+                store.buscar(consulta, 5)
+                amostras.append(("busca_ms", backend, (time.perf_counter() - inicio) * 1000))
+
+            for consulta in consultas:
+                inicio = time.perf_counter()
+                contexto = buscar_contexto_relevante(store, consulta, PDFS_TESTE)
+                gerar_resposta_com_llm("Mock (regressão)", None, CONFIG_MOCK, contexto, consulta, [],
+                                       PDFS_TESTE, {"temperature": 0.7, "top_p": 0.95, "max_output_tokens": 2048})
+                amostras.append(("ponta_a_ponta_ms", backend, (time.perf_counter() - inicio) * 1000))
+
+        for metrica in ("indexacao_chunks_por_s", "busca_ms", "ponta_a_ponta_ms"):
+            valores = [v for m, b, v in amostras if m == metrica and b == backend]
+            print(f"  {metrica}: mediana {np.median(valores):.2f} (n={len(valores)})")
+    return amostras
+
+
+# =============================================================================
+# HISTÓRICO (SQLite)
+# =============================================================================
+
+def abrir_historico(caminho=CAMINHO_HISTORICO):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    conn = sqlite3.connect(caminho)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS execucoes (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            git_rev TEXT,
+            git_sujo INTEGER,
+            hash_config TEXT NOT NULL,
+            config TEXT NOT NULL,
+            ambiente TEXT NOT NULL,
+            baseline INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS amostras (
+            execucao_id TEXT NOT NULL REFERENCES execucoes(id),
+            metrica TEXT NOT NULL,
+            backend TEXT NOT NULL,
+            valor REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_amostras_execucao ON amostras(execucao_id, metrica, backend);
+    """)
+    return conn
+
+
+def guardar_execucao(conn, config, amostras, baseline=False):
+    id_execucao = f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+    rev, sujo = revisao_git()
+    with conn:
+        conn.execute(
+            "INSERT INTO execucoes (id, data, git_rev, git_sujo, hash_config, config, ambiente, baseline) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (id_execucao, datetime.now().isoformat(timespec="seconds"), rev, sujo, hash_config(config),
+             json.dumps(config, ensure_ascii=False, default=str), json.dumps(ambiente(), ensure_ascii=False),
+             int(baseline)),
+        )
+        conn.executemany("INSERT INTO amostras (execucao_id, metrica, backend, valor) VALUES (?, ?, ?, ?)",
+                         [(id_execucao, m, b, v) for m, b, v in amostras])
+    return id_execucao
+
+
+def obter_baseline(conn, excluir=None):
+    """Baseline mais recente (ou None se ainda não houver nenhuma)."""
+    linha = conn.execute("SELECT id FROM execucoes WHERE baseline = 1 AND id != ? ORDER BY data DESC, id DESC LIMIT 1",
+                         (excluir or "",)).fetchone()
+    return linha[0] if linha else None
+
+
+def carregar_amostras(conn):
+    return pd.read_sql_query(
+        "SELECT a.execucao_id, e.data, e.git_rev, e.hash_config, e.baseline, a.metrica, a.backend, a.valor "
+        "FROM amostras a JOIN execucoes e ON e.id = a.execucao_id ORDER BY e.data, e.id", conn
+    )
+
+
+# =============================================================================
+# COMPARAÇÃO COM A BASELINE
+# =============================================================================
+
+def mann_whitney(a, b):
+    """p-valor bilateral do teste U de Mann-Whitney (aproximação normal, com correção de empates)."""
+    n1, n2 = len(a), len(b)
+    if n1 < 2 or n2 < 2:
+        return 1.0
+    todos = pd.Series(np.concatenate([a, b]))
+    postos = todos.rank(method="average").to_numpy()
+    u = postos[:n1].sum() - n1 * (n1 + 1) / 2
+    empates = todos.value_counts().to_numpy()
+    n = n1 + n2
+    variancia = n1 * n2 / 12 * ((n + 1) - (empates ** 3 - empates).sum() / (n * (n - 1)))
+    if variancia <= 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variancia)
+    return math.erfc(max(z, 0.0) / math.sqrt(2))
+
+
+def comparar(df, id_atual, id_baseline, alfa, limiar, limiar_ms=0.5):
+    """
+    Returns:
+        pd.DataFrame: uma linha por (métrica, backend) com medianas, variação, p-valor e se regrediu
+    """
+    linhas = []
+    atual = df[df.execucao_id == id_atual]
+    base = df[df.execucao_id == id_baseline]
+    for (metrica, backend), grupo in atual.groupby(["metrica", "backend"]):
+        referencia = base[(base.metrica == metrica) & (base.backend == backend)].valor.to_numpy()
+        if not len(referencia):
+            continue
+        valores = grupo.valor.to_numpy()
+        mediana, mediana_base = float(np.median(valores)), float(np.median(referencia))
+        variacao = (mediana - mediana_base) / mediana_base if mediana_base else 0.0
+        # Piora relativa: positiva quando a métrica ficou pior, qualquer que seja o sentido
+        piora = -variacao if METRICAS[metrica] else variacao
+        p = mann_whitney(valores, referencia)
+        linhas.append({
+            "metrica": metrica, "backend": backend,
+            "mediana_baseline": mediana_base, "mediana_atual": mediana,
+            "variacao_pct": variacao * 100, "p_valor": p,
+            "regressao": bool(p < alfa and piora > limiar
+                              and (not metrica.endswith("_ms") or mediana - mediana_base > limiar_ms)),
+            "melhoria": bool(p < alfa and -piora > limiar),
+        })
+    return pd.DataFrame(linhas)
+
+
+# =============================================================================
+# RELATÓRIO
+# =============================================================================
+
+def graficos_tendencia(df, regressoes_por_execucao=None):
+    """Mediana (e intervalo interquartil) de cada métrica por execução, com a baseline marcada."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    regressoes_por_execucao = regressoes_por_execucao or {}
+    execucoes = list(dict.fromkeys(df.execucao_id))
+    rotulos = [f"{d[5:16].replace('T', ' ')}\n{rev or '?'}" for d, rev in
+               df.drop_duplicates("execucao_id")[["data", "git_rev"]].itertuples(index=False)]
+    baselines = set(df[df.baseline == 1].execucao_id)
+
+    fig, eixos = plt.subplots(len(METRICAS), 1, figsize=(max(8, len(execucoes) * 0.9), 3.2 * len(METRICAS)),
+                              sharex=True)
+    for eixo, metrica in zip(eixos, METRICAS):
+        dados = df[df.metrica == metrica]
+        for backend, grupo in dados.groupby("backend"):
+            stats = grupo.groupby("execucao_id").valor.quantile([0.25, 0.5, 0.75]).unstack().reindex(execucoes)
+            x = np.arange(len(execucoes))
+            linha, = eixo.plot(x, stats[0.5], marker="o", label=backend)
+            eixo.fill_between(x, stats[0.25], stats[0.75], alpha=0.2, color=linha.get_color())
+            for i, execucao in enumerate(execucoes):
+                if (metrica, backend) in regressoes_por_execucao.get(execucao, ()):
+                    eixo.plot(i, stats[0.5].iloc[i], marker="X", markersize=12, color="red")
+        for i, execucao in enumerate(execucoes):
+            if execucao in baselines:
+                eixo.axvline(i, linestyle="--", color="gray", alpha=0.6)
+        eixo.set_title(f"{metrica} ({'maior' if METRICAS[metrica] else 'menor'} é melhor)", fontsize=11)
+        eixo.legend(loc="best", fontsize=8)
+    eixos[-1].set_xticks(np.arange(len(execucoes)))
+    eixos[-1].set_xticklabels(rotulos, rotation=45, ha="right", fontsize=8)
+    fig.suptitle("Tendência de desempenho (--- baseline, X regressão)", fontweight="bold")
+    fig.tight_layout()
+
+    pasta = os.path.join(PASTA_RESULTADOS, "graficos")
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, "tendencia_desempenho.png")
+    fig.savefig(caminho, dpi=150, bbox_inches="tight")
+    plt.close(fig)
+    return caminho
+
+
+def regressoes_historicas(conn, df, alfa, limiar, limiar_ms):
+    """Regressões de cada execução face à baseline em vigor na altura (para marcar nos gráficos)."""
+    marcadas = {}
+    baseline = None
+    for id_execucao, e_baseline in conn.execute("SELECT id, baseline FROM execucoes ORDER BY data, id"):
+        if baseline and id_execucao != baseline:
+            comparacao = comparar(df, id_execucao, baseline, alfa, limiar, limiar_ms)
+            if not comparacao.empty:
+                marcadas[id_execucao] = {(r.metrica, r.backend) for r in comparacao.itertuples() if r.regressao}
+        if e_baseline:
+            baseline = id_execucao
+    return marcadas
+
+
+def executar(backends, repeticoes, n_consultas, definir_baseline, id_baseline, alfa, limiar, limiar_ms,
+             so_relatorio):
+    conn = abrir_historico()
+    regrediu = False
+
+    if not so_relatorio:
+        config = config_relevante(backends)
+        amostras = medir(backends, repeticoes, n_consultas)
+        # A primeira execução do histórico passa a ser a baseline
+        primeira = obter_baseline(conn) is None
+        id_atual = guardar_execucao(conn, config, amostras, baseline=definir_baseline or primeira)
+        print(f"\n💾 Execução {id_atual} (config {hash_config(config)}) guardada em {CAMINHO_HISTORICO}")
+
+        id_baseline = id_baseline or obter_baseline(conn, excluir=id_atual)
+        if id_baseline:
+            ambiente_base, hash_base = conn.execute("SELECT ambiente, hash_config FROM execucoes WHERE id = ?",
+                                                    (id_baseline,)).fetchone()
+            ambiente_atual = ambiente()
+            if json.loads(ambiente_base)["processador"] != ambiente_atual["processador"] or \
+                    json.loads(ambiente_base)["cpus"] != ambiente_atual["cpus"]:
+                print("⚠️  A baseline foi medida noutra máquina: as diferenças podem não ser regressões.")
+            if hash_base != hash_config(config):
+                print("ℹ️  A configuração mudou desde a baseline.")
+
+            comparacao = comparar(carregar_amostras(conn), id_atual, id_baseline, alfa, limiar, limiar_ms)
+            print(f"\n📊 Comparação com a baseline {id_baseline} (p < {alfa}, piora > {limiar:.0%}):")
+            print(comparacao.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+            regrediu = bool(comparacao.regressao.any()) if not comparacao.empty else False
+            print("\n❌ Regressões detetadas!" if regrediu else "\n✅ Sem regressões significativas.")
+        else:
+            print("📌 Primeira execução: fica como baseline.")
+
+    df = carregar_amostras(conn)
+    if not df.empty:
+        caminho = graficos_tendencia(df, regressoes_historicas(conn, df, alfa, limiar, limiar_ms))
+        print(f"📈 Gráficos de tendência em {caminho}")
+    conn.close()
+    return regrediu
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark com histórico e deteção de regressões de desempenho.")
+    parser.add_argument("--backends", nargs="+", default=["faiss", "chroma"], choices=["faiss", "chroma"])
+    parser.add_argument("--repeticoes", type=int, default=10, help="Repetições da indexação e do chunking")
+    parser.add_argument("--consultas", type=int, default=100, help="Consultas para as latências")
+    parser.add_argument("--definir-baseline", action="store_true", help="Marca esta execução como baseline")
+    parser.add_argument("--baseline", help="Compara com esta execução em vez da baseline mais recente")
+    parser.add_argument("--alfa", type=float, default=0.01, help="Nível de significância do teste")
+    parser.add_argument("--limiar", type=float, default=0.05, help="Piora relativa mínima da mediana")
+    parser.add_argument("--limiar-ms", type=float, default=0.5, help="Piora mínima da mediana nas latências (ms)")
+    parser.add_argument("--so-relatorio", action="store_true", help="Só gera os gráficos do histórico")
+    args = parser.parse_args()
+    sys.exit(1 if executar(args.backends, args.repeticoes, args.consultas, args.definir_baseline,
+                           args.baseline, args.alfa, args.limiar, args.limiar_ms, args.so_relatorio) else 0)
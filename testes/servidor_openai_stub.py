@@ -0,0 +1,132 @@
+# servidor_openai_stub.py
+"""
+Servidor local compatível com a API de chat da OpenAI (/v1/chat/completions),
+para testar o caminho real do OpenAIProvider (SDK, streaming SSE, 429 e
+retentativas) sem chaves nem custos. As respostas vêm do MockProvider:
+determinísticas e com as citações do contexto enviado na última mensagem do
+utilizador (parte variável de prompt_templates).
+
+Uso (a partir da raiz do projeto):
+    python testes/servidor_openai_stub.py --porta 8001 --ttft-ms 300 --tokens-por-s 50 --taxa-429 0.05
+
+e escolher o provedor "Stub OpenAI (local)" do config.yaml.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PASTA_TESTES = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PASTA_TESTES))
+
+from llm_providers.mock import ErroLimiteTaxa, MockProvider
+from prompt_templates import separar_parte_variavel
+
+
+class ManipuladorStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    provedor = None   # MockProvider configurado pela linha de comandos
+
+    def _json(self, estado, corpo, cabecalhos=None):
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _sse(self, corpo):
+        dados = f"data: {json.dumps(corpo) if isinstance(corpo, dict) else corpo}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(dados):x}\r\n".encode() + dados + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            return self._json(200, {"object": "list", "data": [{"id": self.provedor.model_name, "object": "model"}]})
+        self._json(404, {"error": {"message": f"Rota desconhecida: {self.path}"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._json(404, {"error": {"message": f"Rota desconhecida: {self.path}"}})
+        pedido = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        mensagens = pedido.get("messages", [])
+        # A última mensagem do utilizador traz o contexto recuperado e a pergunta
+        ultima = next((m["content"] for m in reversed(mensagens) if m["role"] == "user"), "")
+        contexto, pergunta = separar_parte_variavel(ultima)
+
+        try:
+            tokens = self.provedor._abrir(contexto, pergunta, {"max_output_tokens": pedido.get("max_tokens")})
+        except ErroLimiteTaxa as e:
+            return self._json(429, {"error": {"message": str(e), "type": "rate_limit_exceeded"}},
+                              {"Retry-After": "1"})
+        except Exception as e:
+            return self._json(500, {"error": {"message": str(e), "type": "server_error"}})
+
+        id_resposta = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        modelo = pedido.get("model", self.provedor.model_name)
+        uso = {
+            "prompt_tokens": sum(len(m["content"].split()) for m in mensagens),
+            "completion_tokens": len(tokens),
+        }
+        uso["total_tokens"] = uso["prompt_tokens"] + uso["completion_tokens"]
+        time.sleep(self.provedor.ttft_s)
+        intervalo = 1 / self.provedor.tokens_por_s if self.provedor.tokens_por_s else 0
+
+        if not pedido.get("stream"):
+            time.sleep(intervalo * len(tokens))
+            return self._json(200, {
+                "id": id_resposta, "object": "chat.completion", "created": int(time.time()), "model": modelo,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens).strip()}}],
+                "usage": uso,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": id_resposta, "object": "chat.completion.chunk", "created": int(time.time()), "model": modelo}
+        self._sse({**base, "choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]})
+        for token in tokens:
+            self._sse({**base, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            time.sleep(intervalo)
+        self._sse({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (pedido.get("stream_options") or {}).get("include_usage"):
+            self._sse({**base, "choices": [], "usage": uso})
+        self._sse("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, formato, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local compatível com a API de chat da OpenAI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8001)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-por-s", type=float, default=50)
+    parser.add_argument("--tokens-resposta", type=int, default=120)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    ManipuladorStub.provedor = MockProvider(
+        model_name="stub", ttft_ms=args.ttft_ms, tokens_por_s=args.tokens_por_s,
+        tokens_resposta=args.tokens_resposta, taxa_erro=args.taxa_erro,
+        taxa_429=args.taxa_429, semente=args.semente
+    )
+    servidor = ThreadingHTTPServer((args.host, args.porta), ManipuladorStub)
+    servidor.daemon_threads = True
+    print(f"🧪 Stub OpenAI em http://{args.host}:{args.porta}/v1")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,343 @@
+# teste_carga.py
+"""
+Teste de carga do caminho de uma mensagem (sem chaves de API).
+
+Simula N sessões de chat em paralelo, cada uma numa thread, como os
+utilizadores de uma instância da app: pergunta -> buscar_contexto_relevante
+-> gerar_resposta_com_llm(stream=True) com o MockProvider -> tempo de
+reflexão (exponencial, média --pensar-s) -> pergunta seguinte, com o
+histórico do chat a crescer. Os vector stores, o encoder e o agrupador de
+consultas são partilhados por todas as sessões, tal como na app.
+
+Para cada nível de concorrência (--sessoes 1 4 16 ...) reporta:
+  - throughput (respostas/s) e erros
+  - latência total, da busca e até ao primeiro token: p50/p95/p99
+  - contenção dos locks do caminho (FAISSStore, agrupador de consultas,
+    tracing, mock): aquisições, % contendidas e tempo de espera
+  - lote médio e espera na fila do agrupador de consultas
+e indica o último nível antes do colapso da latência (p95 acima de
+--limite-p95 vezes o p95 com uma sessão) para dimensionar instâncias.
+O relatório vai para um JSON em resultados_experimento/.
+
+Uso (a partir da raiz do projeto):
+    python testes/teste_carga.py --sessoes 1 4 16 32 --duracao 30 --pensar-s 2
+    python testes/teste_carga.py --backend chroma --ttft-ms 0 --tokens-por-s 0   # só o overhead do pipeline
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+PASTA_TESTES = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PASTA_TESTES))
+sys.path.insert(0, PASTA_TESTES)
+
+from config_loader import carregar_config
+from benchmark_recuperacao import criar_store, gerar_conjunto_rotulado
+from validar_onnx import PDFS_TESTE, carregar_chunks
+
+PASTA_RESULTADOS = "resultados_experimento"
+PROVEDOR_MOCK = "Mock (local)"
+CONFIG_GERACAO = {"temperature": 0.7, "top_p": 0.95, "max_output_tokens": 2048}
+MAX_HISTORICO = 6   # mensagens do chat enviadas ao LLM, como na app
+
+
+# =============================================================================
+# CONTENÇÃO DE LOCKS
+# =============================================================================
+
+class LockMedido:
+    """
+    Envolve um Lock/RLock e conta as aquisições que tiveram de esperar por
+    outra thread, e quanto tempo esperaram.
+    """
+
+    def __init__(self, nome, lock):
+        self.nome = nome
+        self._interno = lock
+        self._contador = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.aquisicoes = 0
+        self.contendidas = 0
+        self.espera_s = 0.0
+        self.espera_max_s = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._interno.acquire(blocking=False):
+            espera = 0.0
+        elif not blocking:
+            return False
+        else:
+            inicio = time.perf_counter()
+            if not self._interno.acquire(timeout=timeout):
+                return False
+            espera = time.perf_counter() - inicio
+        with self._contador:
+            self.aquisicoes += 1
+            if espera:
+                self.contendidas += 1
+                self.espera_s += espera
+                self.espera_max_s = max(self.espera_max_s, espera)
+        return True
+
+    def release(self):
+        self._interno.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def metricas(self, duracao_s):
+        return {
+            "aquisicoes": self.aquisicoes,
+            "contendidas_pct": 100 * self.contendidas / self.aquisicoes if self.aquisicoes else 0.0,
+            "espera_total_ms": self.espera_s * 1000,
+            "espera_max_ms": self.espera_max_s * 1000,
+            # Fração do tempo do teste que as threads passaram bloqueadas neste lock
+            "espera_por_s": self.espera_s / duracao_s if duracao_s else 0.0,
+        }
+
+
+def instrumentar_locks(store):
+    """Substitui os locks do caminho de uma mensagem por LockMedido (depois do aquecimento)."""
+    import query_batcher
+    import tracing
+    from llm_providers import mock
+
+    locks = []
+
+    def medir(dono, atributo, nome):
+        atual = getattr(dono, atributo, None)
+        if atual is None:
+            return
+        if not isinstance(atual, LockMedido):
+            atual = LockMedido(nome, atual)
+            setattr(dono, atributo, atual)
+        locks.append(atual)
+
+    medir(store, "_lock", f"{type(store).__name__}._lock")
+    medir(query_batcher, "_lock", "query_batcher._lock")
+    medir(query_batcher.obter_agrupador(store), "_lock", "AgrupadorConsultas._lock")
+    medir(tracing, "_lock", "tracing._lock")
+    medir(mock, "_lock", "mock._lock")
+    return locks
+
+
+# =============================================================================
+# SESSÕES SIMULADAS
+# =============================================================================
+
+def sessao(id_sessao, store, config_mock, consultas, pensar_s, fim, amostras, lock_amostras):
+    """Uma sessão de chat: pergunta, lê a resposta em stream, pensa, repete até `fim`."""
+    from llm_handler import gerar_resposta_com_llm
+    from rag_processor import buscar_contexto_relevante
+
+    rng = random.Random(id_sessao)
+    historico = []
+    # Chegadas desfasadas: as sessões não começam todas no mesmo instante
+    time.sleep(rng.uniform(0, pensar_s))
+    while time.monotonic() < fim:
+        pergunta = rng.choice(consultas)
+        inicio = time.perf_counter()
+        erro = busca = primeiro_token = None
+        try:
+            contexto = buscar_contexto_relevante(store, pergunta, PDFS_TESTE)
+            busca = time.perf_counter()
+            resposta = gerar_resposta_com_llm(PROVEDOR_MOCK, None, config_mock, contexto, pergunta,
+                                              historico[-MAX_HISTORICO:], PDFS_TESTE, CONFIG_GERACAO,
+                                              stream=True)
+            trechos = []
+            for trecho in resposta:
+                if primeiro_token is None:
+                    primeiro_token = time.perf_counter()
+                trechos.append(trecho)
+            if resposta.resultado is not None and resposta.resultado.erro:
+                erro = resposta.resultado.erro
+        except Exception as e:
+            erro = f"{type(e).__name__}: {e}"
+            trechos = []
+        agora = time.perf_counter()
+        with lock_amostras:
+            amostras.append({
+                "sessao": id_sessao,
+                "total_ms": (agora - inicio) * 1000,
+                "busca_ms": ((busca or agora) - inicio) * 1000,
+                "primeiro_token_ms": ((primeiro_token or agora) - inicio) * 1000,
+                "fim": time.monotonic(),
+                "erro": erro,
+            })
+        historico += [{"role": "user", "content": pergunta}, {"role": "assistant", "content": "".join(trechos)}]
+        time.sleep(rng.expovariate(1 / pensar_s) if pensar_s > 0 else 0)
+
+
+def percentis(valores):
+    if not valores:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def executar_nivel(n_sessoes, store, config_mock, consultas, duracao_s, pensar_s, locks):
+    """Corre n_sessoes em paralelo durante duracao_s; só contam as respostas terminadas dentro do prazo."""
+    import query_batcher
+
+    for lock in locks:
+        lock.reiniciar()
+    agrupador = query_batcher.obter_agrupador(store)
+    antes = (agrupador.lotes, agrupador.consultas)
+    agrupador._esperas_ms.clear()
+
+    amostras, lock_amostras = [], threading.Lock()
+    inicio = time.monotonic()
+    fim = inicio + duracao_s
+    threads = [threading.Thread(target=sessao, name=f"sessao-{i}", daemon=True,
+                                args=(i, store, config_mock, consultas, pensar_s, fim, amostras, lock_amostras))
+               for i in range(n_sessoes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+
+    validas = [a for a in amostras if a["fim"] <= fim]
+    ok = [a for a in validas if not a["erro"]]
+    lotes, consultas_lote = agrupador.lotes - antes[0], agrupador.consultas - antes[1]
+    metricas_agrupador = agrupador.metricas()
+    return {
+        "sessoes": n_sessoes,
+        "respostas": len(validas),
+        "erros": len(validas) - len(ok),
+        "throughput_rps": len(ok) / duracao_s,
+        "total": percentis([a["total_ms"] for a in ok]),
+        "busca": percentis([a["busca_ms"] for a in ok]),
+        "primeiro_token": percentis([a["primeiro_token_ms"] for a in ok]),
+        "agrupador": {
+            "lote_medio": consultas_lote / lotes if lotes else 0.0,
+            "espera_media_ms": metricas_agrupador["espera_media_ms"],
+            "espera_p95_ms": metricas_agrupador["espera_p95_ms"],
+        },
+        "locks": {lock.nome: lock.metricas(decorrido) for lock in locks},
+        "exemplo_erro": next((a["erro"] for a in validas if a["erro"]), None),
+    }
+
+
+def ponto_de_colapso(niveis, limite_p95):
+    """Maior nível de concorrência com p95 total até limite_p95 × o p95 do primeiro nível."""
+    referencia = niveis[0]["total"]["p95_ms"]
+    aceitaveis = [n["sessoes"] for n in niveis
+                  if n["respostas"] and n["total"]["p95_ms"] <= limite_p95 * referencia]
+    return max(aceitaveis, default=None)
+
+
+# =============================================================================
+# EXECUÇÃO
+# =============================================================================
+
+def executar(niveis_sessoes, backend, duracao_s, pensar_s, ttft_ms, tokens_por_s, limite_p95):
+    config_mock = dict((carregar_config() or {}).get('llm_providers', {}).get(PROVEDOR_MOCK, {}),
+                       tipo="mock", taxa_erro=0.0, taxa_429=0.0)
+    if ttft_ms is not None:
+        config_mock["ttft_ms"] = ttft_ms
+    if tokens_por_s is not None:
+        config_mock["tokens_por_s"] = tokens_por_s
+
+    chunks = carregar_chunks()
+    if not chunks:
+        raise RuntimeError("Nenhum chunk gerado a partir dos PDFs de teste.")
+    metadados = [{"fonte": PDFS_TESTE[i % len(PDFS_TESTE)], "page": 1, "section": "-", "id": i}
+                 for i in range(len(chunks))]
+    consultas = [c for c, _ in gerar_conjunto_rotulado(chunks, 200)]
+    print(f"📄 {len(chunks)} chunks · ❓ {len(consultas)} perguntas · 🗄️ {backend} · "
+          f"mock: ttft {config_mock.get('ttft_ms')} ms, {config_mock.get('tokens_por_s')} tokens/s")
+
+    niveis = []
+    with tempfile.TemporaryDirectory() as pasta:
+        store = criar_store(backend, pasta)
+        store.adicionar(chunks, metadados)
+        # Aquecimento: carregamento preguiçoso do encoder e criação do agrupador
+        import query_batcher
+        query_batcher.buscar(store, consultas[0], 5)
+        locks = instrumentar_locks(store)
+
+        for n in sorted(set(niveis_sessoes)):
+            print(f"\n👥 {n} sessões durante {duracao_s:.0f}s...")
+            nivel = executar_nivel(n, store, config_mock, consultas, duracao_s, pensar_s, locks)
+            niveis.append(nivel)
+            print(f"  {nivel['throughput_rps']:.2f} respostas/s · {nivel['erros']} erros · "
+                  f"total p50/p95/p99 {nivel['total']['p50_ms']:.0f}/{nivel['total']['p95_ms']:.0f}/"
+                  f"{nivel['total']['p99_ms']:.0f} ms · busca p95 {nivel['busca']['p95_ms']:.0f} ms · "
+                  f"1.º token p95 {nivel['primeiro_token']['p95_ms']:.0f} ms · "
+                  f"lote médio {nivel['agrupador']['lote_medio']:.1f}")
+            for nome, m in nivel["locks"].items():
+                if m["aquisicoes"]:
+                    print(f"    🔒 {nome:<28} {m['aquisicoes']:>8} aquisições · {m['contendidas_pct']:5.1f}% "
+                          f"contendidas · espera {m['espera_total_ms']:8.1f} ms (máx {m['espera_max_ms']:.1f})")
+            if nivel["exemplo_erro"]:
+                print(f"    ⚠️  {nivel['exemplo_erro']}")
+
+    colapso = ponto_de_colapso(niveis, limite_p95) if niveis else None
+    print("\n" + "=" * 70)
+    if colapso is None:
+        print("❌ Nenhum nível dentro do limite de latência")
+    else:
+        print(f"✅ Até {colapso} sessões simultâneas com p95 ≤ {limite_p95:g}× o p95 de "
+              f"{niveis[0]['sessoes']} sessão(ões)")
+    print("=" * 70)
+
+    relatorio = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "processador": platform.processor(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "backend": backend,
+            "duracao_s": duracao_s,
+            "pensar_s": pensar_s,
+            "limite_p95": limite_p95,
+            "mock": config_mock,
+            "consultas": dict((carregar_config() or {}).get('consultas', {})),
+        },
+        "sessoes_max_recomendadas": colapso,
+        "niveis": niveis,
+    }
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    caminho = os.path.join(PASTA_RESULTADOS, f"teste_carga_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2, default=str)
+    print(f"\n💾 Resultados em {caminho}")
+    return relatorio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga com sessões de chat concorrentes (LLM simulado).")
+    parser.add_argument("--sessoes", nargs="+", type=int, default=[1, 4, 16, 32],
+                        help="Níveis de concorrência a testar")
+    parser.add_argument("--backend", default="faiss", choices=["faiss", "chroma"])
+    parser.add_argument("--duracao", type=float, default=30.0, help="Segundos por nível")
+    parser.add_argument("--pensar-s", type=float, default=2.0,
+                        help="Tempo médio de reflexão entre perguntas de uma sessão (0 = sem pausa)")
+    parser.add_argument("--ttft-ms", type=int, default=None, help="Substitui o ttft_ms do Mock (local)")
+    parser.add_argument("--tokens-por-s", type=float, default=None,
+                        help="Substitui o tokens_por_s do Mock (local) (0 = sem atraso)")
+    parser.add_argument("--limite-p95", type=float, default=2.0,
+                        help="Colapso: p95 acima deste múltiplo do p95 do primeiro nível")
+    args = parser.parse_args()
+    executar(args.sessoes, args.backend, args.duracao, args.pensar_s, args.ttft_ms,
+             args.tokens_por_s, args.limite_p95)
@@ -0,0 +1,142 @@
+# validar_onnx.py
+"""
+Validação do backend ONNX de embeddings contra o modelo fp32 (PyTorch).
+
+Codifica os chunks dos PDFs de teste e as perguntas de Perguntas.xlsx com as
+duas variantes e reporta:
+  - concordância de cosseno entre o embedding fp32 e o ONNX de cada chunk
+  - recall@k da busca ONNX em relação ao top-k da busca fp32
+  - throughput (chunks/s) de cada variante
+
+Uso (a partir da raiz do projeto):
+    python testes/validar_onnx.py --quantizacao avx2 --k 10
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+PASTA_TESTES = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PASTA_TESTES))
+
+from config_loader import obter_configuracao
+from embedding_engine import MotorEmbedding, QUANTIZACOES_ONNX
+from rag_processor import dividir_texto_em_chunks, extrair_texto_pdf
+
+PDFS_TESTE = [
+    "Security_Mitigation_Fails.pdf",
+    "ML_Attacks_Metrics.pdf",
+    "DL_Attacks_Types.pdf"
+]
+EXCEL_PERGUNTAS = "Perguntas.xlsx"
+
+
+def carregar_chunks():
+    """Chunks dos PDFs de teste, com a configuração de chunking atual."""
+    chunks = []
+    for nome in PDFS_TESTE:
+        caminho = os.path.join(PASTA_TESTES, nome)
+        if not os.path.exists(caminho):
+            print(f"⚠️  Arquivo não encontrado: {caminho}")
+            continue
+        with open(caminho, 'rb') as f:
+            texto = extrair_texto_pdf(f.read())
+        textos, _ = dividir_texto_em_chunks(texto, nome)
+        if not textos:
+            # Textos curtos sem secções (caso dos PDFs de teste): uma unidade por frase
+            textos = [frase.strip() for frase in texto.replace('\n', ' ').split('. ') if len(frase.strip()) > 20]
+        chunks.extend(textos)
+    return chunks
+
+
+def carregar_consultas(chunks):
+    """Perguntas do Excel + a primeira frase de uma amostra de chunks."""
+    consultas = []
+    try:
+        df = pd.read_excel(os.path.join(PASTA_TESTES, EXCEL_PERGUNTAS))
+        coluna = 'Pergunta (Query)' if 'Pergunta (Query)' in df.columns else df.columns[0]
+        consultas.extend(df[coluna].dropna().astype(str).tolist())
+    except Exception as e:
+        print(f"⚠️  Não foi possível ler {EXCEL_PERGUNTAS}: {e}")
+
+    rng = np.random.default_rng(0)
+    for i in rng.choice(len(chunks), size=min(50, len(chunks)), replace=False):
+        frase = chunks[i].strip().split('. ')[0][:200]
+        if len(frase) > 20:
+            consultas.append(frase)
+    return consultas
+
+
+def codificar(motor, textos):
+    inicio = time.perf_counter()
+    embs = motor.codificar(textos, normalizar=True)
+    return embs, len(textos) / (time.perf_counter() - inicio)
+
+
+def top_k(matriz, consultas, k):
+    scores = consultas @ matriz.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def validar(quantizacao, k):
+    cfg = obter_configuracao().embedding
+    chunks = carregar_chunks()
+    if not chunks:
+        print("❌ Nenhum chunk gerado a partir dos PDFs de teste.")
+        return None
+    consultas = carregar_consultas(chunks)
+    print(f"📄 {len(chunks)} chunks · ❓ {len(consultas)} consultas · modelo {cfg.model}")
+
+    base = dict(modelo=cfg.model, device="cpu", batch_size=cfg.batch_size, num_threads=cfg.num_threads)
+    motor_fp32 = MotorEmbedding(**base, backend="torch")
+    motor_onnx = MotorEmbedding(**base, backend="onnx", onnx_quantizacao=quantizacao,
+                                onnx_diretorio=cfg.onnx_diretorio)
+
+    embs_fp32, vel_fp32 = codificar(motor_fp32, chunks)
+    embs_onnx, vel_onnx = codificar(motor_onnx, chunks)
+    q_fp32, _ = codificar(motor_fp32, consultas)
+    q_onnx, _ = codificar(motor_onnx, consultas)
+
+    # Vetores normalizados: o produto linha a linha é o cosseno
+    cossenos = np.sum(embs_fp32 * embs_onnx, axis=1)
+
+    k = min(k, len(chunks))
+    ref = top_k(embs_fp32, q_fp32, k)
+    # Índice e consultas ONNX (troca completa de backend) e só consultas ONNX
+    # sobre um índice fp32 já existente (troca sem reindexar)
+    completo = top_k(embs_onnx, q_onnx, k)
+    misto = top_k(embs_fp32, q_onnx, k)
+
+    def recall(resultado):
+        return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref, resultado)]))
+
+    resultado = {
+        "variante": motor_onnx.variante,
+        "cosseno_medio": float(cossenos.mean()),
+        "cosseno_p5": float(np.percentile(cossenos, 5)),
+        "cosseno_min": float(cossenos.min()),
+        f"recall@{k}_onnx": recall(completo),
+        f"recall@{k}_consultas_onnx_indice_fp32": recall(misto),
+        "chunks_por_s_fp32": vel_fp32,
+        "chunks_por_s_onnx": vel_onnx,
+        "aceleracao": vel_onnx / vel_fp32 if vel_fp32 else 0.0,
+    }
+
+    print("\n" + "=" * 70)
+    print(f"📊 ONNX ({resultado['variante']}) vs fp32")
+    print("=" * 70)
+    for chave, valor in resultado.items():
+        print(f"  {chave:<42} {valor:.4f}" if isinstance(valor, float) else f"  {chave:<42} {valor}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Valida o backend ONNX de embeddings contra o fp32.")
+    parser.add_argument("--quantizacao", default="none", choices=["none", *QUANTIZACOES_ONNX])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    validar(args.quantizacao, args.k)
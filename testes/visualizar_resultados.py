@@ -2,171 +2,275 @@
 """
 Script para visualizar os resultados do experimento
 Gera gráficos comparativos para os slides
+
+Os resultados de todas as execuções estão no dataset Parquet escrito por
+avaliar_sistema.py (resultados_experimento/dataset/, particionado por execução
+e provedor). Só as colunas usadas são lidas; as agregações (percentis por
+execução e provedor, variação por pergunta face à execução anterior) são
+feitas de uma vez sobre todo o histórico e os gráficos desenhados a partir
+das tabelas agregadas. Os CSVs de execuções antigas são importados para o
+dataset na primeira utilização.
 """
 
+import ast
+
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 import sys
 
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
 # Configurar estilo
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (12, 6)
 plt.rcParams['font.size'] = 11
 
-def encontrar_arquivos_mais_recentes():
-    """Encontra os arquivos CSV mais recentes."""
-    resultado_dir = Path("resultados_experimento")
-    
-    if not resultado_dir.exists():
+PASTA_RESULTADOS = Path("resultados_experimento")
+PASTA_DATASET = PASTA_RESULTADOS / "dataset"
+PARTICOES = {
+    "llms": ["execucao", "provider"],
+    "vectorstores": ["execucao"],
+}
+COLUNAS_LLM = ["execucao", "provider", "pergunta", "tempo_total_ms", "num_citacoes",
+               "custo_estimado_usd", "tokens_entrada", "tokens_saida"]
+ETAPAS_INDEXACAO = {"extracao_s": "Extração", "chunking_s": "Chunking",
+                    "embedding_s": "Embedding", "insercao_s": "Inserção"}
+
+
+# =============================================================================
+# DATASET
+# =============================================================================
+
+def importar_csvs_antigos():
+    """Converte os CSVs por execução (formato anterior ao dataset) em partições, uma vez por execução."""
+    for nome, prefixo in (("llms", "metricas_llms_"), ("vectorstores", "metricas_vectorstores_")):
+        for csv in sorted(PASTA_RESULTADOS.glob(f"{prefixo}*.csv")):
+            execucao = csv.stem[len(prefixo):]
+            if (PASTA_DATASET / nome / f"execucao={execucao}").exists():
+                continue
+            if nome == "llms":
+                df = pd.read_csv(csv)
+                if 'citacoes_encontradas' in df:
+                    df['citacoes_encontradas'] = df['citacoes_encontradas'].map(
+                        lambda v: ast.literal_eval(v) if isinstance(v, str) else [])
+            else:
+                df = pd.read_csv(csv, index_col=0).rename_axis('vector_store').reset_index()
+            pq.write_to_dataset(pa.Table.from_pandas(df.assign(execucao=execucao), preserve_index=False),
+                                PASTA_DATASET / nome, partition_cols=PARTICOES[nome],
+                                existing_data_behavior="delete_matching")
+            print(f"📥 Importado {csv.name} para o dataset")
+
+
+def carregar(nome, colunas=None):
+    """
+    Lê o dataset `nome` com todas as execuções, só com as `colunas` pedidas
+    (as que não existirem em execuções antigas ficam vazias).
+    """
+    caminho = PASTA_DATASET / nome
+    if not caminho.exists():
+        return pd.DataFrame()
+    particionamento = ds.partitioning(pa.schema([(p, pa.string()) for p in PARTICOES[nome]]), flavor="hive")
+    base = ds.dataset(caminho, format="parquet", partitioning=particionamento)
+    # O esquema muda entre versões do avaliador: unificado a partir dos rodapés dos ficheiros
+    esquema = pa.unify_schemas([base.schema] + [f.physical_schema for f in base.get_fragments()],
+                               promote_options="permissive")
+    base = ds.dataset(caminho, format="parquet", partitioning=particionamento, schema=esquema)
+    if colunas is not None:
+        colunas = [c for c in colunas if c in esquema.names]
+    return base.to_table(columns=colunas).to_pandas()
+
+
+# =============================================================================
+# AGREGAÇÕES
+# =============================================================================
+
+def resumo_por_execucao(df_llm):
+    """Uma linha por (execução, provedor): percentis de tempo, citações, tokens e custo."""
+    grupos = df_llm.groupby(["execucao", "provider"], observed=True)
+    resumo = grupos.agg(
+        perguntas=("tempo_total_ms", "size"),
+        tempo_medio_ms=("tempo_total_ms", "mean"),
+        tempo_desvio_ms=("tempo_total_ms", "std"),
+        citacoes_medias=("num_citacoes", "mean"),
+        custo_total_usd=("custo_estimado_usd", "sum"),
+    )
+    percentis = grupos["tempo_total_ms"].quantile([0.5, 0.95]).unstack()
+    percentis.columns = ["tempo_p50_ms", "tempo_p95_ms"]
+    return resumo.join(percentis)
+
+
+def variacao_por_pergunta(df_llm):
+    """
+    Variação do tempo de cada (provedor, pergunta) face à última execução
+    anterior em que a mesma pergunta foi respondida; colunas = execuções.
+    """
+    tabela = df_llm.pivot_table(index=["provider", "pergunta"], columns="execucao",
+                                values="tempo_total_ms", aggfunc="mean", observed=True).sort_index(axis=1)
+    return tabela.ffill(axis=1).diff(axis=1).where(tabela.notna())
+
+
+# =============================================================================
+# GRÁFICOS
+# =============================================================================
+
+def criar_graficos():
+    """Cria todos os gráficos."""
+    print("📊 Gerando gráficos...")
+
+    if not PASTA_RESULTADOS.exists():
         print("❌ Diretório 'resultados_experimento' não encontrado!")
         print("Execute primeiro: python avaliar_sistema.py")
         sys.exit(1)
-    
-    csvs = list(resultado_dir.glob("*.csv"))
-    
-    if not csvs:
-        print("❌ Nenhum arquivo CSV encontrado!")
+
+    importar_csvs_antigos()
+    df_llm = carregar("llms", COLUNAS_LLM)
+    df_vs = carregar("vectorstores")
+
+    if df_llm.empty:
+        print("❌ Nenhum resultado encontrado no dataset!")
         sys.exit(1)
-    
-    # Encontrar mais recentes
-    metricas_vs = sorted(resultado_dir.glob("metricas_vectorstores_*.csv"))[-1]
-    metricas_llm = sorted(resultado_dir.glob("metricas_llms_*.csv"))[-1]
-    
-    return metricas_vs, metricas_llm
 
+    resumo = resumo_por_execucao(df_llm)
+    variacoes = variacao_por_pergunta(df_llm)
+    ultima = df_llm['execucao'].max()
+    resumo_ultima = resumo.loc[ultima]
+    print(f"📁 {df_llm['execucao'].nunique()} execuções, {len(df_llm)} respostas · última: {ultima}")
 
-def criar_graficos():
-    """Cria todos os gráficos."""
-    print("📊 Gerando gráficos...")
-    
-    metricas_vs_path, metricas_llm_path = encontrar_arquivos_mais_recentes()
-    
-    # Carregar dados
-    df_vs = pd.read_csv(metricas_vs_path, index_col=0)
-    df_llm = pd.read_csv(metricas_llm_path)
-    
     # Criar diretório para gráficos
-    graficos_dir = Path("resultados_experimento/graficos")
+    graficos_dir = PASTA_RESULTADOS / "graficos"
     graficos_dir.mkdir(exist_ok=True)
-    
+
     # ========== GRÁFICO 1: Tempo de Indexação (Vector Stores) ==========
-    plt.figure(figsize=(8, 6))
-    ax = df_vs['tempo_indexacao_s'].plot(kind='bar', color=['#1f77b4', '#ff7f0e'])
-    plt.title('Tempo de Indexação - Vector Stores', fontsize=14, fontweight='bold')
-    plt.ylabel('Tempo (segundos)')
-    plt.xlabel('Vector Store')
-    plt.xticks(rotation=0)
-    plt.grid(axis='y', alpha=0.3)
-    
-    # Adicionar valores no topo das barras
-    for i, v in enumerate(df_vs['tempo_indexacao_s']):
-        ax.text(i, v + 0.1, f'{v:.2f}s', ha='center', fontweight='bold')
-    
-    plt.tight_layout()
-    plt.savefig(graficos_dir / '1_tempo_indexacao.png', dpi=300, bbox_inches='tight')
-    print("✅ Gráfico 1: Tempo de Indexação")
-    plt.close()
-    
+    if not df_vs.empty:
+        vs_ultima = df_vs[df_vs['execucao'] == df_vs['execucao'].max()].set_index('vector_store')
+        etapas = [e for e in ETAPAS_INDEXACAO if e in vs_ultima and vs_ultima[e].notna().any()]
+        plt.figure(figsize=(8, 6))
+        if etapas:
+            # Decomposição por etapa (execuções com ingestão em pipeline; embedding e
+            # inserção sobrepõem-se, por isso a soma pode exceder o tempo de indexação)
+            topos = vs_ultima[etapas].fillna(0).sum(axis=1).clip(lower=vs_ultima['tempo_indexacao_s'])
+            ax = vs_ultima[etapas].fillna(0).rename(columns=ETAPAS_INDEXACAO).plot(
+                kind='bar', stacked=True, ax=plt.gca())
+            plt.legend(title='Etapa')
+        else:
+            topos = vs_ultima['tempo_indexacao_s']
+            ax = vs_ultima['tempo_indexacao_s'].plot(kind='bar', color=['#1f77b4', '#ff7f0e'])
+        plt.title('Tempo de Indexação - Vector Stores', fontsize=14, fontweight='bold')
+        plt.ylabel('Tempo (segundos)')
+        plt.xlabel('Vector Store')
+        plt.xticks(rotation=0)
+        plt.grid(axis='y', alpha=0.3)
+
+        # Adicionar valores no topo das barras
+        for i, (v, topo) in enumerate(zip(vs_ultima['tempo_indexacao_s'], topos)):
+            ax.text(i, topo + 0.1, f'{v:.2f}s', ha='center', fontweight='bold')
+
+        plt.tight_layout()
+        plt.savefig(graficos_dir / '1_tempo_indexacao.png', dpi=300, bbox_inches='tight')
+        print("✅ Gráfico 1: Tempo de Indexação")
+        plt.close()
+
     # ========== GRÁFICO 2: Tempo de Resposta por LLM ==========
     plt.figure(figsize=(10, 6))
-    resumo_tempo = df_llm.groupby('provider')['tempo_total_ms'].mean().sort_values()
-    ax = resumo_tempo.plot(kind='barh', color=['#2ca02c', '#d62728', '#9467bd'])
-    plt.title('Tempo Médio de Resposta por LLM', fontsize=14, fontweight='bold')
+    resumo_tempo = resumo_ultima.sort_values('tempo_p50_ms')
+    ax = resumo_tempo['tempo_p50_ms'].plot(kind='barh', color=['#2ca02c', '#d62728', '#9467bd'])
+    ax.scatter(resumo_tempo['tempo_p95_ms'], range(len(resumo_tempo)), marker='|', s=400, color='black',
+               label='p95', zorder=3)
+    plt.title('Tempo de Resposta por LLM (mediana e p95)', fontsize=14, fontweight='bold')
     plt.xlabel('Tempo (ms)')
     plt.ylabel('Provedor LLM')
+    plt.legend(loc='lower right')
     plt.grid(axis='x', alpha=0.3)
-    
+
     # Adicionar valores
-    for i, v in enumerate(resumo_tempo):
+    for i, v in enumerate(resumo_tempo['tempo_p50_ms']):
         ax.text(v + 50, i, f'{v:.0f}ms', va='center', fontweight='bold')
-    
+
     plt.tight_layout()
     plt.savefig(graficos_dir / '2_tempo_resposta_llm.png', dpi=300, bbox_inches='tight')
     print("✅ Gráfico 2: Tempo de Resposta")
     plt.close()
-    
+
     # ========== GRÁFICO 3: Qualidade das Citações ==========
     plt.figure(figsize=(10, 6))
-    citacoes = df_llm.groupby('provider')['num_citacoes'].mean().sort_values(ascending=False)
+    citacoes = resumo_ultima['citacoes_medias'].sort_values(ascending=False)
     ax = citacoes.plot(kind='bar', color=['#8c564b', '#e377c2', '#7f7f7f'])
     plt.title('Número Médio de Citações por LLM', fontsize=14, fontweight='bold')
     plt.ylabel('Número de Citações')
     plt.xlabel('Provedor LLM')
     plt.xticks(rotation=45)
     plt.grid(axis='y', alpha=0.3)
-    
+
     # Adicionar valores
     for i, v in enumerate(citacoes):
         ax.text(i, v + 0.1, f'{v:.1f}', ha='center', fontweight='bold')
-    
+
     plt.tight_layout()
     plt.savefig(graficos_dir / '3_qualidade_citacoes.png', dpi=300, bbox_inches='tight')
     print("✅ Gráfico 3: Qualidade das Citações")
     plt.close()
-    
+
     # ========== GRÁFICO 4: Custo Estimado por LLM ==========
     plt.figure(figsize=(10, 6))
-    custos = df_llm.groupby('provider')['custo_estimado_usd'].sum().sort_values()
+    custos = resumo_ultima['custo_total_usd'].sort_values()
     ax = custos.plot(kind='barh', color=['#bcbd22', '#17becf', '#ff9896'])
     plt.title('Custo Total Estimado por LLM', fontsize=14, fontweight='bold')
     plt.xlabel('Custo (USD)')
     plt.ylabel('Provedor LLM')
     plt.grid(axis='x', alpha=0.3)
-    
+
     # Adicionar valores
     for i, v in enumerate(custos):
         ax.text(v + 0.0001, i, f'${v:.4f}', va='center', fontweight='bold')
-    
+
     plt.tight_layout()
     plt.savefig(graficos_dir / '4_custo_estimado.png', dpi=300, bbox_inches='tight')
     print("✅ Gráfico 4: Custo Estimado")
     plt.close()
-    
+
     # ========== GRÁFICO 5: Comparação Geral (Radar) ==========
     # Normalizar métricas para 0-1
-    metricas_normalizadas = df_llm.groupby('provider').agg({
-        'tempo_total_ms': 'mean',
-        'num_citacoes': 'mean',
-        'custo_estimado_usd': 'sum'
-    })
-    
+    metricas_normalizadas = resumo_ultima[['tempo_medio_ms', 'citacoes_medias', 'custo_total_usd']].copy()
+
     # Inverter tempo (menor é melhor)
     metricas_normalizadas['velocidade'] = 1 - (
-        metricas_normalizadas['tempo_total_ms'] / metricas_normalizadas['tempo_total_ms'].max()
+        metricas_normalizadas['tempo_medio_ms'] / metricas_normalizadas['tempo_medio_ms'].max()
     )
-    
+
     # Normalizar citações
     metricas_normalizadas['qualidade'] = (
-        metricas_normalizadas['num_citacoes'] / metricas_normalizadas['num_citacoes'].max()
+        metricas_normalizadas['citacoes_medias'] / metricas_normalizadas['citacoes_medias'].max()
     )
-    
+
     # Inverter custo (menor é melhor)
     metricas_normalizadas['custo_beneficio'] = 1 - (
-        metricas_normalizadas['custo_estimado_usd'] / metricas_normalizadas['custo_estimado_usd'].max()
+        metricas_normalizadas['custo_total_usd'] / metricas_normalizadas['custo_total_usd'].max()
     )
-    
+
     # Criar tabela comparativa
     plt.figure(figsize=(12, 4))
-    tabela_dados = metricas_normalizadas[['velocidade', 'qualidade', 'custo_beneficio']].round(3)
+    tabela_dados = metricas_normalizadas[['velocidade', 'qualidade', 'custo_beneficio']].fillna(1.0).round(3)
     tabela_dados.columns = ['Velocidade\n(0-1)', 'Qualidade\n(0-1)', 'Custo-Benefício\n(0-1)']
-    
+
     ax = plt.subplot(111, frame_on=False)
     ax.xaxis.set_visible(False)
     ax.yaxis.set_visible(False)
-    
+
     table = pd.plotting.table(ax, tabela_dados, loc='center', cellLoc='center')
     table.auto_set_font_size(False)
     table.set_fontsize(12)
     table.scale(1, 2)
-    
+
     # Colorir células
     for (i, j), cell in table.get_celld().items():
         if i == 0:
             cell.set_facecolor('#4CAF50')
             cell.set_text_props(weight='bold', color='white')
-        else:
+        elif j >= 0:
             val = tabela_dados.iloc[i-1, j]
             if val > 0.7:
                 cell.set_facecolor('#90EE90')
@@ -174,27 +278,56 @@ def criar_graficos():
                 cell.set_facecolor('#FFE4B5')
             else:
                 cell.set_facecolor('#FFB6C1')
-    
+
     plt.title('Comparação Normalizada (0=Pior, 1=Melhor)', fontsize=14, fontweight='bold', pad=20)
     plt.tight_layout()
     plt.savefig(graficos_dir / '5_comparacao_geral.png', dpi=300, bbox_inches='tight')
     print("✅ Gráfico 5: Comparação Geral")
     plt.close()
-    
+
+    # ========== GRÁFICO 6: Evolução do Tempo de Resposta ==========
+    plt.figure(figsize=(12, 6))
+    evolucao = resumo[['tempo_p50_ms', 'tempo_p95_ms']].unstack('provider')
+    for provider in evolucao['tempo_p50_ms'].columns:
+        linha, = plt.plot(evolucao.index, evolucao['tempo_p50_ms'][provider], marker='o', label=f'{provider} (p50)')
+        plt.plot(evolucao.index, evolucao['tempo_p95_ms'][provider], linestyle='--', color=linha.get_color(),
+                 alpha=0.6, label=f'{provider} (p95)')
+    plt.title('Tempo de Resposta por Execução', fontsize=14, fontweight='bold')
+    plt.ylabel('Tempo (ms)')
+    plt.xlabel('Execução')
+    plt.xticks(rotation=45, ha='right')
+    plt.legend(fontsize=9, ncol=2)
+    plt.grid(alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(graficos_dir / '6_evolucao_tempo.png', dpi=300, bbox_inches='tight')
+    print("✅ Gráfico 6: Evolução do Tempo de Resposta")
+    plt.close()
+
+    # ========== GRÁFICO 7: Variação por Pergunta (última execução) ==========
+    variacao_ultima = variacoes[ultima].dropna() if ultima in variacoes else pd.Series(dtype=float)
+    if not variacao_ultima.empty:
+        mapa = variacao_ultima.unstack('provider')
+        mapa.index = [p if len(p) <= 60 else p[:57] + '...' for p in mapa.index]
+        plt.figure(figsize=(max(6, 2 * mapa.shape[1] + 4), max(4, 0.5 * len(mapa) + 2)))
+        sns.heatmap(mapa, annot=True, fmt='.0f', cmap='RdYlGn_r', center=0, cbar_kws={'label': 'Δ tempo (ms)'})
+        plt.title('Variação do Tempo por Pergunta vs. Execução Anterior', fontsize=14, fontweight='bold')
+        plt.xlabel('Provedor LLM')
+        plt.ylabel('')
+        plt.tight_layout()
+        plt.savefig(graficos_dir / '7_variacao_por_pergunta.png', dpi=300, bbox_inches='tight')
+        print("✅ Gráfico 7: Variação por Pergunta")
+        plt.close()
+
     # ========== TABELA RESUMO (para slides) ==========
     print("\n" + "="*70)
     print("📋 TABELA RESUMO (copie para os slides)")
     print("="*70)
-    
-    resumo_final = df_llm.groupby('provider').agg({
-        'tempo_total_ms': ['mean', 'std'],
-        'num_citacoes': 'mean',
-        'custo_estimado_usd': 'sum'
-    }).round(2)
-    
-    resumo_final.columns = ['Tempo Médio (ms)', 'Desvio Padrão', 'Citações Médias', 'Custo Total (USD)']
+
+    resumo_final = resumo_ultima[['tempo_medio_ms', 'tempo_desvio_ms', 'tempo_p95_ms',
+                                  'citacoes_medias', 'custo_total_usd']].round(2)
+    resumo_final.columns = ['Tempo Médio (ms)', 'Desvio Padrão', 'p95 (ms)', 'Citações Médias', 'Custo Total (USD)']
     print(resumo_final.to_string())
-    
+
     print("\n" + "="*70)
     print(f"✅ Gráficos salvos em: {graficos_dir}/")
     print("="*70)
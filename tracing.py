@@ -0,0 +1,257 @@
+# tracing.py
+"""
+Rastreio leve do caminho quente (spans ao estilo OpenTelemetry).
+
+Cada etapa instrumentada (busca de contexto, codificação, busca no índice,
+geração no LLM, passos da ingestão) regista um span com trace_id/span_id,
+pai, início, duração e atributos. Os spans ficam:
+  - num buffer em memória (últimos `tracing.max_spans`), usado pelo painel de
+    debug para mostrar a decomposição de cada mensagem
+  - em histogramas por nome, exportados em texto Prometheus (GET /metrics do
+    retrieval_server)
+  - opcionalmente num ficheiro JSONL (`tracing.ficheiro_jsonl`), com os nomes
+    de campos do OpenTelemetry para poderem ser importados noutras ferramentas
+
+Uso:
+    with tracing.span("rag.buscar_contexto", n_results=10) as s:
+        ...
+        s.definir(chunks=len(docs))
+
+    @tracing.rastrear("embedding.codificar")
+    def codificar(...): ...
+"""
+
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config_loader import carregar_config
+
+# Limites (segundos) dos histogramas exportados para o Prometheus
+LIMITES_HISTOGRAMA_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_span_atual = contextvars.ContextVar("span_atual", default=None)
+_lock = threading.Lock()
+_spans = deque(maxlen=5000)
+_histogramas = {}   # nome -> {"contagens": [...], "soma": s, "total": n, "erros": e}
+_ficheiro = None    # (caminho, handle) do export JSONL
+
+
+def _config_tracing():
+    config = carregar_config() or {}
+    return config.get('tracing', {})
+
+
+class Span:
+    """Uma etapa cronometrada. Termina uma única vez (terminar é idempotente)."""
+
+    def __init__(self, nome, pai=None, atributos=None):
+        self.nome = nome
+        self.trace_id = pai.trace_id if pai else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.pai_id = pai.span_id if pai else None
+        self.atributos = dict(atributos or {})
+        self.inicio_ns = time.time_ns()
+        self._inicio = time.perf_counter()
+        self.duracao_ms = None
+        self.erro = None
+
+    def definir(self, **atributos):
+        self.atributos.update(atributos)
+
+    def terminar(self, erro=None):
+        if self.duracao_ms is not None:
+            return
+        self.duracao_ms = (time.perf_counter() - self._inicio) * 1000
+        if erro is not None:
+            self.erro = f"{type(erro).__name__}: {erro}" if isinstance(erro, BaseException) else str(erro)
+        _registar(self)
+
+    def para_dict(self):
+        """Representação com os nomes de campos do OpenTelemetry (export JSONL)."""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.pai_id,
+            "name": self.nome,
+            "start_time_unix_nano": self.inicio_ns,
+            "end_time_unix_nano": self.inicio_ns + int((self.duracao_ms or 0) * 1e6),
+            "attributes": self.atributos,
+            "status": {"code": "ERROR", "message": self.erro} if self.erro else {"code": "OK"},
+        }
+
+
+class _SpanInativo:
+    """Devolvido quando o rastreio está desligado: aceita as mesmas chamadas e não regista nada."""
+    trace_id = span_id = pai_id = None
+
+    def __bool__(self):
+        return False
+
+    def definir(self, **atributos):
+        pass
+
+    def terminar(self, erro=None):
+        pass
+
+
+_INATIVO = _SpanInativo()
+
+
+def _registar(s):
+    cfg = _config_tracing()
+    with _lock:
+        global _spans, _ficheiro
+        max_spans = cfg.get('max_spans', 5000)
+        if _spans.maxlen != max_spans:
+            _spans = deque(_spans, maxlen=max_spans)
+        _spans.append(s)
+
+        h = _histogramas.setdefault(s.nome, {"contagens": [0] * len(LIMITES_HISTOGRAMA_S),
+                                             "soma": 0.0, "total": 0, "erros": 0})
+        segundos = s.duracao_ms / 1000
+        for i, limite in enumerate(LIMITES_HISTOGRAMA_S):
+            if segundos <= limite:
+                h["contagens"][i] += 1
+        h["soma"] += segundos
+        h["total"] += 1
+        h["erros"] += s.erro is not None
+
+        caminho = cfg.get('ficheiro_jsonl')
+        if caminho:
+            if _ficheiro is None or _ficheiro[0] != caminho:
+                if _ficheiro is not None:
+                    _ficheiro[1].close()
+                os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+                _ficheiro = (caminho, open(caminho, 'a', encoding='utf-8', buffering=1))
+            _ficheiro[1].write(json.dumps(s.para_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+def atual():
+    """Span ativo no contexto atual (um span inativo, falso em contexto booleano, se não houver)."""
+    return _span_atual.get() or _INATIVO
+
+
+def iniciar(nome, pai=None, **atributos):
+    """
+    Abre um span sem o tornar o span atual; quem o cria chama terminar().
+    Útil quando a etapa atravessa várias chamadas (ex.: consumo de um stream).
+    """
+    if not _config_tracing().get('ativo', True):
+        return _INATIVO
+    return Span(nome, pai or _span_atual.get(), atributos)
+
+
+@contextmanager
+def span(nome, pai=None, **atributos):
+    """Span filho do span atual (ou de `pai`), ativo durante o bloco."""
+    s = iniciar(nome, pai, **atributos)
+    if s is _INATIVO:
+        yield s
+        return
+    token = _span_atual.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.terminar(erro=e)
+        raise
+    finally:
+        _span_atual.reset(token)
+        s.terminar()
+
+
+def rastrear(nome):
+    """Decorador: cada chamada da função é um span `nome`."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with span(nome):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def propagar(funcao):
+    """Envolve `funcao` para correr noutra thread como filha do span atual."""
+    pai = _span_atual.get()
+
+    def executar(*args, **kwargs):
+        token = _span_atual.set(pai)
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            _span_atual.reset(token)
+    return executar
+
+
+# ---------- consulta e export ----------
+def spans_do_trace(trace_id):
+    """Spans terminados de um trace, por ordem de início."""
+    with _lock:
+        spans = [s for s in _spans if s.trace_id == trace_id]
+    return sorted(spans, key=lambda s: s.inicio_ns)
+
+
+def decomposicao(trace_id, largura=40):
+    """
+    Decomposição do trace em texto, estilo flame graph: uma linha por span,
+    indentada pela profundidade, com uma barra na posição e duração relativas.
+    """
+    spans = spans_do_trace(trace_id)
+    if not spans:
+        return ""
+    inicio = min(s.inicio_ns for s in spans)
+    fim = max(s.inicio_ns + s.duracao_ms * 1e6 for s in spans)
+    total_ns = max(fim - inicio, 1)
+    por_id = {s.span_id: s for s in spans}
+
+    def profundidade(s):
+        p = 0
+        while s.pai_id in por_id:
+            s, p = por_id[s.pai_id], p + 1
+        return p
+
+    linhas = []
+    for s in spans:
+        desvio = int((s.inicio_ns - inicio) / total_ns * largura)
+        tamanho = max(1, round(s.duracao_ms * 1e6 / total_ns * largura))
+        barra = ("·" * desvio + "█" * tamanho).ljust(largura, "·")[:largura]
+        nome = ("  " * profundidade(s) + s.nome)[:38]
+        linhas.append(f"{nome:<38} {barra} {s.duracao_ms:9.1f} ms{'  ❌' if s.erro else ''}")
+    return "\n".join(linhas)
+
+
+def resumo():
+    """Contagem, duração média e erros por nome de span (desde o arranque do processo)."""
+    with _lock:
+        return {
+            nome: {"contagem": h["total"], "media_ms": h["soma"] / h["total"] * 1000, "erros": h["erros"]}
+            for nome, h in sorted(_histogramas.items()) if h["total"]
+        }
+
+
+def texto_prometheus():
+    """Histogramas de duração por span no formato de exposição de texto do Prometheus."""
+    linhas = [
+        "# HELP rag_span_duracao_segundos Duração das etapas do pipeline RAG.",
+        "# TYPE rag_span_duracao_segundos histogram",
+    ]
+    erros = ["# HELP rag_span_erros_total Etapas terminadas com erro.",
+             "# TYPE rag_span_erros_total counter"]
+    with _lock:
+        histogramas = {nome: dict(h, contagens=list(h["contagens"])) for nome, h in _histogramas.items()}
+    for nome, h in sorted(histogramas.items()):
+        etiqueta = nome.replace("\\", "\\\\").replace('"', '\\"')
+        for limite, contagem in zip(LIMITES_HISTOGRAMA_S, h["contagens"]):
+            linhas.append(f'rag_span_duracao_segundos_bucket{{span="{etiqueta}",le="{limite}"}} {contagem}')
+        linhas.append(f'rag_span_duracao_segundos_bucket{{span="{etiqueta}",le="+Inf"}} {h["total"]}')
+        linhas.append(f'rag_span_duracao_segundos_sum{{span="{etiqueta}"}} {h["soma"]:.6f}')
+        linhas.append(f'rag_span_duracao_segundos_count{{span="{etiqueta}"}} {h["total"]}')
+        erros.append(f'rag_span_erros_total{{span="{etiqueta}"}} {h["erros"]}')
+    return "\n".join(linhas + erros) + "\n"
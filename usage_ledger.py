@@ -0,0 +1,71 @@
+# usage_ledger.py
+"""
+Contabilidade de tokens e custo a partir do uso reportado pelos provedores.
+
+Os preços (USD por 1M de tokens) vêm de `llm_providers.<provedor>.precos`
+no config.yaml: {entrada, saida, cache, cache_escrita}. Os tokens servidos
+pela cache do provedor são cobrados ao preço `cache` (ou `entrada`, se não
+estiver definido) e os escritos na cache (Claude) a `cache_escrita` (por
+omissão 1,25 × `entrada`). Todos contam também em `tokens_entrada`.
+Provedores sem `precos` (mock, stub, modelos locais) custam 0.
+"""
+
+CAMPOS_TOKENS = ("tokens_entrada", "tokens_saida", "tokens_cache", "tokens_cache_escrita")
+
+FATOR_CACHE_ESCRITA = 1.25
+
+
+def custo_usd(tokens_entrada, tokens_saida, tokens_cache, model_config, tokens_cache_escrita=0):
+    precos = (model_config or {}).get('precos') or {}
+    entrada = precos.get('entrada', 0.0)
+    cache = precos.get('cache', entrada)
+    cache_escrita = precos.get('cache_escrita', entrada * FATOR_CACHE_ESCRITA)
+    return ((tokens_entrada - tokens_cache - tokens_cache_escrita) * entrada
+            + tokens_cache * cache
+            + tokens_cache_escrita * cache_escrita
+            + tokens_saida * precos.get('saida', 0.0)) / 1_000_000
+
+
+def registo_uso(resultado, provider_name, model_config):
+    """Resumo de um ResultadoLLM para guardar junto da mensagem (campo "uso")."""
+    return {
+        "provedor": provider_name,
+        "modelo": resultado.modelo,
+        "tokens_entrada": resultado.tokens_entrada,
+        "tokens_saida": resultado.tokens_saida,
+        "tokens_cache": resultado.tokens_cache,
+        "tokens_cache_escrita": resultado.tokens_cache_escrita,
+        "custo_usd": custo_usd(resultado.tokens_entrada, resultado.tokens_saida,
+                               resultado.tokens_cache, model_config, resultado.tokens_cache_escrita),
+        "latencia_ms": round(resultado.latencia_ms, 1),
+        "estimado": resultado.estimado,
+    }
+
+
+def totalizar(registos):
+    """Soma tokens e custo de uma lista de registos de uso (ignora entradas vazias)."""
+    total = {campo: 0 for campo in CAMPOS_TOKENS}
+    total.update(custo_usd=0.0, chamadas=0)
+    for registo in registos:
+        if not registo:
+            continue
+        for campo in CAMPOS_TOKENS:
+            total[campo] += registo.get(campo, 0)
+        total["custo_usd"] += registo.get("custo_usd", 0.0)
+        total["chamadas"] += 1
+    return total
+
+
+def totalizar_mensagens(mensagens):
+    """Totais de uso das respostas de uma conversa."""
+    return totalizar(m.get("uso") for m in mensagens if m.get("role") == "assistant")
+
+
+def atualizar_total(total, adicionadas=(), removidas=()):
+    """
+    Total de totalizar_mensagens atualizado só com as mensagens adicionadas e
+    removidas (uma edição é as duas coisas): custo proporcional à alteração.
+    """
+    base = {**totalizar([]), **total}
+    mais, menos = totalizar_mensagens(adicionadas), totalizar_mensagens(removidas)
+    return {campo: base[campo] + mais[campo] - menos[campo] for campo in base}
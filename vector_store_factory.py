@@ -1,28 +1,55 @@
 # vector_store_factory.py
 
-from vector_stores.chroma_store import ChromaDBStore
-from vector_stores.faiss_store import FAISSStore
-from config_loader import carregar_config
-import sentence_transformers
+from config_loader import obter_configuracao
+from resource_registry import importar_modulo
 
 def get_vector_store(config):
-    cfg = carregar_config()                 # new
-    emb_model = cfg['embedding']['model']   # new
-    device    = cfg['embedding'].get('device', 'cpu')
+    cfg_embedding = obter_configuracao().embedding
+    emb_model = cfg_embedding.model
+    device    = cfg_embedding.device
 
+    # Os backends (chromadb, faiss) só são importados quando escolhidos
     store_type = config.get('type')
     if store_type == "chroma":
+        ChromaDBStore = importar_modulo("vector_stores.chroma_store").ChromaDBStore
         return ChromaDBStore(
             path=config.get('path'),
             collection_name=config.get('collection_name'),
-            embedding_model=emb_model,     # new
-            device=device                  # new
+            embedding_model=emb_model,
+            device=device,
+            servidor=config.get('servidor')
         )
     elif store_type == "faiss":
+        FAISSStore = importar_modulo("vector_stores.faiss_store").FAISSStore
         return FAISSStore(
             path=config.get('path'),
-            embedding_model=emb_model,     # new
-            device=device                  # new
+            embedding_model=emb_model,
+            device=device,
+            quantizacao=config.get('quantizacao', 'flat'),
+            rescoring=config.get('rescoring', False),
+            candidatos_rescoring=config.get('candidatos_rescoring', 4),
+            compactar_acima_de=config.get('compactar_acima_de', 0.25)
+        )
+    elif store_type == "faiss_sharded":
+        FAISSShardedStore = importar_modulo("vector_stores.faiss_sharded_store").FAISSShardedStore
+        return FAISSShardedStore(
+            path=config.get('path'),
+            embedding_model=emb_model,
+            device=device,
+            tamanho_shard=config.get('tamanho_shard', 200_000),
+            threads_busca=config.get('threads_busca', 4),
+            quantizacao=config.get('quantizacao', 'flat'),
+            rescoring=config.get('rescoring', False),
+            candidatos_rescoring=config.get('candidatos_rescoring', 4),
+            compactar_acima_de=config.get('compactar_acima_de', 0.25)
+        )
+    elif store_type == "remote":
+        RemoteVectorStore = importar_modulo("vector_stores.remote_store").RemoteVectorStore
+        return RemoteVectorStore(
+            url=config.get('url', 'http://127.0.0.1:8765'),
+            vector_store=config.get('vector_store'),
+            workspace=config.get('workspace'),
+            timeout_s=config.get('timeout_s', 30)
         )
     else:
-        raise ValueError(f"Unknown vector store: {store_type}")
\ No newline at end of file
+        raise ValueError(f"Unknown vector store: {store_type}")
@@ -1,12 +1,25 @@
 # vector_stores/base.py
 
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import tracing
+
+# Operações de cada backend registadas como spans "<Classe>.<operação>"
+OPERACOES_RASTREADAS = ("adicionar", "adicionar_vetores", "buscar", "buscar_lote",
+                        "buscar_vetores", "remover", "compactar")
 
 class VectorStore(ABC):
     """
     Classe base abstrata para provedores de Vector Store.
     Define a interface que todos os provedores devem implementar.
     """
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for nome in OPERACOES_RASTREADAS:
+            if nome in cls.__dict__:
+                setattr(cls, nome, tracing.rastrear(f"{cls.__name__}.{nome}")(cls.__dict__[nome]))
+
     @abstractmethod
     def carregar_ou_criar(self, chunks, metadados):
         """
@@ -35,4 +48,65 @@ class VectorStore(ABC):
         Returns:
             dict: Um dicionário contendo os documentos e metadados encontrados.
         """
+        pass
+
+    def buscar_lote(self, query_texts, n_results, where=None):
+        """
+        Várias buscas de uma vez. Os backends que conseguem codificar e
+        pesquisar as consultas num só lote substituem esta implementação.
+
+        Returns:
+            dict: Como em buscar(), com uma lista de documentos/metadados por consulta.
+        """
+        resultados = [self.buscar(q, n_results, where=where) for q in query_texts]
+        return {
+            "documents": [r["documents"][0] for r in resultados],
+            "metadatas": [r["metadatas"][0] for r in resultados],
+        }
+
+    def salvar(self):
+        """
+        Escreve no disco os lotes adicionados com adicionar_vetores(..., salvar=False).
+        Os backends que persistem cada inserção não fazem nada.
+        """
+
+    def descartar(self):
+        """Desfaz os lotes adicionados com salvar=False que ainda não foram salvos."""
+
+    @contextmanager
+    def insercao_em_lotes(self):
+        """
+        Ingestão em vários lotes (adicionar_vetores com salvar=False) com uma
+        só escrita no fim do bloco. Se o bloco falhar, os lotes são descartados;
+        em qualquer caso, nada fica por salvar (nem locks presos) depois dele.
+        """
+        try:
+            yield self
+        except BaseException:
+            self.descartar()
+            raise
+        self.salvar()
+
+    @abstractmethod
+    def remover(self, where):
+        """
+        Remove os chunks cujos metadados correspondem ao filtro. Os chunks
+        removidos deixam de aparecer nas buscas imediatamente.
+
+        Args:
+            where (dict): Filtro de metadados (ex.: {"fonte": "artigo.pdf"}).
+
+        Returns:
+            int: O número de chunks removidos.
+        """
+        pass
+
+    @abstractmethod
+    def compactar(self):
+        """
+        Recupera o espaço ocupado por chunks removidos.
+
+        Returns:
+            int: O número de chunks eliminados fisicamente.
+        """
         pass
\ No newline at end of file
@@ -1,16 +1,50 @@
 # vector_stores/chroma_store.py
 
+import uuid
+from urllib.parse import urlparse
 import streamlit as st
 import chromadb
 from chromadb.utils import embedding_functions
+from embedding_engine import obter_motor
 from .base import VectorStore
 
+
+class SharedSentenceTransformerEF(embedding_functions.SentenceTransformerEmbeddingFunction):
+    """
+    Mesma função de embedding (e mesma configuração persistida) que a
+    SentenceTransformerEmbeddingFunction do Chroma, mas codificando pelo
+    motor partilhado (lotes por comprimento, threads configuradas).
+    """
+    def __init__(self, model_name: str, device: str = "cpu", normalize_embeddings: bool = False):
+        self.model_name = model_name
+        self.device = device
+        self.normalize_embeddings = normalize_embeddings
+        self.kwargs = {}
+        self.motor = obter_motor(model_name, device)
+        self._model = self.motor.encoder
+
+    def __call__(self, input):
+        embs = self.motor.codificar(list(input), normalizar=self.normalize_embeddings)
+        return [emb for emb in embs]
+
+
 class ChromaDBStore(VectorStore):
-    def __init__(self, path: str, collection_name: str, embedding_model: str, device: str = "cpu"):
-        self.ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model, device=device
-        )
-        self.client = chromadb.PersistentClient(path=path)
+    """
+    Coleção do ChromaDB. Sem `servidor`, o Chroma corre embutido no processo
+    (PersistentClient) e o diretório só pode ser aberto por esse processo; com
+    `servidor` (ex.: http://127.0.0.1:8000, de `chroma run --path <path>`), a
+    app, o worker de ingestão e o serviço de recuperação ligam-se ao mesmo
+    servidor (HttpClient).
+    """
+    def __init__(self, path: str, collection_name: str, embedding_model: str, device: str = "cpu",
+                 servidor: str = None):
+        self.ef = SharedSentenceTransformerEF(model_name=embedding_model, device=device)
+        if servidor:
+            url = urlparse(servidor)
+            self.client = chromadb.HttpClient(host=url.hostname, port=url.port or 8000,
+                                              ssl=url.scheme == "https")
+        else:
+            self.client = chromadb.PersistentClient(path=path)
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
             embedding_function=self.ef
@@ -25,14 +59,66 @@ class ChromaDBStore(VectorStore):
     def adicionar(self, chunks, metadados=None):
         if not chunks:
             return
-        count = self.collection.count()
-        ids = [f"chunk_{count + i}" for i in range(len(chunks))]
+        # Ids únicos: com remoções, count() deixa de servir de próximo id
+        ids = [f"chunk_{uuid.uuid4().hex}" for _ in chunks]
         self.collection.add(documents=chunks, metadatas=metadados, ids=ids)
 
+    def adicionar_vetores(self, embs, chunks, metadados=None, salvar=True):
+        """
+        Adiciona chunks já codificados (respeitando o tamanho máximo de lote do Chroma).
+        O Chroma persiste cada add; `salvar` existe pela compatibilidade com o FAISSStore.
+        """
+        lote = self.client.get_max_batch_size()
+        for inicio in range(0, len(chunks), lote):
+            fim = inicio + lote
+            self.collection.add(
+                ids=[f"chunk_{uuid.uuid4().hex}" for _ in chunks[inicio:fim]],
+                embeddings=embs[inicio:fim],
+                documents=chunks[inicio:fim],
+                metadatas=metadados[inicio:fim] if metadados else None
+            )
+
     def buscar(self, query_texts, n_results=5, where=None):
         return self.collection.query(
             query_texts=[query_texts],
             n_results=n_results,
             where=where,
             include=["documents", "metadatas"]
-        )
\ No newline at end of file
+        )
+
+    def buscar_lote(self, query_texts, n_results=5, where=None):
+        return self.collection.query(
+            query_texts=list(query_texts),
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas"]
+        )
+
+    def buscar_vetores(self, embs, n_results):
+        """
+        Busca com consultas já codificadas (uma linha por consulta).
+
+        Returns:
+            list: Para cada consulta, lista de (score, texto, metadados); score = -distância
+        """
+        resultados = self.collection.query(
+            query_embeddings=embs,
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [(-float(d), texto, meta) for d, texto, meta in zip(distancias, textos, metas)]
+            for distancias, textos, metas in zip(resultados["distances"], resultados["documents"], resultados["metadatas"])
+        ]
+
+    def remover(self, where):
+        if not where:
+            raise ValueError("remover() requer um filtro 'where'.")
+        ids = self.collection.get(where=where, include=[])["ids"]
+        if ids:
+            self.collection.delete(ids=ids)
+        return len(ids)
+
+    def compactar(self):
+        # O Chroma elimina os registos apagados e compacta o seu log sozinho
+        return 0
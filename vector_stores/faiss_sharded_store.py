@@ -0,0 +1,167 @@
+# vector_stores/faiss_sharded_store.py
+
+import json
+import os
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from embedding_engine import obter_motor
+from file_lock import LockFicheiro
+from .base import VectorStore
+from .faiss_store import FAISSStore, formatar_resultados
+
+MANIFESTO = "manifesto.json"
+
+
+class FAISSShardedStore(VectorStore):
+    """
+    Biblioteca repartida por vários índices FAISS (shards) num diretório.
+
+    - Cada shard é um FAISSStore persistido de forma independente
+      (shard_0000.pkl, shard_0001.pkl, ...), com as mesmas opções de quantização.
+    - Novos chunks vão para o shard atual; quando este atinge `tamanho_shard`,
+      abre-se outro. Um lote (um documento) nunca é dividido entre shards.
+    - A busca codifica a consulta uma vez, pesquisa todos os shards em
+      paralelo (o FAISS liberta o GIL) e junta os top-k com um heap.
+    - Remoções e compactações correm por shard: reconstruir um shard não
+      bloqueia buscas nos outros.
+    """
+
+    def __init__(self, path: str, embedding_model: str, device: str = "cpu",
+                 tamanho_shard: int = 200_000, threads_busca: int = 4, **opcoes_shard):
+        self.path = path
+        self.embedding_model = embedding_model
+        self.device = device
+        self.tamanho_shard = tamanho_shard
+        self.opcoes_shard = opcoes_shard
+        self.motor = obter_motor(embedding_model, device)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads_busca), thread_name_prefix="faiss-shard")
+        self._shards = {}        # nome do ficheiro -> FAISSStore
+        self._nomes = []
+        self._mtime_manifesto = None
+        self._por_salvar = set()   # shards com lotes adicionados com salvar=False
+        os.makedirs(path, exist_ok=True)
+        # Abrir um shard relê e grava o manifesto: com lock entre processos
+        self._lock_manifesto = LockFicheiro(self._caminho_manifesto())
+        self._recarregar_manifesto()
+
+    # ---------- manifesto ----------
+    def _caminho_manifesto(self):
+        return os.path.join(self.path, MANIFESTO)
+
+    def _recarregar_manifesto(self):
+        """Acompanha shards criados por outro processo (ex.: o worker de ingestão)."""
+        caminho = self._caminho_manifesto()
+        if not os.path.exists(caminho):
+            return
+        mtime = os.path.getmtime(caminho)
+        if mtime == self._mtime_manifesto:
+            return
+        with open(caminho, "r", encoding="utf-8") as f:
+            self._nomes = json.load(f)["shards"]
+        self._mtime_manifesto = mtime
+
+    def _salvar_manifesto(self):
+        tmp = f"{self._caminho_manifesto()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"shards": self._nomes, "tamanho_shard": self.tamanho_shard}, f, indent=2)
+        os.replace(tmp, self._caminho_manifesto())
+        self._mtime_manifesto = os.path.getmtime(self._caminho_manifesto())
+
+    def _shard(self, nome):
+        if nome not in self._shards:
+            self._shards[nome] = FAISSStore(os.path.join(self.path, nome), self.embedding_model,
+                                            self.device, **self.opcoes_shard)
+        return self._shards[nome]
+
+    def _todos_shards(self):
+        with self._lock:
+            self._recarregar_manifesto()
+            return [self._shard(nome) for nome in self._nomes]
+
+    def _shard_para_escrita(self):
+        """Shard atual, ou um novo se o atual já atingiu o tamanho máximo."""
+        with self._lock_manifesto, self._lock:
+            self._recarregar_manifesto()
+            if self._nomes:
+                atual = self._shard(self._nomes[-1])
+                if atual.index is None or atual.index.ntotal < self.tamanho_shard:
+                    return atual
+            self._nomes.append(f"shard_{len(self._nomes):04d}.pkl")
+            self._salvar_manifesto()
+            return self._shard(self._nomes[-1])
+
+    # ---------- interface ----------
+    def carregar_ou_criar(self, chunks=None, metadados=None):
+        """ABC hook: load or create index."""
+        if chunks:
+            self.adicionar(chunks, metadados)
+
+    def adicionar(self, chunks, metadados=None):
+        if not chunks:
+            return
+        self.adicionar_vetores(self.motor.codificar(chunks, normalizar=True), chunks, metadados)
+
+    def adicionar_vetores(self, embs, chunks, metadados=None, salvar=True):
+        """Adiciona chunks já codificados ao shard atual (salvar=False: ver FAISSStore)."""
+        shard = self._shard_para_escrita()
+        shard.adicionar_vetores(embs, chunks, metadados, salvar=salvar)
+        if not salvar:
+            with self._lock:
+                self._por_salvar.add(shard)
+
+    def salvar(self):
+        with self._lock:
+            shards, self._por_salvar = self._por_salvar, set()
+        for shard in shards:
+            shard.salvar()
+
+    def descartar(self):
+        with self._lock:
+            shards, self._por_salvar = self._por_salvar, set()
+        for shard in shards:
+            shard.descartar()
+
+    def buscar_vetores(self, embs, n_results):
+        """Busca em todos os shards em paralelo e junta os melhores n_results por consulta."""
+        shards = self._todos_shards()
+        if not shards:
+            return [[] for _ in range(len(embs))]
+        parciais = list(self._executor.map(tracing.propagar(lambda s: s.buscar_vetores(embs, n_results)), shards))
+        return [
+            heapq.nlargest(n_results, (hit for por_shard in parciais for hit in por_shard[q]),
+                           key=lambda hit: hit[0])
+            for q in range(len(embs))
+        ]
+
+    def buscar(self, query_texts, n_results=5, where=None):
+        return self.buscar_lote([query_texts], n_results, where)
+
+    def buscar_lote(self, query_texts, n_results=5, where=None):
+        embs = self.motor.codificar(list(query_texts), normalizar=True)
+        return formatar_resultados(self.buscar_vetores(embs, n_results), where)
+
+    def remover(self, where):
+        return sum(shard.remover(where) for shard in self._todos_shards())
+
+    def compactar(self):
+        """Compacta um shard de cada vez; os restantes continuam disponíveis."""
+        return sum(shard.compactar() for shard in self._todos_shards())
+
+    # ---------- diagnóstico ----------
+    def estatisticas(self):
+        por_shard = [shard.estatisticas() for shard in self._todos_shards()]
+        return {
+            "num_shards": len(por_shard),
+            "num_vetores": sum(e["num_vetores"] for e in por_shard),
+            "removidos": sum(e["removidos"] for e in por_shard),
+            "quantizacao": self.opcoes_shard.get("quantizacao", "flat"),
+            "bytes_por_vetor": max((e["bytes_por_vetor"] for e in por_shard), default=0),
+            "memoria_indice_mb": sum(e["memoria_indice_mb"] for e in por_shard),
+            "memoria_textos_mb": sum(e["memoria_textos_mb"] for e in por_shard),
+            "disco_originais_mb": sum(e["disco_originais_mb"] for e in por_shard),
+            "shards": por_shard,
+        }
@@ -2,28 +2,131 @@
 
 import os
 import pickle
-import numpy as np
+import threading
 import faiss
-from sentence_transformers import SentenceTransformer
+import numpy as np
+import tracing
+from file_lock import LockFicheiro
+from embedding_engine import obter_motor
 from .base import VectorStore   # delete if no ABC
 
+# Armazenamento dos vetores no índice:
+#   flat - float32 (3 KB por chunk de 768 dims)
+#   fp16 - meia precisão (metade da memória, perda de recall desprezável)
+#   int8 - 1 byte por dimensão (um quarto da memória; requer treino, ver TREINO_MINIMO)
+QUANTIZACOES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Os limites por dimensão do int8 só são fiáveis com muitos vetores de treino
+# (com os poucos chunks de um documento o recall colapsa): até este número de
+# vetores o índice fica em float32 exato; ao atingi-lo é treinado com todos
+TREINO_MINIMO = 1000
+
+
+def criar_indice(dim, quantizacao="flat"):
+    """Índice de produto interno (cosseno, com vetores normalizados) no formato pedido."""
+    if quantizacao == "flat":
+        return faiss.IndexFlatIP(dim)
+    if quantizacao not in QUANTIZACOES:
+        raise ValueError(f"Unknown FAISS quantization: {quantizacao}")
+    return faiss.IndexScalarQuantizer(dim, QUANTIZACOES[quantizacao], faiss.METRIC_INNER_PRODUCT)
+
+
+def corresponde(meta, where):
+    """Filtro de metadados estilo Chroma: igualdade, {"$in": [...]} e {"$and": [...]}."""
+    for chave, valor in where.items():
+        if chave == "$and":
+            if not all(corresponde(meta, w) for w in valor):
+                return False
+        elif isinstance(valor, dict) and "$in" in valor:
+            if meta.get(chave) not in valor["$in"]:
+                return False
+        elif meta.get(chave) != valor:
+            return False
+    return True
+
+
+@tracing.rastrear("faiss.formatar_resultados")
+def formatar_resultados(hits_por_consulta, where=None):
+    """Converte [(score, texto, meta), ...] por consulta no formato de resposta do Chroma."""
+    documentos, metadados = [], []
+    for hits in hits_por_consulta:
+        # crude post-filter if where clause given
+        if where and 'fonte' in where:
+            hits = [h for h in hits if h[2].get('fonte') == where['fonte']]
+        documentos.append([texto for _, texto, _ in hits])
+        metadados.append([meta for _, _, meta in hits])
+    return {"documents": documentos, "metadatas": metadados}
+
+
+def reordenar_exato(vetores, consulta, candidatos, k):
+    """
+    Re-score dos candidatos do índice quantizado com os vetores float32 originais.
+
+    Args:
+        vetores: Matriz (ou memmap) float32 com todos os vetores, por id
+        consulta: Vetor da consulta (dim,)
+        candidatos: Ids devolvidos pelo índice (-1 = vazio)
+        k: Número de resultados
+
+    Returns:
+        tuple: (scores, ids) dos k melhores, por ordem decrescente
+    """
+    ids = np.sort(candidatos[candidatos != -1])   # leitura ordenada do memmap
+    if ids.size == 0:
+        return np.empty(0, dtype=np.float32), ids
+    scores = np.asarray(vetores[ids]) @ consulta
+    melhores = np.argsort(-scores)[:k]
+    return scores[melhores], ids[melhores]
+
+
 class FAISSStore(VectorStore):
-    def __init__(self, path: str, embedding_model: str, device: str = "cpu"):
+    def __init__(self, path: str, embedding_model: str, device: str = "cpu",
+                 quantizacao: str = "flat", rescoring: bool = False, candidatos_rescoring: int = 4,
+                 compactar_acima_de: float = 0.25):
         self.path = path
-        self.encoder = SentenceTransformer(embedding_model, device=device)
-        self.dim = self.encoder.get_sentence_embedding_dimension()
+        self.motor = obter_motor(embedding_model, device)  # partilhado no processo
+        self.dim = self.motor.dimensao()
+        self.quantizacao = quantizacao
+        self._rescoring_pedido = rescoring
+        self.rescoring = rescoring and quantizacao != "flat"
+        self.candidatos_rescoring = max(1, candidatos_rescoring)
+        # Vetores float32 originais (só com quantização): lidos do disco por
+        # memmap, apenas as linhas dos candidatos a re-score
+        self.path_vetores = f"{path}.f32"
+        # Remoções: os ids ficam marcados (tombstones) e deixam de aparecer nas
+        # buscas de imediato; o espaço é recuperado em compactar(), lançada em
+        # segundo plano quando os removidos passam desta fração do índice
+        self.compactar_acima_de = compactar_acima_de
+        self.removidos = set()
+        self._seletor = None
+        self._lock = threading.RLock()
+        # Entre processos (app, worker de ingestão, serviço): quem altera o
+        # índice relê, altera e grava com este lock, sempre antes de self._lock
+        self._lock_ficheiro = LockFicheiro(path)
+        self._por_salvar = False   # lotes adicionados com salvar=False
+        self._compactacao = None   # thread de compactação em curso
         self.index = None
         self.texts = []
         self.metadatas = []
+        self._mtime = None   # mtime do ficheiro carregado/salvo por este processo
         if os.path.exists(path):
             self._load()
 
     # ---------- persistence ----------
     def _save(self):
-        with open(self.path, "wb") as f:
+        # Escrita atómica: o worker de ingestão e a app podem ler o mesmo ficheiro
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
             pickle.dump({"index": faiss.serialize_index(self.index),
                          "texts": self.texts,
-                         "metadatas": self.metadatas}, f)
+                         "metadatas": self.metadatas,
+                         "quantizacao": self.quantizacao,
+                         "removidos": sorted(self.removidos)}, f)
+        os.replace(tmp, self.path)
+        self._mtime = os.path.getmtime(self.path)
 
     def _load(self):
         with open(self.path, "rb") as f:
@@ -31,6 +134,26 @@ class FAISSStore(VectorStore):
             self.index = faiss.deserialize_index(data["index"])
             self.texts = data["texts"]
             self.metadatas = data["metadatas"]
+            # Um índice existente mantém o formato com que foi criado
+            self.quantizacao = data.get("quantizacao", "flat")
+            self.removidos = set(data.get("removidos", []))
+            self._seletor = None
+        self.rescoring = self._rescoring_pedido and self.quantizacao != "flat"
+        self._mtime = os.path.getmtime(self.path)
+
+    def _recarregar_se_alterado(self):
+        """Relê o índice se outro processo (ex.: o worker de ingestão) o atualizou."""
+        if os.path.exists(self.path) and os.path.getmtime(self.path) != self._mtime:
+            self._load()
+
+    def _vetores_originais(self):
+        """Memmap dos vetores float32 (uma linha por id do índice), ou None."""
+        if not os.path.exists(self.path_vetores) or self.index is None:
+            return None
+        n = min(self.index.ntotal, os.path.getsize(self.path_vetores) // (4 * self.dim))
+        if n < self.index.ntotal:
+            return None  # ficheiro incompleto (índice anterior ao armazenamento dos originais)
+        return np.memmap(self.path_vetores, dtype=np.float32, mode="r", shape=(n, self.dim))
 
     def carregar_ou_criar(self, chunks=None, metadados=None):
         """ABC hook: load or create index."""
@@ -42,25 +165,248 @@ class FAISSStore(VectorStore):
     def adicionar(self, chunks, metadados=None):
         if not chunks:
             return
-        embs = self.encoder.encode(chunks, normalize_embeddings=True)
-        if self.index is None:
-            self.index = faiss.IndexFlatIP(self.dim)  # cosine similarity
-        self.index.add(np.array(embs, dtype=np.float32))
-        self.texts.extend(chunks)
-        self.metadatas.extend(metadados or [{} for _ in chunks])
-        self._save()
+        self.adicionar_vetores(self.motor.codificar(chunks, normalizar=True), chunks, metadados)
+
+    def adicionar_vetores(self, embs, chunks, metadados=None, salvar=True):
+        """
+        Adiciona chunks já codificados (float32, normalizados, uma linha por chunk).
+        Com salvar=False o índice só é escrito no disco em salvar(): numa
+        ingestão em vários lotes evita reescrever o pickle inteiro a cada lote.
+        O lock do ficheiro fica com este processo até lá, para outro processo
+        não gravar entretanto uma versão sem estes lotes.
+        """
+        with self._lock_ficheiro, self._lock:
+            self._recarregar_se_alterado()
+            if self.index is None:
+                self.index = criar_indice(self.dim, self.quantizacao)
+                if not self.index.is_trained:
+                    self.index = faiss.IndexFlatIP(self.dim)   # provisório, ver TREINO_MINIMO
+            if self.quantizacao != "flat":
+                self._acrescentar_originais(embs)
+            self.index.add(embs)
+            self._treinar_se_necessario()
+            self.texts.extend(chunks)
+            self.metadatas.extend(metadados or [{} for _ in chunks])
+            if salvar:
+                self._save()
+            elif not self._por_salvar:
+                self._lock_ficheiro.adquirir()
+                self._por_salvar = True
+
+    def salvar(self):
+        """Escreve no disco o índice com os lotes adicionados com salvar=False."""
+        with self._lock:
+            if not self._por_salvar:
+                return
+            try:
+                self._save()
+            except BaseException:
+                self._reverter()
+                raise
+            finally:
+                self._por_salvar = False
+                self._lock_ficheiro.libertar()
+
+    def descartar(self):
+        """Desfaz os lotes adicionados com salvar=False (relê o índice do disco) e liberta o lock."""
+        with self._lock:
+            if not self._por_salvar:
+                return
+            try:
+                self._reverter()
+            finally:
+                self._por_salvar = False
+                self._lock_ficheiro.libertar()
+
+    def _reverter(self):
+        """Volta ao índice guardado; linhas a mais no ficheiro de re-score são cortadas no próximo add."""
+        if os.path.exists(self.path):
+            self._load()
+        else:
+            self.index, self.texts, self.metadatas = None, [], []
+            self.removidos, self._seletor = set(), None
+
+    def _acrescentar_originais(self, embs):
+        """
+        Acrescenta os vetores float32 ao ficheiro de re-score. Linhas para além
+        do índice guardado (de uma escrita interrompida antes de _save) são
+        descartadas primeiro, para a linha i continuar a ser o vetor do id i.
+        """
+        esperado = self.index.ntotal * 4 * self.dim
+        tamanho = os.path.getsize(self.path_vetores) if os.path.exists(self.path_vetores) else 0
+        if tamanho < esperado:
+            return   # índice anterior ao armazenamento dos originais: sem re-score
+        with open(self.path_vetores, "r+b" if tamanho else "wb") as f:
+            f.truncate(esperado)
+            f.seek(esperado)
+            f.write(embs.tobytes())
+
+    def _treinar_se_necessario(self):
+        """Converte o índice provisório em float32 no formato quantizado, treinado com todos os vetores."""
+        if (self.quantizacao == "flat" or not isinstance(self.index, faiss.IndexFlat)
+                or self.index.ntotal < TREINO_MINIMO):
+            return
+        vetores = self.index.reconstruct_n(0, self.index.ntotal)
+        novo = criar_indice(self.dim, self.quantizacao)
+        novo.train(vetores)
+        novo.add(vetores)
+        self.index = novo
+
+    def _parametros_busca(self):
+        """Exclui os ids removidos da busca (None se não houver remoções)."""
+        if not self.removidos:
+            return None
+        if self._seletor is None:
+            lote = faiss.IDSelectorBatch(np.fromiter(self.removidos, dtype=np.int64))
+            negacao = faiss.IDSelectorNot(lote)
+            # guarda as três referências: cada objeto só aponta para o anterior em C++
+            self._seletor = (lote, negacao, faiss.SearchParameters(sel=negacao))
+        return self._seletor[2]
+
+    def buscar_vetores(self, embs, n_results):
+        """
+        Busca com consultas já codificadas (uma linha por consulta).
+
+        Returns:
+            list: Para cada consulta, lista de (score, texto, metadados) por ordem decrescente
+        """
+        with self._lock:
+            self._recarregar_se_alterado()
+            if self.index is None or self.index.ntotal == 0:
+                return [[] for _ in range(len(embs))]
+            parametros = self._parametros_busca()
+            vetores = self._vetores_originais() if self.rescoring else None
+            if vetores is not None:
+                _, I = self.index.search(embs, n_results * self.candidatos_rescoring, params=parametros)
+                pares = [reordenar_exato(vetores, q, candidatos, n_results) for q, candidatos in zip(embs, I)]
+            else:
+                D, I = self.index.search(embs, n_results, params=parametros)
+                pares = list(zip(D, I))
+            return [
+                [(float(score), self.texts[idx], self.metadatas[idx]) for score, idx in zip(scores, ids) if idx != -1]
+                for scores, ids in pares
+            ]
 
     def buscar(self, query_texts, n_results=5, where=None):
-        assert self.index is not None, "Índice vazio."
-        emb = self.encoder.encode([query_texts], normalize_embeddings=True)
-        D, I = self.index.search(np.array(emb, dtype=np.float32), k=n_results)
-        docs, meta = [], []
-        for idx in I[0]:
-            if idx != -1:
-                docs.append(self.texts[idx])
-                meta.append(self.metadatas[idx])
-        # crude post-filter if where clause given
-        if where and 'fonte' in where:
-            docs = [d for d, m in zip(docs, meta) if m.get('fonte') == where['fonte']]
-            meta = [m for m in meta if m.get('fonte') == where['fonte']]
-        return {"documents": [docs], "metadatas": [meta]}
\ No newline at end of file
+        assert self.index is not None or os.path.exists(self.path), "Índice vazio."
+        return self.buscar_lote([query_texts], n_results, where)
+
+    def buscar_lote(self, query_texts, n_results=5, where=None):
+        """Várias consultas com um só encode e uma só busca no índice."""
+        embs = self.motor.codificar(list(query_texts), normalizar=True)
+        return formatar_resultados(self.buscar_vetores(embs, n_results), where)
+
+    def remover(self, where):
+        """
+        Marca como removidos os chunks cujos metadados correspondem a `where`
+        (ex.: {"fonte": "artigo.pdf"}). Deixam de aparecer nas buscas de imediato.
+
+        Returns:
+            int: Número de chunks removidos
+        """
+        if not where:
+            raise ValueError("remover() requer um filtro 'where'.")
+        with self._lock_ficheiro, self._lock:
+            self._recarregar_se_alterado()
+            ids = [i for i, meta in enumerate(self.metadatas)
+                   if i not in self.removidos and corresponde(meta, where)]
+            if not ids:
+                return 0
+            self.removidos.update(ids)
+            self._seletor = None
+            self._save()
+            fracao = len(self.removidos) / max(1, self.index.ntotal)
+        if fracao > self.compactar_acima_de:
+            self.compactar(em_segundo_plano=True)
+        return len(ids)
+
+    def compactar(self, em_segundo_plano=False):
+        """
+        Reconstrói o índice sem os chunks removidos, recuperando memória e disco.
+
+        Args:
+            em_segundo_plano: Corre numa thread; as buscas continuam a usar o
+                índice atual até à troca final
+
+        Returns:
+            int: Número de chunks eliminados (None se corre em segundo plano)
+        """
+        if em_segundo_plano:
+            if self._compactacao is None or not self._compactacao.is_alive():
+                self._compactacao = threading.Thread(target=self.compactar, name="compactar-faiss", daemon=True)
+                self._compactacao.start()
+            return None
+
+        with self._lock:
+            self._recarregar_se_alterado()
+            if not self.removidos or self.index is None:
+                return 0
+            # Fotografia do estado; a reconstrução corre fora do lock
+            original, total, removidos = self.index, self.index.ntotal, set(self.removidos)
+            novo = faiss.clone_index(self.index)
+            texts, metadatas = list(self.texts), list(self.metadatas)
+
+        mantidos = np.array([i for i in range(total) if i not in removidos], dtype=np.int64)
+        novo.remove_ids(np.fromiter(removidos, dtype=np.int64))   # mantém a ordem dos restantes
+        texts = [texts[i] for i in mantidos]
+        metadatas = [metadatas[i] for i in mantidos]
+
+        with self._lock_ficheiro, self._lock:
+            # Gravações de outros processos durante a reconstrução também contam
+            self._recarregar_se_alterado()
+            if self.index is not original or self.index.ntotal != total:
+                # Houve inserções (ou outra compactação) durante a reconstrução: refaz já com o lock
+                self._compactacao = None
+                return self._compactar_com_lock()
+            # Remoções feitas durante a reconstrução passam para os novos ids
+            novo_id = {int(antigo): i for i, antigo in enumerate(mantidos)}
+            self.removidos = {novo_id[i] for i in self.removidos - removidos if i in novo_id}
+            self._trocar_indice(novo, texts, metadatas, mantidos)
+        return len(removidos)
+
+    def _compactar_com_lock(self):
+        """Compactação síncrona; chamada com o lock do ficheiro e o do store."""
+        with self._lock:
+            removidos = set(self.removidos)
+            mantidos = np.array([i for i in range(self.index.ntotal) if i not in removidos], dtype=np.int64)
+            novo = faiss.clone_index(self.index)
+            novo.remove_ids(np.fromiter(removidos, dtype=np.int64))
+            self.removidos = set()
+            self._trocar_indice(novo, [self.texts[i] for i in mantidos],
+                                [self.metadatas[i] for i in mantidos], mantidos)
+        return len(removidos)
+
+    def _trocar_indice(self, novo, texts, metadatas, mantidos):
+        """Instala o índice compactado e reescreve os vetores originais (se existirem)."""
+        vetores = self._vetores_originais()
+        if vetores is not None:
+            tmp = f"{self.path_vetores}.tmp"
+            np.ascontiguousarray(vetores[mantidos]).tofile(tmp)
+            del vetores
+            os.replace(tmp, self.path_vetores)
+        self.index, self.texts, self.metadatas = novo, texts, metadatas
+        self._seletor = None
+        self._save()
+
+    # ---------- diagnóstico ----------
+    def estatisticas(self):
+        """
+        Uso de memória do índice, para escolher o formato por instalação.
+
+        Returns:
+            dict com num_vetores, quantizacao, bytes_por_vetor, memoria_indice_mb,
+            memoria_textos_mb (aprox.) e disco_originais_mb (vetores para re-score)
+        """
+        n = self.index.ntotal if self.index is not None else 0
+        bytes_por_vetor = self.index.sa_code_size() if self.index is not None else 0
+        return {
+            "num_vetores": n,
+            "removidos": len(self.removidos),
+            "quantizacao": self.quantizacao,
+            "rescoring": self.rescoring,
+            "bytes_por_vetor": bytes_por_vetor,
+            "memoria_indice_mb": n * bytes_por_vetor / 2**20,
+            "memoria_textos_mb": sum(len(t) for t in self.texts) / 2**20,
+            "disco_originais_mb": (os.path.getsize(self.path_vetores) / 2**20
+                                   if os.path.exists(self.path_vetores) else 0.0),
+        }
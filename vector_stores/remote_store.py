@@ -0,0 +1,65 @@
+# vector_stores/remote_store.py
+
+import json
+import urllib.error
+import urllib.request
+
+from .base import VectorStore
+
+
+class RemoteVectorStore(VectorStore):
+    """
+    Cliente do serviço de recuperação (retrieval_server.py).
+
+    O encoder e o índice vivem no processo do serviço; várias réplicas da app
+    e os scripts de avaliação partilham assim um único índice já carregado.
+    """
+
+    def __init__(self, url: str, vector_store: str, workspace: str = None, timeout_s: float = 30):
+        self.url = url.rstrip("/")
+        self.vector_store = vector_store
+        self.workspace = workspace
+        self.timeout_s = timeout_s
+
+    def _pedir(self, rota, **dados):
+        corpo = json.dumps({"vector_store": self.vector_store, "workspace": self.workspace, **dados}).encode("utf-8")
+        pedido = urllib.request.Request(f"{self.url}{rota}", data=corpo,
+                                        headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(pedido, timeout=self.timeout_s) as resposta:
+                return json.loads(resposta.read())
+        except urllib.error.HTTPError as e:
+            try:
+                erro = json.loads(e.read()).get("erro", e.reason)
+            except ValueError:
+                erro = e.reason
+            raise RuntimeError(f"Serviço de recuperação ({rota}): {erro}") from e
+        except urllib.error.URLError as e:
+            raise ConnectionError(f"Serviço de recuperação indisponível em {self.url}: {e.reason}") from e
+
+    def carregar_ou_criar(self, chunks=None, metadados=None):
+        """ABC hook: o índice é criado pelo serviço."""
+        if chunks:
+            self.adicionar(chunks, metadados)
+
+    def adicionar(self, chunks, metadados=None):
+        if chunks:
+            self._pedir("/adicionar", chunks=list(chunks), metadados=metadados)
+
+    def buscar(self, query_texts, n_results=5, where=None):
+        return self._pedir("/buscar", query=query_texts, n_results=n_results, where=where)
+
+    def buscar_lote(self, query_texts, n_results=5, where=None):
+        return self._pedir("/buscar_lote", queries=list(query_texts), n_results=n_results, where=where)
+
+    def buscar_contexto(self, pergunta, nomes_ficheiros):
+        """Contexto já formatado (rag_processor.buscar_contexto_relevante no serviço)."""
+        return self._pedir("/contexto", pergunta=pergunta, nomes_ficheiros=list(nomes_ficheiros))["contexto"]
+
+    def remover(self, where):
+        if not where:
+            raise ValueError("remover() requer um filtro 'where'.")
+        return self._pedir("/remover", where=where)["removidos"]
+
+    def compactar(self):
+        return self._pedir("/compactar")["compactados"]
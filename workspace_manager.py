@@ -0,0 +1,225 @@
+# workspace_manager.py
+"""
+Workspaces (namespaces) de documentos: cada projeto ou utilizador tem os seus
+próprios índices vetoriais, manifesto de documentos e quotas.
+
+- ChromaDB: uma coleção por workspace no mesmo diretório persistente.
+- FAISS: um ficheiro de índice por workspace em workspaces/<nome>/.
+- O workspace padrão usa os caminhos/coleção originais do config.yaml, para
+  que as bases já existentes continuem acessíveis.
+- Os vector stores abertos ficam numa cache LRU partilhada pelo processo;
+  ao exceder `workspaces.cache_max`, o menos usado recentemente é libertado.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config_loader import carregar_config
+from file_lock import LockFicheiro
+
+WORKSPACES_DIR = "workspaces"
+MANIFESTO = "manifesto.json"
+
+_lock = threading.Lock()
+_stores = OrderedDict()   # (nome_store, workspace) -> VectorStore, do menos ao mais recente
+
+
+def _config_workspaces():
+    config = carregar_config() or {}
+    return config.get('workspaces', {})
+
+
+def workspace_padrao() -> str:
+    return _config_workspaces().get('padrao', 'geral')
+
+
+def nome_valido(nome: str) -> bool:
+    """Nomes usados em caminhos e coleções do Chroma: letras, números, '.', '_' e '-'."""
+    return bool(re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9._-]{1,62}[A-Za-z0-9]", nome or ""))
+
+
+def _pasta(workspace: str) -> str:
+    return os.path.join(WORKSPACES_DIR, workspace)
+
+
+# ---------- manifestos ----------
+
+def carregar_manifesto(workspace: str) -> Dict:
+    """Manifesto do workspace (documentos indexados e totais); vazio se não existir."""
+    caminho = os.path.join(_pasta(workspace), MANIFESTO)
+    if os.path.exists(caminho):
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            pass
+    return {"nome": workspace, "criado_em": None, "documentos": {}, "num_chunks": 0}
+
+
+def _lock_manifesto(workspace: str) -> LockFicheiro:
+    """Lock entre processos do manifesto: a app e o worker de ingestão alteram-no ao mesmo tempo."""
+    return LockFicheiro(os.path.join(_pasta(workspace), MANIFESTO))
+
+
+def _salvar_manifesto(workspace: str, manifesto: Dict):
+    os.makedirs(_pasta(workspace), exist_ok=True)
+    caminho = os.path.join(_pasta(workspace), MANIFESTO)
+    tmp = f"{caminho}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, caminho)
+
+
+def listar_workspaces() -> List[str]:
+    """Workspaces existentes (o padrão aparece sempre, em primeiro lugar)."""
+    padrao = workspace_padrao()
+    existentes = []
+    if os.path.isdir(WORKSPACES_DIR):
+        existentes = sorted(
+            e.name for e in os.scandir(WORKSPACES_DIR)
+            if e.is_dir() and e.name != padrao and os.path.exists(os.path.join(e.path, MANIFESTO))
+        )
+    return [padrao] + existentes
+
+
+def criar_workspace(nome: str) -> bool:
+    """Cria um workspace vazio. Retorna False se o nome for inválido ou já existir."""
+    if not nome_valido(nome) or nome in listar_workspaces():
+        return False
+    with _lock_manifesto(nome), _lock:
+        manifesto = carregar_manifesto(nome)
+        manifesto["criado_em"] = manifesto.get("criado_em") or time.time()
+        _salvar_manifesto(nome, manifesto)
+    return True
+
+
+def registar_documentos(workspace: str, nome_store: str, documentos: List[Tuple[str, int, Optional[Dict]]]):
+    """
+    Regista no manifesto documentos já indexados.
+
+    Args:
+        workspace: Nome do workspace
+        nome_store: Vector store onde foram indexados (cada um tem o seu índice)
+        documentos: Lista de (nome do ficheiro, número de chunks, metadados bibliográficos)
+    """
+    with _lock_manifesto(workspace), _lock:
+        manifesto = carregar_manifesto(workspace)
+        manifesto["criado_em"] = manifesto.get("criado_em") or time.time()
+        for nome, num_chunks, metadados in documentos:
+            doc = manifesto["documentos"].setdefault(nome, {"stores": {}})
+            doc["stores"][nome_store] = doc["stores"].get(nome_store, 0) + num_chunks
+            doc["adicionado_em"] = time.time()
+            doc["metadados"] = metadados or doc.get("metadados")
+        manifesto["num_chunks"] = sum(sum(d["stores"].values()) for d in manifesto["documentos"].values())
+        manifesto["atualizado_em"] = time.time()
+        _salvar_manifesto(workspace, manifesto)
+
+
+def remover_documento(workspace: str, nome_store: str, nome: str):
+    """Retira um documento do manifesto de um vector store (após remover os seus chunks)."""
+    with _lock_manifesto(workspace), _lock:
+        manifesto = carregar_manifesto(workspace)
+        doc = manifesto["documentos"].get(nome)
+        if doc is None:
+            return
+        doc["stores"].pop(nome_store, None)
+        if not doc["stores"]:
+            del manifesto["documentos"][nome]
+        manifesto["num_chunks"] = sum(sum(d["stores"].values()) for d in manifesto["documentos"].values())
+        manifesto["atualizado_em"] = time.time()
+        _salvar_manifesto(workspace, manifesto)
+
+
+def listar_documentos(workspace: str, nome_store: Optional[str] = None) -> Dict[str, Dict]:
+    """Documentos do workspace (só os indexados em `nome_store`, se indicado), por nome."""
+    documentos = carregar_manifesto(workspace)["documentos"]
+    if nome_store is None:
+        return documentos
+    return {nome: d for nome, d in documentos.items() if nome_store in d["stores"]}
+
+
+def verificar_quota(workspace: str, novos_documentos: int = 0, novos_chunks: int = 0) -> Tuple[bool, str]:
+    """
+    Verifica se o workspace comporta mais documentos/chunks.
+
+    Returns:
+        tuple: (cabe, mensagem de erro ou "")
+    """
+    cfg = _config_workspaces()
+    manifesto = carregar_manifesto(workspace)
+    max_docs = cfg.get('quota_documentos')
+    max_chunks = cfg.get('quota_chunks')
+    total_docs = len(manifesto["documentos"]) + novos_documentos
+    total_chunks = manifesto["num_chunks"] + novos_chunks
+    if max_docs and total_docs > max_docs:
+        return False, f"Quota de documentos do workspace '{workspace}' excedida ({total_docs} > {max_docs})."
+    if max_chunks and total_chunks > max_chunks:
+        return False, f"Quota de chunks do workspace '{workspace}' excedida ({total_chunks} > {max_chunks})."
+    return True, ""
+
+
+# ---------- vector stores por workspace ----------
+
+def config_store(config_vs: Dict, workspace: str) -> Dict:
+    """Configuração do vector store com caminho/coleção próprios do workspace."""
+    if config_vs.get('type') == 'remote':
+        # O serviço de recuperação resolve o workspace do seu lado
+        return {**config_vs, 'workspace': workspace}
+    if workspace == workspace_padrao():
+        return dict(config_vs)
+    config_ws = dict(config_vs)
+    if config_vs.get('type') == 'chroma':
+        config_ws['collection_name'] = f"{config_vs.get('collection_name')}__{workspace}"
+    else:
+        config_ws['path'] = os.path.join(_pasta(workspace), os.path.basename(config_vs.get('path')))
+    return config_ws
+
+
+def partilhavel_entre_processos(nome_store: str) -> bool:
+    """
+    Se o vector store pode estar aberto ao mesmo tempo na app e no worker de
+    ingestão. O Chroma embutido (PersistentClient) não: dois clientes no mesmo
+    diretório não veem as escritas um do outro e podem corromper o índice, por
+    isso só a app o abre (a ingestão corre na própria página), a menos que
+    haja um servidor do Chroma configurado. Os FAISS coordenam-se por lock de
+    ficheiro e o remoto passa pelo serviço de recuperação.
+    """
+    config_vs = (carregar_config() or {}).get('vector_stores', {}).get(nome_store, {})
+    return config_vs.get('type') != 'chroma' or bool(config_vs.get('servidor'))
+
+
+def obter_store(nome_store: str, workspace: str):
+    """
+    Vector store do workspace, aberto uma vez por processo e mantido numa
+    cache LRU (índices FAISS de workspaces pouco usados saem da memória).
+    """
+    from vector_store_factory import get_vector_store
+
+    chave = (nome_store, workspace)
+    with _lock:
+        if chave in _stores:
+            _stores.move_to_end(chave)
+            return _stores[chave]
+
+    config_vs = (carregar_config() or {})['vector_stores'][nome_store]
+    if workspace != workspace_padrao():
+        os.makedirs(_pasta(workspace), exist_ok=True)
+    store = get_vector_store(config_store(config_vs, workspace))
+
+    with _lock:
+        _stores[chave] = store
+        _stores.move_to_end(chave)
+        while len(_stores) > max(1, _config_workspaces().get('cache_max', 4)):
+            _stores.popitem(last=False)
+        return store
+
+
+def stores_em_cache() -> List[Tuple[str, str]]:
+    """(vector store, workspace) abertos, do menos ao mais recentemente usado."""
+    with _lock:
+        return list(_stores)